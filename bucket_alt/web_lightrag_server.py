@@ -3,7 +3,7 @@ LightRAG Explorer Backend Server
 Provides API endpoints for the LightRAG Explorer web interface
 """
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request, render_template_string, Response, stream_with_context
 import os
 import json
 import sqlite3
@@ -12,9 +12,14 @@ from typing import Dict, List, Any, Optional
 import sys
 sys.path.append('..')
 from core_knowledge import LightRAGManager
+from util_async import AsyncApp, wants_asgi, serve_asgi
+from util_zipstream import stream_directory_zip, parse_export_options
+from util_uploads import UploadError, is_multipart, spool_request_files
+from util_metrics import instrument_flask
 
 # Create Flask app
 app = Flask(__name__)
+instrument_flask(app, "web_lightrag")
 
 # Initialize LightRAG manager
 lightrag_manager = LightRAGManager()
@@ -463,8 +468,11 @@ def create_bucket():
 
 @app.route('/api/buckets/<bucket_name>/documents', methods=['POST'])
 def add_document_to_bucket(bucket_name):
-    """Add a document to a specific bucket"""
+    """Add a document to a specific bucket (JSON body, or multipart with one or more files)"""
     try:
+        if is_multipart(request.content_type):
+            return add_uploaded_documents(bucket_name)
+        
         data = request.get_json()
         content = data.get('content', '').strip()
         filename = data.get('filename', 'document.txt')
@@ -485,12 +493,63 @@ def add_document_to_bucket(bucket_name):
         print(f"Error adding document to {bucket_name}: {e}")
         return jsonify({"error": str(e)}), 500
 
+def add_uploaded_documents(bucket_name):
+    """Spool multipart files into the bucket directory, then ingest each new one"""
+    bucket_dir = os.path.join(lightrag_manager.base_dir, bucket_name)
+    if not os.path.isdir(bucket_dir):
+        return jsonify({"error": f"Bucket not found: {bucket_name}"}), 404
+    
+    try:
+        spooled = spool_request_files(request.stream, request.content_type, bucket_dir)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    
+    added, failed, duplicates = [], [], []
+    for upload in spooled["files"]:
+        if upload["duplicate"]:
+            duplicates.append({"file": upload["filename"], "duplicate_of": upload["duplicate_of"]})
+            continue
+        
+        # Only one document is held in memory at a time
+        with open(upload["path"], 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        metadata = {"filename": upload["filename"], "sha256": upload["sha256"],
+                    "uploaded_at": datetime.now().isoformat()}
+        result = lightrag_manager.add_document_to_bucket(bucket_name, content, metadata)
+        if result.get("success"):
+            added.append(upload["filename"])
+        else:
+            failed.append({"file": upload["filename"], "error": result.get("error")})
+    
+    if not spooled["files"]:
+        return jsonify({"error": "No files in upload"}), 400
+    
+    return jsonify({
+        "success": not failed,
+        "added": added,
+        "failed": failed,
+        "duplicates": duplicates,
+        "message": f"Added {len(added)} document(s), skipped {len(duplicates)} duplicate(s)"
+    }), (200 if not failed else 207)
+
 @app.route('/api/export/<bucket_name>')
 def export_bucket(bucket_name):
     """Export bucket data in various formats"""
     try:
         format_type = request.args.get('format', 'json').lower()
         
+        if format_type == 'zip':
+            # Raw bucket files (vector JSONs, GraphML, kv stores), streamed chunk by chunk
+            bucket_dir = os.path.join(lightrag_manager.base_dir, bucket_name)
+            if not os.path.isdir(bucket_dir):
+                return jsonify({"error": f"Bucket not found: {bucket_name}"}), 404
+            compresslevel, store_compressed = parse_export_options(request.args)
+            return Response(
+                stream_with_context(stream_directory_zip(bucket_dir, compresslevel, store_compressed)),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename="{bucket_name}.zip"'}
+            )
+        
         export_data = lightrag_manager.export_bucket_data(bucket_name)
         
         if format_type == 'json':
@@ -620,6 +679,32 @@ def get_bucket_trends(bucket_name):
         print(f"Error getting trends for {bucket_name}: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Async serving mode: queries are awaited on the shared loop, other routes fall through to Flask
+asgi_app = AsyncApp(app)
+
+@asgi_app.route('/api/buckets/<bucket_name>/query', methods=['POST'])
+async def query_bucket_async(req, bucket_name):
+    """Query a specific bucket without holding a worker thread for the LLM call"""
+    data = req.get_json() or {}
+    question = data.get('question', '')
+    mode = data.get('mode', 'hybrid')
+    
+    if not question:
+        return {"error": "Question is required"}, 400
+    
+    result = await lightrag_manager.aquery_bucket(bucket_name, question, mode)
+    
+    if "error" in result:
+        return {"error": result["error"]}, 500
+    
+    return {
+        "bucket": bucket_name,
+        "question": question,
+        "mode": mode,
+        "response": result.get("response", "No response generated"),
+        "timestamp": result.get("timestamp", datetime.now().isoformat())
+    }
+
 if __name__ == '__main__':
     print("🚀 Starting LightRAG Explorer Server on port 8001...")
     print("📊 Available endpoints:")
@@ -635,7 +720,7 @@ if __name__ == '__main__':
     print("  POST /api/buckets/<name>/activate - Toggle bucket activation")
     print("  GET  /api/buckets/<name>/search - Search within bucket")
     print("  GET  /api/compare - Compare multiple buckets")
-    print("  GET  /api/export/<name> - Export bucket data")
+    print("  GET  /api/export/<name> - Export bucket data (?format=json|csv|zip)")
     print("  🆕 GET  /api/analytics/overview - Comprehensive analytics")
     print("  🆕 GET  /api/analytics/bucket/<name> - Bucket-specific analytics")
     print("  🆕 GET  /api/analytics/performance - Real-time performance metrics")
@@ -644,4 +729,7 @@ if __name__ == '__main__':
     print()
     print("🕸️ LightRAG Explorer will be available at: http://localhost:8001")
     
-    app.run(host='localhost', port=8001, debug=True)
\ No newline at end of file
+    if wants_asgi():
+        serve_asgi(asgi_app, 'localhost', 8001, fallback=lambda: app.run(host='localhost', port=8001, threaded=True))
+    else:
+        app.run(host='localhost', port=8001, debug=True)
\ No newline at end of file
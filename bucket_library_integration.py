@@ -10,6 +10,8 @@ from core_bucket_library import BucketLibrary, ProjectLightRAGManager
 from core_knowledge import LightRAGManager
 from lightrag import LightRAG, QueryParam
 from lightrag.llm.openai import gpt_4o_mini_complete, openai_embed
+from util_ratelimit import limit_embedding, limit_llm
+from util_accounting import operation
 import asyncio
 
 class BucketLibraryIntegration:
@@ -114,8 +116,8 @@ class BucketLibraryIntegration:
         """Initialize a LightRAG instance for a bucket"""
         rag = LightRAG(
             working_dir=bucket_path,
-            embedding_func=openai_embed,
-            llm_model_func=gpt_4o_mini_complete
+            embedding_func=limit_embedding(openai_embed),
+            llm_model_func=limit_llm(gpt_4o_mini_complete)
         )
         
         # Initialize storages
@@ -164,9 +166,10 @@ class BucketLibraryIntegration:
                 await rag.ainsert(document)
             
             loop = asyncio.get_event_loop() if asyncio.get_event_loop().is_running() else asyncio.new_event_loop()
-            loop.run_until_complete(insert_doc())
+            with operation(bucket=bucket_identifier, document=(metadata or {}).get("filename"), stage="ingest") as usage:
+                loop.run_until_complete(insert_doc())
             
-            return {"success": True, "message": "Document added successfully"}
+            return {"success": True, "message": "Document added successfully", "llm_usage": usage.to_dict()}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
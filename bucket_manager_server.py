@@ -39,16 +39,22 @@ try:
 except Exception as e:
     print(f"⚠️ Could not load API key: {e}")
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import json
 import networkx as nx
 from datetime import datetime
 from pathlib import Path
 import shutil
-import zipfile
-from io import BytesIO
+import asyncio
 from core_bucket_library import BucketLibrary, ProjectLightRAGManager
+from util_async import AsyncApp, wants_asgi, serve_asgi
+from core_jobs import JobStore, JobRunner, register_job_routes
+from util_zipstream import stream_directory_zip, parse_export_options
+from util_uploads import UploadError, is_multipart, spool_request_files, save_upload
+from util_ratelimit import limit_embedding, limit_llm, llm_limit_stats
+from util_metrics import instrument_flask
+import threading
 
 # Import LightRAG components
 try:
@@ -133,8 +139,8 @@ try:
                 return "Error: Could not complete request"
     
     # Create the wrapped functions
-    sync_openai_embed = SyncEmbeddingWrapper(openai_embed)
-    sync_gpt_4o_mini_complete = SyncLLMWrapper(gpt_4o_mini_complete)
+    sync_openai_embed = SyncEmbeddingWrapper(limit_embedding(openai_embed))
+    sync_gpt_4o_mini_complete = SyncLLMWrapper(limit_llm(gpt_4o_mini_complete))
     
 except ImportError:
     HAS_LIGHTRAG = False
@@ -142,6 +148,7 @@ except ImportError:
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "bucket_manager")
 
 # Configuration
 BASE_DIR = "lightrag_working_dir"
@@ -161,6 +168,7 @@ class BucketManager:
         self.library = BucketLibrary()
         self.project_name = Path(os.getcwd()).name
         self.project_manager = ProjectLightRAGManager(os.getcwd(), self.project_name, self.library)
+        self._queue_lock = threading.Lock()
         
         self.load_config()
     
@@ -399,41 +407,34 @@ class BucketManager:
         if not os.path.exists(bucket_dir):
             return {"success": False, "error": "Bucket not found"}
         
-        # Save file
-        file_path = os.path.join(bucket_dir, filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(file_content)
+        # Save file; identical content already in the bucket is kept once and not reprocessed
+        saved = save_upload(bucket_dir, filename, file_content)
+        filename = saved["filename"]
+        if saved["duplicate"]:
+            return {"success": True, "file": filename, "duplicate_of": saved["duplicate_of"]}
         
         # Update metadata
         if bucket_name in self.config["metadata"]:
             self.config["metadata"][bucket_name]["last_updated"] = datetime.now().isoformat()
             self.save_config()
         
-        # Process with LightRAG if available
+        # Queue for LightRAG processing in the background job runner
         if HAS_LIGHTRAG:
             try:
-                # For now, save to a processing queue file for manual processing
-                # This ensures files are saved and can be processed later
-                processing_queue_file = os.path.join(bucket_dir, "processing_queue.json")
-                
-                queue_data = []
-                if os.path.exists(processing_queue_file):
-                    with open(processing_queue_file, 'r') as f:
-                        queue_data = json.load(f)
-                
-                queue_data.append({
-                    "filename": filename,
-                    "content_preview": file_content[:200] + "..." if len(file_content) > 200 else file_content,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "pending_processing",
-                    "content_length": len(file_content)
-                })
-                
-                with open(processing_queue_file, 'w') as f:
-                    json.dump(queue_data, f, indent=2)
+                with self._queue_lock:
+                    queue_data = self.load_processing_queue(bucket_name)
+                    queue_data.append({
+                        "filename": filename,
+                        "content_preview": file_content[:200] + "..." if len(file_content) > 200 else file_content,
+                        "timestamp": datetime.now().isoformat(),
+                        "status": "pending_processing",
+                        "content_length": len(file_content)
+                    })
+                    self.save_processing_queue(bucket_name, queue_data)
                 
-                print(f"📁 {filename} saved and queued for LightRAG processing")
-                print(f"💡 Note: Due to async compatibility issues, use CLI for LightRAG processing")
+                job_id = self.submit_processing_job(bucket_name, [filename])
+                print(f"📁 {filename} saved and queued for LightRAG processing (job {job_id})")
+                return {"success": True, "file": filename, "job_id": job_id}
                 
             except Exception as e:
                 print(f"Error queuing for LightRAG: {e}")
@@ -441,6 +442,102 @@ class BucketManager:
         
         return {"success": True, "file": filename}
     
+    def register_uploaded_files(self, bucket_name, spooled_files):
+        """Queue files already spooled into the bucket: one queue write, one metadata save, one job"""
+        bucket_dir = os.path.join(self.base_dir, bucket_name)
+        new_files = [f for f in spooled_files if not f["duplicate"]]
+        duplicates = [{"file": f["filename"], "duplicate_of": f["duplicate_of"]} for f in spooled_files if f["duplicate"]]
+        
+        result = {
+            "success": True,
+            "files": [f["filename"] for f in new_files],
+            "duplicates": duplicates,
+            "bytes_received": sum(f["size"] for f in spooled_files)
+        }
+        if not new_files:
+            return result
+        
+        if bucket_name in self.config["metadata"]:
+            self.config["metadata"][bucket_name]["last_updated"] = datetime.now().isoformat()
+            self.save_config()
+        
+        if HAS_LIGHTRAG:
+            with self._queue_lock:
+                queue_data = self.load_processing_queue(bucket_name)
+                for f in new_files:
+                    with open(f["path"], 'r', encoding='utf-8', errors='ignore') as fh:
+                        preview = fh.read(203)
+                    queue_data.append({
+                        "filename": f["filename"],
+                        "content_preview": preview[:200] + "..." if len(preview) > 200 else preview,
+                        "timestamp": datetime.now().isoformat(),
+                        "status": "pending_processing",
+                        "content_length": f["size"],
+                        "sha256": f["sha256"]
+                    })
+                self.save_processing_queue(bucket_name, queue_data)
+            
+            job_id = self.submit_processing_job(bucket_name, [f["filename"] for f in new_files])
+            result["job_id"] = job_id
+            print(f"📁 {len(new_files)} file(s) spooled to {bucket_name} and queued (job {job_id})")
+        
+        return result
+    
+    def load_processing_queue(self, bucket_name):
+        """Load a bucket's processing_queue.json"""
+        queue_file = os.path.join(self.base_dir, bucket_name, "processing_queue.json")
+        if os.path.exists(queue_file):
+            with open(queue_file, 'r') as f:
+                return json.load(f)
+        return []
+    
+    def save_processing_queue(self, bucket_name, queue_data):
+        """Save a bucket's processing_queue.json"""
+        queue_file = os.path.join(self.base_dir, bucket_name, "processing_queue.json")
+        with open(queue_file, 'w') as f:
+            json.dump(queue_data, f, indent=2)
+    
+    def submit_processing_job(self, bucket_name, filenames=None):
+        """Submit queued files to the job runner; defaults to every pending file not already in an active job"""
+        bucket_dir = os.path.join(self.base_dir, bucket_name)
+        
+        with self._queue_lock:
+            queue_data = self.load_processing_queue(bucket_name)
+            active_jobs = {job["job_id"] for job in job_store.list_jobs(bucket=bucket_name, status="queued")}
+            active_jobs |= {job["job_id"] for job in job_store.list_jobs(bucket=bucket_name, status="running")}
+            
+            items = []
+            for item in queue_data:
+                if item.get("status") != "pending_processing" or item.get("job_id") in active_jobs:
+                    continue
+                if filenames is not None and item["filename"] not in filenames:
+                    continue
+                if os.path.exists(os.path.join(bucket_dir, item["filename"])):
+                    items.append(item)
+                else:
+                    print(f"⚠️ Queued file not found: {item['filename']}")
+            
+            if not items:
+                return None
+            
+            job_id = job_runner.submit("process_files", bucket_name,
+                                       [os.path.join(bucket_dir, item["filename"]) for item in items])
+            for item in items:
+                item["job_id"] = job_id
+            self.save_processing_queue(bucket_name, queue_data)
+        
+        return job_id
+    
+    def mark_queue_item_processed(self, bucket_name, filename, job_id):
+        """Flag a processing_queue.json entry as done once its job has ingested it"""
+        with self._queue_lock:
+            queue_data = self.load_processing_queue(bucket_name)
+            for item in queue_data:
+                if item["filename"] == filename and item.get("job_id") == job_id:
+                    item["status"] = "processed"
+                    item["processed_at"] = datetime.now().isoformat()
+            self.save_processing_queue(bucket_name, queue_data)
+    
     def delete_file_from_bucket(self, bucket_name, filename):
         """Delete a file from a bucket"""
         file_path = os.path.join(self.base_dir, bucket_name, filename)
@@ -457,24 +554,43 @@ class BucketManager:
         
         return {"success": True}
     
-    def export_bucket(self, bucket_name):
-        """Export a bucket as a zip file"""
+    def export_bucket(self, bucket_name, compresslevel=6, store_compressed=True):
+        """Export a bucket as a streamed zip (generator of chunks), or None if missing"""
         bucket_dir = os.path.join(self.base_dir, bucket_name)
         
         if not os.path.exists(bucket_dir):
             return None
         
-        # Create zip file in memory
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for root, dirs, files in os.walk(bucket_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arc_name = os.path.relpath(file_path, bucket_dir)
-                    zip_file.write(file_path, arc_name)
-        
-        zip_buffer.seek(0)
-        return zip_buffer
+        return stream_directory_zip(bucket_dir, compresslevel, store_compressed)
+
+# Background processing: one long-lived LightRAGManager shared by the job workers
+_kg_manager = None
+
+def get_kg_manager():
+    """Lazily create the LightRAGManager used for background processing"""
+    global _kg_manager
+    if _kg_manager is None:
+        from core_knowledge import LightRAGManager
+        _kg_manager = LightRAGManager()
+    return _kg_manager
+
+def process_job_file(job, file):
+    """Insert one queued file into its bucket's knowledge graph"""
+    with open(file["path"], 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    
+    result = get_kg_manager().add_document_to_bucket(
+        job["bucket"],
+        content,
+        metadata={"source_file": file["path"], "filename": file["filename"]}
+    )
+    if result.get("success"):
+        manager.mark_queue_item_processed(job["bucket"], file["filename"], job["job_id"])
+    return result
+
+job_store = JobStore(os.path.join(BASE_DIR, "_jobs", "jobs.sqlite"))
+job_runner = JobRunner(job_store, process_job_file, max_workers=2)
+register_job_routes(app, job_runner)
 
 # Initialize manager
 manager = BucketManager()
@@ -524,55 +640,32 @@ def delete_bucket(bucket_name):
 
 @app.route('/api/buckets/<bucket_name>/files', methods=['POST'])
 def add_file(bucket_name):
-    """Add a file to a bucket and automatically process it"""
-    data = request.json
-    filename = data.get('filename', 'document.txt')
-    content = data.get('content', '')
-    
-    # First, add the file to the bucket
-    result = manager.add_file_to_bucket(bucket_name, content, filename)
-    
-    if result.get('success'):
-        # Automatically trigger processing to build knowledge graph
+    """Add files to a bucket (multipart, streamed to disk; or JSON) and queue them for processing"""
+    if is_multipart(request.content_type):
+        bucket_dir = os.path.join(manager.base_dir, bucket_name)
+        if not os.path.exists(bucket_dir):
+            return jsonify({"success": False, "error": "Bucket not found"}), 404
         try:
-            from core_knowledge import LightRAGManager
-            kg_manager = LightRAGManager()
-            
-            # Process the newly added file immediately
-            process_result = kg_manager.add_document_to_bucket(
-                bucket_name, 
-                content, 
-                metadata={"source_file": filename, "filename": filename}
-            )
-            
-            if process_result.get('success'):
-                # Get updated stats
-                stats = kg_manager.get_knowledge_graph_stats(bucket_name)
-                result['processing'] = {
-                    'success': True,
-                    'stats': stats,
-                    'message': f'✅ Successfully processed {process_result.get("filename", "document")}',
-                    'details': {
-                        'document_length': process_result.get('document_length'),
-                        'new_document_count': process_result.get('new_document_count'),
-                        'processing_step': process_result.get('step')
-                    }
-                }
-            else:
-                result['processing'] = {
-                    'success': False,
-                    'message': f'❌ Processing failed at {process_result.get("step", "unknown")} step',
-                    'error': process_result.get('error', 'Unknown error'),
-                    'error_type': process_result.get('error_type'),
-                    'filename': process_result.get('filename')
-                }
-                
-        except Exception as e:
-            result['processing'] = {
-                'success': False,
-                'error': str(e),
-                'message': 'File uploaded but auto-processing failed'
-            }
+            spooled = spool_request_files(request.stream, request.content_type, bucket_dir)
+        except UploadError as e:
+            return jsonify({"success": False, "error": str(e)}), e.status
+        if not spooled["files"]:
+            return jsonify({"success": False, "error": "No files in upload"}), 400
+        result = manager.register_uploaded_files(bucket_name, spooled["files"])
+    else:
+        data = request.json
+        filename = data.get('filename', 'document.txt')
+        content = data.get('content', '')
+        result = manager.add_file_to_bucket(bucket_name, content, filename)
+    
+    if result.get('job_id'):
+        # Processing happens in the job runner; clients poll the job for progress
+        result['processing'] = {
+            'queued': True,
+            'job_id': result['job_id'],
+            'status_url': f"/api/jobs/{result['job_id']}",
+            'message': f'⏳ {", ".join(result.get("files") or [result.get("file", "")])} queued for knowledge graph processing'
+        }
     
     return jsonify(result)
 
@@ -582,17 +675,21 @@ def delete_file(bucket_name, filename):
     result = manager.delete_file_from_bucket(bucket_name, filename)
     return jsonify(result)
 
+def zip_response(chunks, download_name):
+    """Stream zip chunks to the client without buffering the archive"""
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+    )
+
 @app.route('/api/buckets/<bucket_name>/export', methods=['GET'])
 def export_bucket(bucket_name):
-    """Export a bucket as zip"""
-    zip_buffer = manager.export_bucket(bucket_name)
-    if zip_buffer:
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'{bucket_name}_export.zip'
-        )
+    """Export a bucket as zip (?level=0-9&store_compressed=true)"""
+    compresslevel, store_compressed = parse_export_options(request.args)
+    chunks = manager.export_bucket(bucket_name, compresslevel, store_compressed)
+    if chunks is not None:
+        return zip_response(chunks, f'{bucket_name}_export.zip')
     return jsonify({"error": "Bucket not found"}), 404
 
 @app.route('/api/stats', methods=['GET'])
@@ -608,7 +705,8 @@ def get_stats():
         "total_buckets": len(buckets),
         "total_nodes": total_nodes,
         "total_edges": total_edges,
-        "total_files": total_files
+        "total_files": total_files,
+        "llm_limits": llm_limit_stats()
     })
 
 @app.route('/api/apikey/status', methods=['GET'])
@@ -665,34 +763,31 @@ def test_api_key():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _process_bucket(bucket_name):
+    """Submit a bucket's pending queue as a background job, returning (payload, status)"""
+    if not HAS_LIGHTRAG:
+        return {"success": False, "error": "LightRAG not available"}, 500
+    
+    if not os.path.exists(os.path.join(manager.base_dir, bucket_name)):
+        return {"success": False, "error": "Bucket not found"}, 404
+    
+    job_id = manager.submit_processing_job(bucket_name)
+    if job_id is None:
+        return {"success": False, "error": "No files to process"}, 400
+    
+    job = job_store.get_job(job_id)
+    return {
+        "success": True,
+        "job_id": job_id,
+        "queued_files": job["total_files"],
+        "status_url": f"/api/jobs/{job_id}"
+    }, 202
+
 @app.route('/api/buckets/<bucket_name>/process', methods=['POST'])
 def process_bucket_files(bucket_name):
-    """Process all queued files in a bucket to build knowledge graph"""
-    try:
-        from core_knowledge import LightRAGManager
-        
-        # bucket_name is already passed as parameter
-        kg_manager = LightRAGManager()
-        
-        # Check if bucket exists
-        if bucket_name not in [b['name'] for b in kg_manager.get_bucket_list()]:
-            return jsonify({"success": False, "error": "Bucket not found"}), 404
-        
-        # Process queued files
-        result = kg_manager.batch_process_files(bucket_name)
-        
-        if "error" in result:
-            return jsonify({"success": False, "error": result["error"]}), 400
-        
-        return jsonify({
-            "success": True,
-            "processed": result.get("processed", 0),
-            "failed": result.get("failed", 0),
-            "stats": result.get("final_stats", {})
-        })
-        
-    except ImportError:
-        return jsonify({"success": False, "error": "LightRAG not available"}), 500
+    """Queue all pending files in a bucket for knowledge graph processing"""
+    result, status = _process_bucket(bucket_name)
+    return jsonify(result), status
 
 # Library Management Endpoints
 @app.route('/api/library/buckets', methods=['GET'])
@@ -731,6 +826,15 @@ def share_bucket(bucket_id, target_project):
         return jsonify(result)
     return jsonify(result), 400
 
+@app.route('/api/library/export/<bucket_id>', methods=['GET'])
+def export_library_bucket(bucket_id):
+    """Export a library bucket as a streamed zip"""
+    compresslevel, store_compressed = parse_export_options(request.args)
+    chunks = bucket_manager.library.stream_bucket_archive(bucket_id, compresslevel, store_compressed)
+    if chunks is not None:
+        return zip_response(chunks, f'{bucket_id}_library_export.zip')
+    return jsonify({"error": f"Bucket {bucket_id} not found"}), 404
+
 @app.route('/api/library/search', methods=['GET'])
 def search_library():
     """Search for buckets in the library"""
@@ -766,8 +870,20 @@ def migrate_buckets():
 # Initialize bucket manager when module loads
 bucket_manager = BucketManager()
 
+# Async serving mode: LLM-bound routes run as coroutines, the rest falls through to Flask
+asgi_app = AsyncApp(app)
+
+@asgi_app.route('/api/buckets/<bucket_name>/process', methods=['POST'])
+async def process_bucket_files_async(req, bucket_name):
+    """Queue pending files without blocking the event loop"""
+    return await asyncio.to_thread(_process_bucket, bucket_name)
+
 if __name__ == '__main__':
     print("🚀 Starting Bucket Manager Server...")
     print("📊 Access the interface at http://localhost:8002")
     print("✨ LightRAG integration:", "Enabled" if HAS_LIGHTRAG else "Disabled (demo mode)")
-    app.run(host='0.0.0.0', port=8002, debug=False)
\ No newline at end of file
+    job_runner.start()
+    if wants_asgi():
+        serve_asgi(asgi_app, '0.0.0.0', 8002, fallback=lambda: app.run(host='0.0.0.0', port=8002, debug=False, threaded=True))
+    else:
+        app.run(host='0.0.0.0', port=8002, debug=False)
\ No newline at end of file
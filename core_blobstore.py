@@ -0,0 +1,215 @@
+"""
+Blob Store for Lizzy
+Content-addressed, compressed storage for the large prompts, contexts and generations in project databases
+"""
+
+import hashlib
+import re
+import sqlite3
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from util_metrics import CACHE_REQUESTS
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Texts shorter than this stay inline; a reference plus a blob row would not be smaller
+BLOB_MIN_BYTES = 256
+BLOB_REF_PREFIX = "blob:"
+BLOB_REF_PATTERN = re.compile(r'^blob:([0-9a-f]{64})$')
+
+# (table, key column, text column) pairs that hold blob references
+BLOB_COLUMNS = (
+    ("brainstorm_steps", "step_id", "content"),
+    ("brainstorm_outputs", "output_id", "prompt_used"),
+    ("write_steps", "step_id", "content"),
+    ("scene_generations", "generation_id", "context_used"),
+    ("scene_generations", "generation_id", "prompt_used"),
+    ("scene_generations", "generation_id", "generated_text"),
+)
+
+BLOBS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, str) and BLOB_REF_PATTERN.match(value) is not None
+
+
+def compress(raw: bytes) -> Tuple[str, bytes]:
+    if ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=9).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Blob was stored with zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "raw":
+        return data
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+class BlobStore:
+    """Stores each distinct text once; callers keep a short blob:<sha256> reference in its place"""
+
+    def __init__(self, conn: sqlite3.Connection, execute: Optional[Callable[[str, Sequence[Any]], Any]] = None,
+                 min_bytes: int = BLOB_MIN_BYTES, cache_size: int = 64):
+        self.conn = conn
+        # Route writes through a StepLogger's execute so blobs land in the same transaction as their references
+        self.execute = execute or conn.execute
+        self.min_bytes = min_bytes
+        self.cache_size = cache_size
+        self.recent: "OrderedDict[str, str]" = OrderedDict()
+        self.stored = set()
+
+    def put(self, text: Optional[str]) -> Optional[str]:
+        """Reference for text (or text itself when short); writes the blob unless already stored"""
+        if text is None or is_blob_ref(text):
+            return text
+        raw = text.encode("utf-8")
+        if len(raw) < self.min_bytes:
+            return text
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in self.stored:
+            codec, data = compress(raw)
+            if len(data) >= len(raw):
+                codec, data = "raw", raw
+            self.execute("INSERT OR IGNORE INTO blobs (hash, codec, size, stored_size, data) VALUES (?, ?, ?, ?, ?)",
+                         (digest, codec, len(raw), len(data), data))
+            self.stored.add(digest)
+        self._remember(digest, text)
+        return BLOB_REF_PREFIX + digest
+
+    def resolve(self, value: Any) -> Any:
+        """Text behind a reference; any other value is returned unchanged"""
+        match = BLOB_REF_PATTERN.match(value) if isinstance(value, str) else None
+        if not match:
+            return value
+        digest = match.group(1)
+        if digest in self.recent:
+            self.recent.move_to_end(digest)
+            CACHE_REQUESTS.inc(cache="blob", result="hit")
+            return self.recent[digest]
+        CACHE_REQUESTS.inc(cache="blob", result="miss")
+        row = self.conn.execute("SELECT codec, data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Missing blob {digest}")
+        text = decompress(row[0], row[1]).decode("utf-8")
+        self._remember(digest, text)
+        return text
+
+    def _remember(self, digest: str, text: str):
+        self.recent[digest] = text
+        self.recent.move_to_end(digest)
+        while len(self.recent) > self.cache_size:
+            self.recent.popitem(last=False)
+
+
+def _table_columns(cursor: sqlite3.Cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def externalize_columns(cursor: sqlite3.Cursor, batch_size: int = 500) -> Dict[str, int]:
+    """Move existing large inline texts into blobs; returns rows converted per table.column"""
+    store = BlobStore(cursor.connection, execute=cursor.execute)
+    converted = {}
+    for table, key, column in BLOB_COLUMNS:
+        if not {key, column} <= _table_columns(cursor, table):
+            continue
+        rows = cursor.execute(f'''
+            SELECT {key}, {column} FROM {table}
+            WHERE length(CAST({column} AS BLOB)) >= ? AND {column} NOT LIKE 'blob:%'
+        ''', (store.min_bytes,)).fetchall()
+        updates = []
+        for row_key, text in rows:
+            updates.append((store.put(text), row_key))
+            if len(updates) >= batch_size:
+                cursor.executemany(f"UPDATE {table} SET {column} = ? WHERE {key} = ?", updates)
+                updates = []
+        if updates:
+            cursor.executemany(f"UPDATE {table} SET {column} = ? WHERE {key} = ?", updates)
+        converted[f"{table}.{column}"] = len(rows)
+    return converted
+
+
+def blob_report(conn: sqlite3.Connection) -> Dict:
+    """How much text the blob references stand for versus what the blob table actually stores"""
+    cursor = conn.cursor()
+    if "hash" not in _table_columns(cursor, "blobs"):
+        return {"error": "No blob table; run the project migrations first"}
+
+    columns = []
+    referenced_bytes = 0
+    for table, key, column in BLOB_COLUMNS:
+        if not {key, column} <= _table_columns(cursor, table):
+            continue
+        refs, logical = cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(b.size), 0)
+            FROM {table} t JOIN blobs b ON b.hash = substr(t.{column}, {len(BLOB_REF_PREFIX) + 1})
+            WHERE t.{column} LIKE 'blob:%'
+        ''').fetchone()
+        inline_rows, inline_bytes = cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(length(CAST({column} AS BLOB))), 0)
+            FROM {table} WHERE {column} IS NOT NULL AND {column} NOT LIKE 'blob:%'
+        ''').fetchone()
+        referenced_bytes += logical
+        columns.append({"column": f"{table}.{column}", "references": refs, "referenced_bytes": logical,
+                        "inline_rows": inline_rows, "inline_bytes": inline_bytes})
+
+    blob_count, unique_bytes, stored_bytes = cursor.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()
+    reference_bytes = sum(c["references"] for c in columns) * (len(BLOB_REF_PREFIX) + 64)
+    return {
+        "columns": columns,
+        "blobs": blob_count,
+        "referenced_bytes": referenced_bytes,
+        "unique_bytes": unique_bytes,
+        "stored_bytes": stored_bytes,
+        "bytes_saved": referenced_bytes - stored_bytes - reference_bytes,
+        "dedup_ratio": round(referenced_bytes / unique_bytes, 2) if unique_bytes else 0,
+        "compression_ratio": round(unique_bytes / stored_bytes, 2) if stored_bytes else 0
+    }
+
+
+def format_report(report: Dict) -> List[str]:
+    if "error" in report:
+        return [f"❌ {report['error']}"]
+    lines = [f"🗜️ {report['blobs']} blobs: {report['referenced_bytes']:,} bytes referenced, "
+             f"{report['stored_bytes']:,} stored ({report['dedup_ratio']}x dedup, "
+             f"{report['compression_ratio']}x compression)",
+             f"💾 Bytes saved: {report['bytes_saved']:,} (run VACUUM to return the space to the filesystem)"]
+    for column in report["columns"]:
+        lines.append(f"   {column['column']}: {column['references']} refs / {column['referenced_bytes']:,} bytes, "
+                     f"{column['inline_rows']} inline / {column['inline_bytes']:,} bytes")
+    return lines
+
+
+if __name__ == "__main__":
+    import sys
+    from core_migrations import ensure_migrated
+    if len(sys.argv) < 2:
+        print("Usage: python core_blobstore.py <project.sqlite>")
+        sys.exit(1)
+    ensure_migrated(sys.argv[1])
+    conn = sqlite3.connect(sys.argv[1])
+    print("\n".join(format_report(blob_report(conn))))
+    conn.close()
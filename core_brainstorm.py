@@ -13,6 +13,18 @@ from dataclasses import dataclass
 from core_templates import TemplateManager, PromptInspector
 from core_knowledge import LightRAGManager
 from web_brainstorm_api import get_brainstorm_template
+from core_steplog import StepLogger
+from util_events import COALESCE, EventBus
+from util_ratelimit import limit_llm
+from util_accounting import get_ledger, operation
+from util_tracing import annotate, span, trace_session
+from util_metrics import CACHE_REQUESTS
+from core_blobstore import BlobStore
+from core_migrations import migrate
+from core_fingerprint import input_fingerprint
+from core_snapshot import ProjectSnapshot, load_project_snapshot
+from core_retrieval import DEFAULT_CONTEXT_TOKENS, default_retrieval_mode, gather_bucket_context
+from lightrag.llm.openai import gpt_4o_mini_complete
 
 
 @dataclass
@@ -42,7 +54,9 @@ class TransparentBrainstormer:
     """Transparent brainstorming engine with real-time visibility"""
     
     def __init__(self, project_path: str, template_manager: TemplateManager = None, 
-                 lightrag_manager: LightRAGManager = None):
+                 lightrag_manager: LightRAGManager = None, retrieval_mode: str = None,
+                 context_token_budget: int = DEFAULT_CONTEXT_TOKENS, durability: str = None,
+                 force: bool = False, trace: bool = None):
         self.project_path = project_path
         self.project_name = os.path.basename(project_path)
         self.db_path = os.path.join(project_path, f"{self.project_name}.sqlite")
@@ -52,12 +66,33 @@ class TransparentBrainstormer:
         self.lightrag_manager = lightrag_manager or LightRAGManager()
         self.prompt_inspector = PromptInspector(self.template_manager)
         
+        # "context": buckets return context only and one LLM call synthesizes; "per_bucket": one full answer per bucket
+        self.retrieval_mode = retrieval_mode or default_retrieval_mode()
+        self.context_token_budget = context_token_budget
+        
+        # Scenes whose inputs are unchanged reuse earlier outputs unless force is set
+        self.force = force
+        
         # Connect to database
         self.conn = sqlite3.connect(self.db_path)
         self.setup_tracking_tables()
         
+        # Step and output rows are buffered and committed once per scene (see core_steplog)
+        self.steps = StepLogger(self.conn, durability)
+        
+        # Large step contents and prompts are stored once, compressed (see core_blobstore)
+        self.blobs = BlobStore(self.conn, execute=self.steps.execute)
+        
+        # Callbacks are queued per listener and run off the pipeline (see util_events.EventBus)
+        self.events = EventBus(f"{self.project_name}-brainstormer")
+        
+        # Per-session Chrome/Perfetto traces (see util_tracing); None follows LIZZY_TRACE
+        self.trace = trace
+        self.last_trace = None
+        
         # Session tracking
         self.current_session = None
+        self.snapshot: Optional[ProjectSnapshot] = None
         self.steps_log = []
         self.callbacks = {
             'step_started': [],
@@ -70,68 +105,18 @@ class TransparentBrainstormer:
         }
     
     def setup_tracking_tables(self):
-        """Setup tables for tracking brainstorming sessions"""
-        cursor = self.conn.cursor()
-        
-        # Sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS brainstorm_sessions (
-                session_id TEXT PRIMARY KEY,
-                project_name TEXT,
-                start_time TIMESTAMP,
-                end_time TIMESTAMP,
-                total_scenes INTEGER,
-                buckets_used TEXT,
-                user_guidance TEXT,
-                status TEXT DEFAULT 'running'
-            )
-        ''')
-        
-        # Steps table for detailed tracking
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS brainstorm_steps (
-                step_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                step_type TEXT,
-                timestamp TIMESTAMP,
-                act INTEGER,
-                scene INTEGER,
-                bucket TEXT,
-                content TEXT,
-                metadata TEXT,
-                FOREIGN KEY (session_id) REFERENCES brainstorm_sessions (session_id)
-            )
-        ''')
-        
-        # Outputs table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS brainstorm_outputs (
-                output_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                act INTEGER,
-                scene INTEGER,
-                bucket TEXT,
-                prompt_used TEXT,
-                response TEXT,
-                timestamp TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES brainstorm_sessions (session_id)
-            )
-        ''')
-        
-        self.conn.commit()
+        """Setup tables for tracking brainstorming sessions (schema and indexes live in core_migrations)"""
+        migrate(self.conn)
     
-    def register_callback(self, event: str, callback: Callable):
-        """Register a callback for specific events"""
+    def register_callback(self, event: str, callback: Callable, maxsize: int = 1024, policy: str = COALESCE):
+        """Register a sync or async callback for specific events; it runs on the event bus, not in the pipeline"""
         if event in self.callbacks:
             self.callbacks[event].append(callback)
+            self.events.on(event, callback, maxsize=maxsize, policy=policy)
     
     def trigger_callback(self, event: str, data: Any):
-        """Trigger all callbacks for an event"""
-        for callback in self.callbacks.get(event, []):
-            try:
-                callback(data)
-            except Exception as e:
-                print(f"Callback error: {e}")
+        """Publish an event to its callbacks and carry on"""
+        self.events.publish(event, data)
     
     def start_session(self, buckets: List[str], user_guidance: str = "") -> str:
         """Start a new brainstorming session"""
@@ -143,6 +128,7 @@ class TransparentBrainstormer:
             "buckets": buckets,
             "user_guidance": user_guidance,
             "scenes": [],
+            "reused_scenes": 0,
             "status": "running"
         }
         
@@ -157,16 +143,25 @@ class TransparentBrainstormer:
         self.conn.commit()
         
         self.steps_log = []
+        self.refresh_snapshot()
         print(f"🧠 Started brainstorming session: {session_id}")
         return session_id
     
+    def refresh_snapshot(self) -> ProjectSnapshot:
+        """Reload characters, outline and project info; call after editing them mid-session"""
+        self.snapshot = load_project_snapshot(self.conn)
+        return self.snapshot
+    
+    @property
+    def project_snapshot(self) -> ProjectSnapshot:
+        return self.snapshot or self.refresh_snapshot()
+    
     def log_step(self, step: BrainstormStep):
         """Log a brainstorming step"""
         self.steps_log.append(step)
         
-        # Save to database
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        # Queue for the scene's transaction
+        self.steps.execute('''
             INSERT INTO brainstorm_steps 
             (step_id, session_id, step_type, timestamp, act, scene, bucket, content, metadata)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -178,10 +173,9 @@ class TransparentBrainstormer:
             getattr(step, 'act', None),
             getattr(step, 'scene', None),
             step.bucket,
-            json.dumps(step.content) if not isinstance(step.content, str) else step.content,
+            self.blobs.put(json.dumps(step.content) if not isinstance(step.content, str) else step.content),
             json.dumps(step.metadata or {})
         ))
-        self.conn.commit()
     
     def assemble_context(self, act: int, scene: int) -> BrainstormContext:
         """Assemble context for a specific scene"""
@@ -193,53 +187,18 @@ class TransparentBrainstormer:
             'scene': scene
         })
         
-        cursor = self.conn.cursor()
+        snapshot = self.project_snapshot
         
         # Get scene info
-        cursor.execute('''
-            SELECT key_characters, key_events 
-            FROM story_outline 
-            WHERE act = ? AND scene = ?
-        ''', (act, scene))
-        scene_data = cursor.fetchone()
-        
-        if not scene_data:
-            raise ValueError(f"Scene not found: Act {act}, Scene {scene}")
-        
-        scene_description = f"Characters: {scene_data[0]}\nEvents: {scene_data[1]}"
+        outline_scene = snapshot.scene(act, scene)
+        scene_description = outline_scene.description
         
         # Get character details
-        cursor.execute('''
-            SELECT name, gender, age, romantic_challenge, lovable_trait, comedic_flaw 
-            FROM characters
-        ''')
-        all_chars = cursor.fetchall()
-        
-        character_details = []
-        scene_chars = scene_data[0].split(',') if scene_data[0] else []
-        
-        for char_data in all_chars:
-            if any(char_data[0].strip() == sc.strip() for sc in scene_chars):
-                character_details.append({
-                    'name': char_data[0],
-                    'gender': char_data[1],
-                    'age': char_data[2],
-                    'romantic_challenge': char_data[3],
-                    'lovable_trait': char_data[4],
-                    'comedic_flaw': char_data[5]
-                })
+        character_details = snapshot.scene_characters(outline_scene)
         
         # Get previous scene for continuity
-        previous_scene = ""
-        if scene > 1:
-            cursor.execute('''
-                SELECT key_events 
-                FROM story_outline 
-                WHERE act = ? AND scene = ?
-            ''', (act, scene - 1))
-            prev_data = cursor.fetchone()
-            if prev_data:
-                previous_scene = prev_data[0]
+        previous = snapshot.previous_scene(act, scene)
+        previous_scene = previous.key_events if previous else ""
         
         context = BrainstormContext(
             act=act,
@@ -288,11 +247,8 @@ class TransparentBrainstormer:
                 f"Comic flaw: {char['comedic_flaw']}."
             )
         
-        # Get project logline/concept from database
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT value FROM project_info WHERE key = 'description'")
-        result = cursor.fetchone()
-        logline = result[0] if result else "A romantic comedy about unexpected love"
+        # Get project logline/concept from the session snapshot
+        logline = self.project_snapshot.logline
         
         # Get custom template from Prompt Studio or use default
         template = get_brainstorm_template(self.project_path)
@@ -347,6 +303,76 @@ class TransparentBrainstormer:
         
         return compiled_prompts
     
+    def scene_fingerprints(self, compiled_prompts: Dict[str, Dict]) -> Dict[str, str]:
+        """Input fingerprint per output: one per bucket, or a single "synthesis" output in context mode"""
+        versions = {bucket: self.lightrag_manager.bucket_version(bucket) for bucket in compiled_prompts}
+        if self.retrieval_mode == "context":
+            prompt = next(iter(compiled_prompts.values()))["compiled_prompt"] if compiled_prompts else ""
+            return {"synthesis": input_fingerprint(prompt, "context", versions,
+                                                   {"context_tokens": self.context_token_budget})}
+        return {bucket: input_fingerprint(prompt_data["compiled_prompt"], "per_bucket", {bucket: versions[bucket]})
+                for bucket, prompt_data in compiled_prompts.items()}
+    
+    def reuse_outputs(self, fingerprints: Dict[str, str], context: BrainstormContext) -> Dict[str, Dict]:
+        """Copy earlier successful outputs with matching fingerprints into this session"""
+        reused = {}
+        cursor = self.conn.cursor()
+        for bucket, fingerprint in fingerprints.items():
+            cursor.execute('''
+                SELECT prompt_used, response
+                FROM brainstorm_outputs
+                WHERE input_fingerprint = ? AND response != ''
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ''', (fingerprint,))
+            row = cursor.fetchone()
+            CACHE_REQUESTS.inc(cache="brainstorm_reuse", result="hit" if row else "miss")
+            if not row:
+                continue
+            prompt_used, response = row
+            step_id = f"reuse_{bucket}_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
+            
+            self.log_step(BrainstormStep(
+                step_id=f"response_{step_id}",
+                step_type="response",
+                timestamp=datetime.now(),
+                bucket=bucket,
+                content=response,
+                metadata={"act": context.act, "scene": context.scene, "success": True, "reused": True}
+            ))
+            self.steps.execute('''
+                INSERT INTO brainstorm_outputs
+                (output_id, session_id, act, scene, bucket, prompt_used, response, timestamp, input_fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                f"out_{step_id}",
+                self.current_session["session_id"],
+                context.act,
+                context.scene,
+                bucket,
+                prompt_used,
+                response,
+                datetime.now(),
+                fingerprint
+            ))
+            
+            self.trigger_callback('response_received', {
+                'bucket': bucket,
+                'response': response[:200] + "...",
+                'step_id': step_id,
+                'success': True,
+                'reused': True
+            })
+            reused[bucket] = {
+                "bucket": bucket,
+                "query": self.blobs.resolve(prompt_used),
+                "response": response,
+                "timestamp": datetime.now(),
+                "success": True,
+                "reused": True
+            }
+        return reused
+    
     async def execute_queries(self, compiled_prompts: Dict[str, Dict], 
                              context: BrainstormContext) -> Dict[str, Dict]:
         """Execute queries against LightRAG buckets"""
@@ -401,22 +427,21 @@ class TransparentBrainstormer:
                 self.log_step(response_step)
                 
                 # Save to outputs table
-                cursor = self.conn.cursor()
-                cursor.execute('''
+                self.steps.execute('''
                     INSERT INTO brainstorm_outputs
-                    (output_id, session_id, act, scene, bucket, prompt_used, response, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    (output_id, session_id, act, scene, bucket, prompt_used, response, timestamp, input_fingerprint)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     f"out_{step_id}",
                     self.current_session["session_id"],
                     context.act,
                     context.scene,
                     bucket,
-                    prompt_data["compiled_prompt"],
+                    self.blobs.put(prompt_data["compiled_prompt"]),
                     result.get("response", ""),
-                    datetime.now()
+                    datetime.now(),
+                    prompt_data.get("input_fingerprint")
                 ))
-                self.conn.commit()
                 
                 self.trigger_callback('response_received', {
                     'bucket': bucket,
@@ -453,65 +478,172 @@ class TransparentBrainstormer:
                     'step_id': step_id,
                     'success': False
                 })
-            
-            # Small delay between queries
-            await asyncio.sleep(0.5)
         
         return responses
     
+    async def execute_context_query(self, compiled_prompts: Dict[str, Dict],
+                                    context: BrainstormContext, fingerprint: str = None) -> Dict[str, Dict]:
+        """Retrieve context from all buckets concurrently, then answer with a single LLM call"""
+        buckets = list(compiled_prompts.keys())
+        if not buckets:
+            return {}
+        enhanced_prompt = next(iter(compiled_prompts.values()))["compiled_prompt"]
+        step_id = f"synthesis_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
+        retrieval_query = (f"Act {context.act}, Scene {context.scene}: {context.scene_description}\n"
+                           f"{context.user_guidance}").strip()
+        
+        for bucket in buckets:
+            self.trigger_callback('query_sent', {
+                'bucket': bucket,
+                'prompt': retrieval_query[:200] + "...",
+                'context_only': True,
+                'step_id': step_id
+            })
+        
+        with operation(stage="retrieval"), span("retrieval", buckets=len(buckets)):
+            merged = await gather_bucket_context(self.lightrag_manager.aquery_bucket, buckets, retrieval_query,
+                                                 token_budget=self.context_token_budget)
+        
+        self.log_step(BrainstormStep(
+            step_id=f"context_{step_id}",
+            step_type="query",
+            timestamp=datetime.now(),
+            bucket="all",
+            content=merged["text"],
+            metadata={"act": context.act, "scene": context.scene, "mode": "context",
+                      **{k: v for k, v in merged.items() if k != "text"}}
+        ))
+        
+        synthesis_prompt = enhanced_prompt
+        if merged["text"]:
+            synthesis_prompt += ("\n\n## Reference Context\n"
+                                 "Entities, relationships and source excerpts retrieved from the knowledge buckets. "
+                                 "Draw on them where they fit this scene.\n\n" + merged["text"])
+        
+        bucket_label = "synthesis"
+        try:
+            with operation(stage="synthesis"), span("synthesis", context_tokens=merged["tokens"]):
+                response = await limit_llm(gpt_4o_mini_complete)(synthesis_prompt)
+            success = True
+        except Exception as e:
+            response = f"Error: {str(e)}"
+            success = False
+        
+        self.log_step(BrainstormStep(
+            step_id=f"response_{step_id}",
+            step_type="response",
+            timestamp=datetime.now(),
+            bucket=bucket_label,
+            content=response,
+            metadata={"act": context.act, "scene": context.scene, "success": success,
+                      "llm_calls": 1, "context_tokens": merged["tokens"], "buckets": buckets}
+        ))
+        
+        if success:
+            self.steps.execute('''
+                INSERT INTO brainstorm_outputs
+                (output_id, session_id, act, scene, bucket, prompt_used, response, timestamp, input_fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                f"out_{step_id}",
+                self.current_session["session_id"],
+                context.act,
+                context.scene,
+                bucket_label,
+                self.blobs.put(synthesis_prompt),
+                response,
+                datetime.now(),
+                fingerprint
+            ))
+        
+        self.trigger_callback('response_received', {
+            'bucket': bucket_label,
+            'response': response[:200] + "...",
+            'retrieval': merged["retrieval"],
+            'context_tokens': merged["tokens"],
+            'step_id': step_id,
+            'success': success
+        })
+        
+        return {bucket_label: {
+            "bucket": bucket_label,
+            "query": synthesis_prompt,
+            "response": response,
+            "timestamp": datetime.now(),
+            "success": success,
+            "retrieval": merged["retrieval"]
+        }}
+    
     async def brainstorm_scene(self, act: int, scene: int) -> Dict:
         """Brainstorm a single scene with full transparency"""
         print(f"\n🎬 Brainstorming Act {act}, Scene {scene}")
         
-        try:
-            # 1. Assemble context
-            print("  📊 Assembling context...")
-            context = self.assemble_context(act, scene)
-            
-            # 2. Compile prompts
-            print("  📝 Compiling prompts...")
-            prompts = self.compile_prompts(context)
-            
-            # 3. Execute queries
-            print("  🔍 Executing queries...")
-            responses = await self.execute_queries(prompts, context)
-            
-            # 4. Compile results
-            scene_result = {
-                "act": act,
-                "scene": scene,
-                "context": context,
-                "prompts": prompts,
-                "responses": responses,
-                "timestamp": datetime.now(),
-                "success": all(r["success"] for r in responses.values())
-            }
-            
-            print(f"  ✅ Scene {scene} brainstorming complete")
-            return scene_result
-            
-        except Exception as e:
-            print(f"  ❌ Error brainstorming scene: {e}")
-            return {
-                "act": act,
-                "scene": scene,
-                "error": str(e),
-                "timestamp": datetime.now(),
-                "success": False
-            }
+        # One transaction per scene; queued step writes are flushed even if the scene fails
+        # LLM and embedding calls made for the scene are attributed to it in the usage ledger
+        with span("brainstorm_scene", "scene", act=act, scene=scene), self.steps.scene(), \
+                operation(project=self.project_name, session=self.current_session["session_id"], scene=f"{act}.{scene}"):
+            try:
+                # 1. Assemble context
+                print("  📊 Assembling context...")
+                with span("assemble_context"):
+                    context = self.assemble_context(act, scene)
+                
+                # 2. Compile prompts
+                print("  📝 Compiling prompts...")
+                with span("compile_prompts"):
+                    prompts = self.compile_prompts(context)
+                
+                # 3. Execute queries
+                with span("reuse_check", "db", force=self.force):
+                    fingerprints = self.scene_fingerprints(prompts)
+                    reused = {} if self.force else self.reuse_outputs(fingerprints, context)
+                    annotate(reused=len(reused))
+                if reused and len(reused) == len(fingerprints):
+                    print("  ♻️ Inputs unchanged, reusing previous outputs")
+                    responses = reused
+                    self.current_session["reused_scenes"] += 1
+                elif self.retrieval_mode == "context":
+                    print("  🔍 Retrieving bucket context...")
+                    responses = await self.execute_context_query(prompts, context, fingerprints["synthesis"])
+                else:
+                    print("  🔍 Executing queries...")
+                    pending = {bucket: {**prompt_data, "input_fingerprint": fingerprints[bucket]}
+                               for bucket, prompt_data in prompts.items() if bucket not in reused}
+                    with operation(stage="query"), span("query", buckets=len(pending)):
+                        responses = {**reused, **await self.execute_queries(pending, context)}
+                
+                # 4. Compile results
+                scene_result = {
+                    "act": act,
+                    "scene": scene,
+                    "context": context,
+                    "prompts": prompts,
+                    "responses": responses,
+                    "timestamp": datetime.now(),
+                    "success": all(r["success"] for r in responses.values())
+                }
+                
+                print(f"  ✅ Scene {scene} brainstorming complete")
+                return scene_result
+                
+            except Exception as e:
+                print(f"  ❌ Error brainstorming scene: {e}")
+                return {
+                    "act": act,
+                    "scene": scene,
+                    "error": str(e),
+                    "timestamp": datetime.now(),
+                    "success": False
+                }
     
-    async def brainstorm_all_scenes(self, buckets: List[str], user_guidance: str = "") -> str:
-        """Brainstorm all scenes with full session tracking"""
+    async def brainstorm_all_scenes(self, buckets: List[str], user_guidance: str = "", force: bool = None) -> str:
+        """Brainstorm all scenes with full session tracking; force re-queries scenes whose inputs are unchanged"""
+        if force is not None:
+            self.force = force
         session_id = self.start_session(buckets, user_guidance)
         
         # Get all scenes
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT act, scene 
-            FROM story_outline 
-            ORDER BY act, scene
-        ''')
-        scenes = cursor.fetchall()
+        scenes = self.project_snapshot.scenes()
         
         if not scenes:
             print("❌ No scenes found in story outline")
@@ -523,38 +655,49 @@ class TransparentBrainstormer:
         scene_results = []
         successful_scenes = 0
         
-        for act, scene in scenes:
-            result = await self.brainstorm_scene(act, scene)
-            scene_results.append(result)
-            
-            if result.get("success", False):
-                successful_scenes += 1
+        # With tracing on, nested scene timings go to <project>/traces/<session_id>.json
+        with trace_session(session_id, os.path.join(self.project_path, "traces"),
+                           enabled=self.trace, project=self.project_name, pipeline="brainstorm") as trace:
+            self.last_trace = trace
+            for act, scene in scenes:
+                result = await self.brainstorm_scene(act, scene)
+                scene_results.append(result)
+                
+                if result.get("success", False):
+                    successful_scenes += 1
         
         # Complete session
         self.current_session["end_time"] = datetime.now()
         self.current_session["status"] = "completed"
         
+        self.steps.flush()
+        cursor = self.conn.cursor()
         cursor.execute('''
             UPDATE brainstorm_sessions 
-            SET end_time = ?, total_scenes = ?, status = ?
+            SET end_time = ?, total_scenes = ?, status = ?, reused_scenes = ?
             WHERE session_id = ?
-        ''', (datetime.now(), successful_scenes, "completed", session_id))
+        ''', (datetime.now(), successful_scenes, "completed", self.current_session["reused_scenes"], session_id))
         self.conn.commit()
         
         print(f"\n✅ Brainstorming session complete!")
         print(f"📊 Successfully processed: {successful_scenes}/{len(scenes)} scenes")
+        if self.current_session["reused_scenes"]:
+            print(f"♻️ Reused unchanged scenes: {self.current_session['reused_scenes']}")
         
         self.trigger_callback('session_completed', {
             'session_id': session_id,
             'total_scenes': len(scenes),
             'successful_scenes': successful_scenes,
+            'reused_scenes': self.current_session["reused_scenes"],
             'results': scene_results
         })
+        await self.events.adrain()
         
         return session_id
     
     def get_session_summary(self, session_id: str) -> Dict:
         """Get comprehensive summary of a brainstorming session"""
+        self.steps.flush()
         cursor = self.conn.cursor()
         
         # Get session info
@@ -566,6 +709,7 @@ class TransparentBrainstormer:
         
         if not session_data:
             return {"error": "Session not found"}
+        reused_scenes = session_data[8] if len(session_data) > 8 else 0
         
         # Get all outputs
         cursor.execute('''
@@ -591,7 +735,10 @@ class TransparentBrainstormer:
             "total_outputs": len(outputs),
             "outputs_by_scene": self._group_outputs_by_scene(outputs),
             "step_counts": step_counts,
-            "buckets_used": session_data[4].split(',') if session_data[4] else []
+            "reused_scenes": reused_scenes or 0,
+            "buckets_used": session_data[5].split(',') if session_data[5] else [],
+            "llm_usage": get_ledger().totals(session=session_id),
+            "llm_usage_by_stage": get_ledger().rollup(by=("stage", "bucket"), session=session_id)
         }
     
     def _group_outputs_by_scene(self, outputs: List) -> Dict:
@@ -622,6 +769,7 @@ class TransparentBrainstormer:
             f"Project: {self.project_name}",
             f"Buckets Used: {', '.join(summary['buckets_used'])}",
             f"Total Outputs: {summary['total_outputs']}",
+            f"Reused Scenes: {summary['reused_scenes']}",
             f"Step Counts: {summary['step_counts']}",
             f"",
             f"SCENE-BY-SCENE RESULTS:",
@@ -707,18 +855,20 @@ class BrainstormConsole:
         
         print(f"\n🎉 Session completed: {session_id}")
         print(f"📊 Results: {successful}/{total} scenes successful")
+        if data.get('reused_scenes'):
+            print(f"♻️ Reused without new queries: {data['reused_scenes']}")
 
 
-async def demo_transparent_brainstorm():
+async def demo_transparent_brainstorm(project_path: str = "exports/the_wrong_wedding_20250813_1253",
+                                       force: bool = False):
     """Demonstrate transparent brainstorming"""
-    project_path = "exports/the_wrong_wedding_20250813_1253"
     
     if not os.path.exists(project_path):
         print(f"Project not found: {project_path}")
         return
     
     # Initialize components
-    brainstormer = TransparentBrainstormer(project_path)
+    brainstormer = TransparentBrainstormer(project_path, force=force)
     console = BrainstormConsole(brainstormer)
     
     print("\n" + "="*60)
@@ -738,4 +888,9 @@ async def demo_transparent_brainstorm():
 
 
 if __name__ == "__main__":
-    asyncio.run(demo_transparent_brainstorm())
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Transparent brainstorming for a Lizzy project")
+    parser.add_argument("project_path", nargs="?", default="exports/the_wrong_wedding_20250813_1253")
+    parser.add_argument("--force", action="store_true", help="re-query scenes even when their inputs are unchanged")
+    args = parser.parse_args()
+    asyncio.run(demo_transparent_brainstorm(args.project_path, args.force))
\ No newline at end of file
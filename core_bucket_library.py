@@ -8,8 +8,9 @@ import json
 import shutil
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 import hashlib
+from util_zipstream import stream_directory_zip, write_zip, directory_entries
 
 class BucketLibrary:
     """Manages a centralized library of LightRAG buckets"""
@@ -218,21 +219,38 @@ class BucketLibrary:
         
         return buckets
     
-    def export_bucket(self, bucket_id: str, export_path: str) -> Dict:
-        """Export a bucket from the library to an external location"""
+    def export_bucket(self, bucket_id: str, export_path: str, as_zip: bool = False,
+                      compresslevel: int = 6, store_compressed: bool = True) -> Dict:
+        """Export a bucket from the library to an external location (directory copy or zip archive)"""
         bucket_path = self.buckets_dir / bucket_id
         
         if not bucket_path.exists():
             return {"success": False, "error": f"Bucket {bucket_id} not found"}
         
-        export_dest = Path(export_path) / bucket_id
-        
         try:
+            if as_zip:
+                # Streamed straight to disk, so memory stays flat regardless of bucket size
+                export_dest = Path(export_path) / f"{bucket_id}.zip"
+                size = write_zip(directory_entries(str(bucket_path)), str(export_dest),
+                                 compresslevel, store_compressed)
+                return {"success": True, "exported_to": str(export_dest), "size_bytes": size}
+            
+            export_dest = Path(export_path) / bucket_id
             shutil.copytree(bucket_path, export_dest)
             return {"success": True, "exported_to": str(export_dest)}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def stream_bucket_archive(self, bucket_id: str, compresslevel: int = 6,
+                              store_compressed: bool = True) -> Optional[Iterator[bytes]]:
+        """Zip a library bucket as a stream of chunks for HTTP responses"""
+        bucket_path = self.buckets_dir / bucket_id
+        
+        if not bucket_path.exists():
+            return None
+        
+        return stream_directory_zip(str(bucket_path), compresslevel, store_compressed)
+    
     def share_bucket_between_projects(self, bucket_id: str, from_project: str, 
                                      to_project: str) -> Dict:
         """Share a bucket from one project to another"""
@@ -0,0 +1,37 @@
+"""
+Input Fingerprints for Lizzy
+Identifies a scene's brainstorm inputs so unchanged scenes can reuse earlier outputs
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+# LightRAG rewrites these on every query, so they say nothing about bucket content
+VOLATILE_BUCKET_FILES = ("kv_store_llm_response_cache.json",)
+
+
+def bucket_content_version(bucket_dir: str) -> str:
+    """Cheap content version for a LightRAG working dir: name, size and mtime of its storage files"""
+    if not os.path.isdir(bucket_dir):
+        return ""
+    digest = hashlib.sha256()
+    for entry in sorted(os.scandir(bucket_dir), key=lambda e: e.name):
+        if not entry.is_file() or entry.name.startswith(".") or entry.name in VOLATILE_BUCKET_FILES:
+            continue
+        stat = entry.stat()
+        digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def input_fingerprint(prompt: str, mode: str, bucket_versions: Dict[str, str],
+                      options: Optional[Dict] = None) -> str:
+    """Hash of everything that determines a brainstorm output: prompt, retrieval mode and bucket contents"""
+    payload = json.dumps({
+        "prompt": prompt,
+        "mode": mode,
+        "buckets": sorted(bucket_versions.items()),
+        "options": options or {}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
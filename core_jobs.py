@@ -0,0 +1,358 @@
+"""
+Background Job Runner for Lizzy
+Persistent, restart-safe processing jobs with per-file progress, ETA and cancellation
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobStore:
+    """SQLite-backed job and per-file state, so queued work survives a server restart"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.setup_tables()
+
+    def setup_tables(self):
+        """Create job tracking tables"""
+        with self._lock:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    bucket TEXT,
+                    project TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    cancel_requested INTEGER DEFAULT 0,
+                    total_files INTEGER DEFAULT 0,
+                    processed_files INTEGER DEFAULT 0,
+                    failed_files INTEGER DEFAULT 0,
+                    total_bytes INTEGER DEFAULT 0,
+                    processed_bytes INTEGER DEFAULT 0,
+                    error TEXT,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    filename TEXT,
+                    size INTEGER DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    duration REAL,
+                    PRIMARY KEY (job_id, position)
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            ''')
+            self.conn.commit()
+
+    def create_job(self, kind: str, bucket: str, file_paths: List[str], project: str = None) -> str:
+        """Persist a new queued job and its file list"""
+        job_id = f"JOB_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        files = []
+        for position, path in enumerate(file_paths):
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            files.append((job_id, position, path, os.path.basename(path), size))
+
+        with self._lock:
+            self.conn.execute('''
+                INSERT INTO jobs (job_id, kind, bucket, project, status, total_files, total_bytes, created_at)
+                VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+            ''', (job_id, kind, bucket, project, len(files), sum(f[4] for f in files), datetime.now().isoformat()))
+            self.conn.executemany('''
+                INSERT INTO job_files (job_id, position, path, filename, size) VALUES (?, ?, ?, ?, ?)
+            ''', files)
+            self.conn.commit()
+        return job_id
+
+    def claim_next_job(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            started_at = row["started_at"] or datetime.now().isoformat()
+            self.conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                              (started_at, row["job_id"]))
+            self.conn.commit()
+            job = dict(row)
+            job["status"] = "running"
+            job["started_at"] = started_at
+            return job
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs that were running when the process died back on the queue"""
+        with self._lock:
+            self.conn.execute("UPDATE job_files SET status = 'pending', started_at = NULL WHERE status = 'processing'")
+            cursor = self.conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self.conn.commit()
+            return cursor.rowcount
+
+    def pending_files(self, job_id: str) -> List[Dict]:
+        """Files of a job that still need processing"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM job_files WHERE job_id = ? AND status = 'pending' ORDER BY position", (job_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def mark_file_started(self, job_id: str, position: int):
+        with self._lock:
+            self.conn.execute("UPDATE job_files SET status = 'processing', started_at = ? WHERE job_id = ? AND position = ?",
+                              (datetime.now().isoformat(), job_id, position))
+            self.conn.commit()
+
+    def mark_file_finished(self, job_id: str, file: Dict, success: bool, duration: float, error: str = None):
+        """Record one file's outcome and roll it into the job counters"""
+        with self._lock:
+            self.conn.execute('''
+                UPDATE job_files SET status = ?, error = ?, finished_at = ?, duration = ?
+                WHERE job_id = ? AND position = ?
+            ''', ("done" if success else "failed", error, datetime.now().isoformat(), round(duration, 3),
+                  job_id, file["position"]))
+            self.conn.execute('''
+                UPDATE jobs SET processed_files = processed_files + ?, failed_files = failed_files + ?,
+                                processed_bytes = processed_bytes + ?
+                WHERE job_id = ?
+            ''', (1 if success else 0, 0 if success else 1, file.get("size") or 0, job_id))
+            self.conn.commit()
+
+    def finish_job(self, job_id: str, status: str, error: str = None):
+        with self._lock:
+            if status == "cancelled":
+                self.conn.execute("UPDATE job_files SET status = 'cancelled' WHERE job_id = ? AND status = 'pending'",
+                                  (job_id,))
+            self.conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                              (status, error, datetime.now().isoformat(), job_id))
+            self.conn.commit()
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Flag a job for cancellation; queued jobs are cancelled immediately. Returns the resulting status"""
+        with self._lock:
+            row = self.conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] in FINISHED_STATUSES:
+                return row["status"]
+            self.conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+            self.conn.commit()
+            if row["status"] == "queued":
+                self.finish_job(job_id, "cancelled")
+                return "cancelled"
+            return "cancelling"
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_job_files(self, job_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def list_jobs(self, bucket: str = None, status: str = None, limit: int = 50) -> List[Dict]:
+        query = "SELECT * FROM jobs WHERE 1 = 1"
+        params = []
+        if bucket:
+            query += " AND bucket = ?"
+            params.append(bucket)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(r) for r in rows]
+
+
+class JobRunner:
+    """Worker pool that drains the job queue with bounded concurrency"""
+
+    def __init__(self, store: JobStore, processor: Callable[[Dict, Dict], Dict], max_workers: int = 2,
+                 poll_interval: float = 1.0):
+        """processor(job, file) does the work for one file and returns {"success": bool, "error": str}"""
+        self.store = store
+        self.processor = processor
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Condition()
+        self._workers = []
+        self._stopping = False
+
+    def start(self):
+        """Requeue interrupted jobs and start the worker threads"""
+        if self._workers:
+            return
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"🔄 Requeued {requeued} interrupted job(s)")
+        self._stopping = False
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"lizzy-job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop workers after their current file"""
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(self, kind: str, bucket: str, file_paths: List[str], project: str = None) -> str:
+        """Queue a job and return its id immediately"""
+        job_id = self.store.create_job(kind, bucket, file_paths, project)
+        if not self._workers:
+            self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def cancel(self, job_id: str) -> Dict:
+        status = self.store.request_cancel(job_id)
+        if status is None:
+            return {"success": False, "error": "Job not found"}
+        return {"success": True, "job_id": job_id, "status": status}
+
+    def _worker_loop(self):
+        while not self._stopping:
+            job = self.store.claim_next_job()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Dict):
+        job_id = job["job_id"]
+        print(f"🚀 Job {job_id}: processing {job['total_files']} file(s) for '{job['bucket']}'")
+        try:
+            for file in self.store.pending_files(job_id):
+                if self.store.is_cancel_requested(job_id):
+                    self.store.finish_job(job_id, "cancelled")
+                    print(f"🛑 Job {job_id} cancelled")
+                    return
+                if self._stopping:
+                    # Leave the job running in the store; it is requeued on next start
+                    return
+
+                self.store.mark_file_started(job_id, file["position"])
+                start = time.time()
+                try:
+                    result = self.processor(job, file) or {}
+                    success, error = bool(result.get("success")), result.get("error")
+                except Exception as e:
+                    success, error = False, str(e)
+                self.store.mark_file_finished(job_id, file, success, time.time() - start, error)
+                print(f"  {'✅' if success else '❌'} {file['filename']}" + (f": {error}" if error else ""))
+
+            final = self.store.get_job(job_id)
+            status = "failed" if final["total_files"] and final["failed_files"] == final["total_files"] else "completed"
+            self.store.finish_job(job_id, status)
+            print(f"🎉 Job {job_id} {status}: {final['processed_files']}/{final['total_files']} processed")
+        except Exception as e:
+            self.store.finish_job(job_id, "failed", str(e))
+            print(f"❌ Job {job_id} failed: {e}")
+
+    def get_progress(self, job_id: str, include_files: bool = True) -> Optional[Dict]:
+        """Progress report with percent complete, throughput and ETA"""
+        job = self.store.get_job(job_id)
+        if job is None:
+            return None
+
+        done_files = job["processed_files"] + job["failed_files"]
+        total_files = job["total_files"] or 0
+        progress = dict(job)
+        progress["percent"] = round(100.0 * done_files / total_files, 1) if total_files else 100.0
+
+        elapsed = 0.0
+        if job["started_at"]:
+            end = datetime.fromisoformat(job["finished_at"]) if job["finished_at"] else datetime.now()
+            elapsed = max((end - datetime.fromisoformat(job["started_at"])).total_seconds(), 0.0)
+        progress["elapsed_seconds"] = round(elapsed, 1)
+
+        files_per_sec = done_files / elapsed if elapsed > 0 else 0.0
+        bytes_done = job["processed_bytes"] or 0
+        bytes_per_sec = bytes_done / elapsed if elapsed > 0 else 0.0
+        progress["throughput"] = {
+            "files_per_minute": round(files_per_sec * 60, 2),
+            "bytes_per_second": round(bytes_per_sec, 1)
+        }
+
+        eta = None
+        if job["status"] == "running" and done_files:
+            # Size-weighted when we have byte progress, otherwise average seconds per file
+            remaining_bytes = (job["total_bytes"] or 0) - bytes_done
+            if bytes_per_sec > 0 and remaining_bytes > 0:
+                eta = remaining_bytes / bytes_per_sec
+            elif files_per_sec > 0:
+                eta = (total_files - done_files) / files_per_sec
+        elif job["status"] in FINISHED_STATUSES:
+            eta = 0.0
+        progress["eta_seconds"] = round(eta, 1) if eta is not None else None
+
+        if include_files:
+            progress["files"] = self.store.get_job_files(job_id)
+        return progress
+
+    def list_jobs(self, bucket: str = None, status: str = None, limit: int = 50) -> List[Dict]:
+        return [self.get_progress(job["job_id"], include_files=False)
+                for job in self.store.list_jobs(bucket, status, limit)]
+
+
+def register_job_routes(app, runner: JobRunner):
+    """Add /api/jobs endpoints for a runner to a Flask app"""
+    from flask import jsonify, request
+
+    @app.route('/api/jobs', methods=['GET'])
+    def list_jobs():
+        """List recent jobs, optionally filtered by bucket or status"""
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify(runner.list_jobs(request.args.get('bucket'), request.args.get('status'), limit))
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """Per-file progress, throughput and ETA for a job"""
+        progress = runner.get_progress(job_id)
+        if progress is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(progress)
+
+    @app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        """Cancel a queued job or stop a running one after its current file"""
+        result = runner.cancel(job_id)
+        return jsonify(result), (200 if result["success"] else 404)
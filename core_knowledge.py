@@ -3,6 +3,7 @@ LightRAG Management and Visualization Layer for Lizzy
 Handles knowledge graph operations, bucket management, and data queries
 """
 
+import asyncio
 import os
 import sys
 import json
@@ -10,7 +11,7 @@ import sqlite3
 import webbrowser
 import time
 import psutil
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
 from lightrag import LightRAG, QueryParam
 from lightrag.llm.openai import gpt_4o_mini_complete, openai_embed
@@ -19,6 +20,15 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from io import StringIO
 from bucket_alt.util_visualizer import create_interactive_graph, create_multi_graph_explorer
+from util_async import run_sync, on_shared_loop
+from util_ratelimit import limit_embedding, limit_llm, llm_limit_stats
+from util_resilience import CircuitBreaker, LatencyWindow, hedged
+from util_accounting import get_ledger, operation
+from util_tracing import annotate, span
+from util_metrics import (BUCKET_CIRCUIT_OPEN, BUCKET_HEDGES, BUCKET_QUERIES, BUCKET_QUERY_SECONDS,
+                          INGEST_BYTES, INGEST_DOCUMENTS, INGEST_SECONDS)
+from core_fingerprint import bucket_content_version
+from util_timeseries import TimeSeriesStore, get_timeseries
 
 # Auto-load environment variables from .env file
 try:
@@ -31,7 +41,8 @@ except ImportError:
 class LightRAGManager:
     """Manages LightRAG instances and provides visualization/query capabilities"""
     
-    def __init__(self, base_dir="lightrag_working_dir"):
+    def __init__(self, base_dir="lightrag_working_dir", hedge_queries: bool = None,
+                 query_timeout: float = None, failure_threshold: int = 3, reset_timeout: float = 30.0):
         self.base_dir = base_dir
         os.makedirs(base_dir, exist_ok=True)
         self.buckets = {}
@@ -40,10 +51,19 @@ class LightRAGManager:
         self.performance_stats = {}
         self.query_history = []
         self.system_metrics = {}
+        
+        # A failing bucket is skipped fast instead of stalling every scene; a slow query can be hedged at the p95
+        self.hedge_queries = (os.getenv("LIZZY_HEDGE_QUERIES", "0") == "1") if hedge_queries is None else hedge_queries
+        self.query_timeout = query_timeout or float(os.getenv("LIZZY_QUERY_TIMEOUT", "90"))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyWindow] = {}
         self.load_bucket_config()
         # Load performance statistics after bucket config
         self.load_performance_stats()
         self.initialize_statistics_tracking()
+        self.initialize_timeseries()
     
     def create_bucket(self, bucket_name: str, description: str = "", auto_activate: bool = True) -> bool:
         """Create a new LightRAG bucket"""
@@ -54,27 +74,8 @@ class LightRAGManager:
         bucket_dir = os.path.join(self.base_dir, bucket_name)
         os.makedirs(bucket_dir, exist_ok=True)
         
-        # Initialize LightRAG instance
-        rag = LightRAG(
-            working_dir=bucket_dir,
-            embedding_func=openai_embed,
-            llm_model_func=gpt_4o_mini_complete
-        )
-        
-        # Initialize storages synchronously for now (async version would be better)
-        import asyncio
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        # Initialize LightRAG v1.4.7+ requirements
-        async def init_rag():
-            await rag.initialize_storages()
-            await initialize_pipeline_status()
-        
-        loop.run_until_complete(init_rag())
+        # Initialize LightRAG instance on the shared loop so later async queries can reuse it
+        rag = run_sync(self._init_rag(bucket_dir))
         self.buckets[bucket_name] = rag
         
         # Store metadata
@@ -95,8 +96,25 @@ class LightRAGManager:
         print(f"✅ Created bucket: {bucket_name}")
         return True
     
+    async def _init_rag(self, bucket_dir: str) -> LightRAG:
+        """Create a LightRAG instance and initialize its storages (must run on the shared loop)"""
+        rag = LightRAG(
+            working_dir=bucket_dir,
+            embedding_func=limit_embedding(openai_embed),
+            llm_model_func=limit_llm(gpt_4o_mini_complete)
+        )
+        
+        # Initialize LightRAG v1.4.7+ requirements
+        await rag.initialize_storages()
+        await initialize_pipeline_status()
+        return rag
+    
     def load_bucket(self, bucket_name: str) -> bool:
         """Load an existing bucket"""
+        return run_sync(self._aload_bucket(bucket_name))
+    
+    async def _aload_bucket(self, bucket_name: str) -> bool:
+        """Load an existing bucket from within the shared loop"""
         bucket_dir = os.path.join(self.base_dir, bucket_name)
         
         if not os.path.exists(bucket_dir):
@@ -104,28 +122,8 @@ class LightRAGManager:
             return False
         
         if bucket_name not in self.buckets:
-            # Create LightRAG instance
-            rag = LightRAG(
-                working_dir=bucket_dir,
-                embedding_func=openai_embed,
-                llm_model_func=gpt_4o_mini_complete
-            )
-            
-            # Initialize storages synchronously for LightRAG v1.4.7+
-            import asyncio
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            # Initialize LightRAG v1.4.7+ requirements
-            async def init_rag():
-                await rag.initialize_storages()
-                await initialize_pipeline_status()
-            
-            loop.run_until_complete(init_rag())
-            self.buckets[bucket_name] = rag
+            with span("load_bucket", "retrieval", bucket=bucket_name):
+                self.buckets[bucket_name] = await self._init_rag(bucket_dir)
         
         return True
     
@@ -142,19 +140,14 @@ class LightRAGManager:
             print(f"📊 Step 1/4: Preparing document for LightRAG insertion...")
             
             # Use async insertion method
-            import asyncio
             async def insert_doc():
                 print(f"📊 Step 2/4: Generating embeddings and extracting entities...")
                 await self.buckets[bucket_name].ainsert(document)
                 print(f"📊 Step 3/4: Building knowledge graph relationships...")
             
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            loop.run_until_complete(insert_doc())
+            filename = (metadata or {}).get('filename', 'document')
+            with operation(bucket=bucket_name, document=filename, stage="ingest") as usage:
+                run_sync(insert_doc())
             print(f"📊 Step 4/4: Updating metadata and saving to storage...")
             print(f"✅ Document processing completed successfully!")
             
@@ -188,7 +181,7 @@ class LightRAGManager:
             end_time = time.time()
             self.track_processing_performance(
                 bucket_name, "document_insert", start_time, end_time, True,
-                {"document_length": len(document), "filename": metadata.get('filename', 'document')}
+                {"document_length": len(document), "filename": metadata.get('filename', 'document'), **usage.to_dict()}
             )
             
             # Return detailed success info
@@ -199,7 +192,8 @@ class LightRAGManager:
                 "document_length": len(document),
                 "bucket": bucket_name,
                 "new_document_count": self.bucket_metadata[bucket_name].get("document_count", 0),
-                "processing_time": round(end_time - start_time, 3)
+                "processing_time": round(end_time - start_time, 3),
+                "llm_usage": usage.to_dict()
             }
             
         except Exception as e:
@@ -240,20 +234,74 @@ class LightRAGManager:
         print(f"✅ Bucket '{bucket_name}' {status}")
         return True
     
-    def query_bucket(self, bucket_name: str, query: str, mode: str = "hybrid") -> Dict:
+    def bucket_version(self, bucket_name: str) -> str:
+        """Changes whenever documents are added to the bucket; empty if the bucket does not exist"""
+        return bucket_content_version(os.path.join(self.base_dir, bucket_name))
+    
+    def query_bucket(self, bucket_name: str, query: str, mode: str = "hybrid",
+                     only_need_context: bool = False, top_k: int = None) -> Dict:
         """Query a specific bucket with performance tracking"""
+        return run_sync(self._aquery_bucket(bucket_name, query, mode, only_need_context, top_k))
+    
+    async def aquery_bucket(self, bucket_name: str, query: str, mode: str = "hybrid",
+                            only_need_context: bool = False, top_k: int = None) -> Dict:
+        """Async query_bucket for async views - awaits the shared loop instead of holding a thread"""
+        return await on_shared_loop(self._aquery_bucket(bucket_name, query, mode, only_need_context, top_k))
+    
+    def breaker(self, bucket_name: str) -> CircuitBreaker:
+        if bucket_name not in self.breakers:
+            self.breakers[bucket_name] = CircuitBreaker(bucket_name, self.failure_threshold, self.reset_timeout)
+            self.latencies[bucket_name] = LatencyWindow()
+        return self.breakers[bucket_name]
+    
+    def hedge_delay(self, bucket_name: str) -> Optional[float]:
+        """The bucket's observed p95, once there are enough queries to trust it"""
+        window = self.latencies.get(bucket_name)
+        if not self.hedge_queries or window is None or len(window) < 20:
+            return None
+        return window.percentile(95)
+    
+    async def _aquery_bucket(self, bucket_name: str, query: str, mode: str = "hybrid",
+                             only_need_context: bool = False, top_k: int = None) -> Dict:
+        """Query implementation; always runs on the shared loop.
+
+        only_need_context returns the retrieved context without an LLM answer; top_k sets retrieval depth.
+        """
         if bucket_name not in self.buckets:
-            if not self.load_bucket(bucket_name):
+            if not await self._aload_bucket(bucket_name):
                 return {"error": f"Bucket not found: {bucket_name}"}
         
+        breaker = self.breaker(bucket_name)
+        if not breaker.allow():
+            BUCKET_QUERIES.inc(bucket=bucket_name, mode=mode, status="circuit_open")
+            return {
+                "error": f"Bucket {bucket_name} is failing; skipped (circuit open, retry in {breaker.retry_in():.0f}s)",
+                "bucket": bucket_name,
+                "query": query,
+                "circuit_open": True,
+                "response_time": 0
+            }
+        
+        param = QueryParam(mode=mode, only_need_context=only_need_context)
+        if top_k:
+            param.top_k = top_k
+        
         start_time = time.time()
         try:
-            result = self.buckets[bucket_name].query(
-                query,
-                param=QueryParam(mode=mode)
-            )
+            with operation(bucket=bucket_name), span("query_bucket", "retrieval", bucket=bucket_name, mode=mode,
+                                                     context_only=only_need_context):
+                result, was_hedged = await asyncio.wait_for(
+                    hedged(lambda: self.buckets[bucket_name].aquery(query, param=param), self.hedge_delay(bucket_name)),
+                    self.query_timeout
+                )
+                annotate(hedged=was_hedged, result_chars=len(str(result)) if result else 0)
             
             end_time = time.time()
+            breaker.record_success()
+            self.latencies[bucket_name].record(end_time - start_time)
+            self.record_query_metrics(bucket_name, mode, "ok", end_time - start_time, breaker)
+            if was_hedged:
+                BUCKET_HEDGES.inc(bucket=bucket_name)
             
             # Track performance
             result_length = len(str(result)) if result else 0
@@ -265,20 +313,38 @@ class LightRAGManager:
                 "mode": mode,
                 "response": result,
                 "timestamp": datetime.now().isoformat(),
-                "response_time": round(end_time - start_time, 3)
+                "response_time": round(end_time - start_time, 3),
+                "hedged": was_hedged
             }
             
+        except asyncio.CancelledError:
+            # The caller gave up (retrieval budget, shutdown, client gone); that says nothing about the bucket
+            breaker.record_cancelled()
+            self.record_query_metrics(bucket_name, mode, "cancelled", time.time() - start_time, breaker)
+            raise
         except Exception as e:
             end_time = time.time()
+            # Only this method's own wait_for timeout and real errors count against the bucket
+            error = f"Timed out after {self.query_timeout:g}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+            breaker.record_failure(error or type(e).__name__)
+            self.latencies[bucket_name].record(end_time - start_time)
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            self.record_query_metrics(bucket_name, mode, status, end_time - start_time, breaker)
             # Track failed query
             self.track_query_performance(bucket_name, query, mode, start_time, end_time, 0)
             return {
-                "error": str(e),
+                "error": error,
                 "bucket": bucket_name,
                 "query": query,
                 "response_time": round(end_time - start_time, 3)
             }
     
+    def record_query_metrics(self, bucket_name: str, mode: str, status: str, seconds: float, breaker: CircuitBreaker):
+        """Feed one finished query into the /metrics histograms and counters"""
+        BUCKET_QUERY_SECONDS.observe(seconds, bucket=bucket_name, mode=mode)
+        BUCKET_QUERIES.inc(bucket=bucket_name, mode=mode, status=status)
+        BUCKET_CIRCUIT_OPEN.set(1 if breaker.state == "open" else 0, bucket=bucket_name)
+    
     def query_active_buckets(self, query: str, mode: str = "hybrid") -> List[Dict]:
         """Query all active buckets"""
         results = []
@@ -527,6 +593,26 @@ class LightRAGManager:
                     "system_metrics": []
                 }, f, indent=2)
     
+    def initialize_timeseries(self):
+        """Share the process-wide query/ingest rollup store, seeding it once from the capped JSON query history"""
+        self.timeseries = get_timeseries(os.path.join(self.base_dir, "_statistics", "timeseries.db"),
+                                         seed=self.backfill_timeseries)
+    
+    def backfill_timeseries(self, store: TimeSeriesStore):
+        if not store.is_empty():
+            return
+        try:
+            with open(self.perf_file, 'r') as f:
+                history = json.load(f).get("query_history", [])
+            events = [(datetime.fromisoformat(q["timestamp"].replace('Z', '')).timestamp(), q["bucket"],
+                       q.get("mode", ""), q.get("duration_seconds", 0.0)) for q in history]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Could not read query history for time-series backfill: {e}")
+            return
+        if events:
+            loaded = store.backfill("query", events)
+            print(f"📈 Seeded time-series rollups with {loaded} historical queries")
+    
     def track_query_performance(self, bucket_name: str, query: str, mode: str, start_time: float, end_time: float, result_length: int):
         """Track query performance metrics"""
         duration = end_time - start_time
@@ -541,8 +627,9 @@ class LightRAGManager:
             "success": True
         }
         
-        # Store in memory
+        # Store in memory (recent queries only) and in the time-series rollups (full history)
         self.query_history.append(query_record)
+        self.timeseries.record("query", bucket_name, duration, mode, end_time)
         
         # Update bucket usage stats
         if bucket_name not in self.performance_stats:
@@ -598,6 +685,13 @@ class LightRAGManager:
         proc_stats["total_time"] += duration
         proc_stats["avg_processing_time"] = proc_stats["total_time"] / proc_stats["total_operations"]
         
+        self.timeseries.record("ingest", bucket_name, duration, operation, end_time)
+        if operation == "document_insert":
+            INGEST_DOCUMENTS.inc(bucket=bucket_name, status="ok" if success else "error")
+            INGEST_SECONDS.observe(duration, bucket=bucket_name)
+            if success:
+                INGEST_BYTES.inc((metadata or {}).get("document_length", 0), bucket=bucket_name)
+        
         self.save_performance_stats()
     
     def get_bucket_performance_stats(self, bucket_name: str) -> Dict:
@@ -627,6 +721,20 @@ class LightRAGManager:
                 "slowest_query": round(bucket_perf.get("slowest_query", 0), 3)
             })
         
+        # Circuit breaker and recent latency percentiles (this process only)
+        breaker = self.breaker(bucket_name)
+        window = self.latencies[bucket_name]
+        perf_stats["circuit_breaker"] = breaker.stats()
+        # LLM and embedding calls made on the bucket's behalf, from the usage ledger
+        perf_stats["llm_usage"] = get_ledger().rollup(by=("stage",), bucket=bucket_name)
+        perf_stats["performance"].update({
+            "p50_query_time": round(window.percentile(50) or 0, 3),
+            "p95_query_time": round(window.percentile(95) or 0, 3),
+            "hedge_after": self.hedge_delay(bucket_name)
+        })
+        if breaker.failures + breaker.successes:
+            perf_stats["performance"]["success_rate"] = round(100.0 * breaker.successes / (breaker.failures + breaker.successes), 1)
+        
         # Calculate storage size
         if os.path.exists(bucket_dir):
             total_size = 0
@@ -671,7 +779,8 @@ class LightRAGManager:
                     "used_percent": round((disk.used / disk.total) * 100, 1)
                 },
                 "active_buckets": len(self.active_buckets),
-                "total_buckets": len(self.bucket_metadata)
+                "total_buckets": len(self.bucket_metadata),
+                "llm_limits": llm_limit_stats()
             }
             
             return metrics
@@ -687,7 +796,7 @@ class LightRAGManager:
                 "total_entities": 0,
                 "total_relationships": 0,
                 "total_documents": 0,
-                "total_queries": len(self.query_history),
+                "total_queries": self.timeseries.total("query")["count"],
                 "analysis_date": datetime.now().isoformat()
             },
             "bucket_stats": {},
@@ -739,23 +848,21 @@ class LightRAGManager:
             analytics["performance_summary"]["most_used_bucket"] = max(bucket_query_counts, key=bucket_query_counts.get) if bucket_query_counts else None
             analytics["performance_summary"]["most_used_query_mode"] = max(mode_usage, key=mode_usage.get) if any(mode_usage.values()) else None
         
-        # Recent activity analysis
-        now = datetime.now()
-        last_24h = now - timedelta(days=1)
-        last_7d = now - timedelta(days=7)
-        
-        for query in self.query_history:
-            query_time = datetime.fromisoformat(query["timestamp"].replace('Z', '+00:00').replace('+00:00', ''))
-            if query_time >= last_24h:
-                analytics["recent_activity"]["last_24h_queries"] += 1
-            if query_time >= last_7d:
-                analytics["recent_activity"]["last_7d_queries"] += 1
+        # Recent activity from the hourly rollups (hour granularity at the window's edge)
+        now = time.time()
+        analytics["recent_activity"]["last_24h_queries"] = self.timeseries.total("query", "hour", since=now - 86400)["count"]
+        analytics["recent_activity"]["last_7d_queries"] = self.timeseries.total("query", "hour", since=now - 7 * 86400)["count"]
+        analytics["recent_activity"]["recent_query_trends"] = [
+            {"hour": datetime.fromtimestamp(row["start"]).isoformat(), "queries": row["count"],
+             "avg_response_time": row["avg"], "p95_response_time": row["p95"]}
+            for row in self.timeseries.query("query", "hour", since=now - 86400)
+        ]
         
         return analytics
     
     def get_bucket_usage_trends(self, bucket_name: str, days: int = 30) -> Dict:
         """Get usage trends for a specific bucket over time"""
-        cutoff_date = datetime.now() - timedelta(days=days)
+        since = time.time() - days * 86400
         
         trends = {
             "bucket": bucket_name,
@@ -766,32 +873,21 @@ class LightRAGManager:
             "total_activity": 0
         }
         
-        # Group queries by day
-        daily_counts = {}
-        daily_response_times = {}
-        
-        for query in self.query_history:
-            if query["bucket"] == bucket_name:
-                query_date = datetime.fromisoformat(query["timestamp"].replace('Z', '+00:00').replace('+00:00', ''))
-                if query_date >= cutoff_date:
-                    day_key = query_date.strftime('%Y-%m-%d')
-                    
-                    if day_key not in daily_counts:
-                        daily_counts[day_key] = 0
-                        daily_response_times[day_key] = []
-                    
-                    daily_counts[day_key] += 1
-                    daily_response_times[day_key].append(query["duration_seconds"])
-                    trends["query_modes"][query["mode"]] += 1
-                    trends["total_activity"] += 1
-        
-        # Convert to lists for frontend consumption
-        for day, count in sorted(daily_counts.items()):
+        # One daily rollup per mode, merged per day: O(days) rows, whatever the query volume
+        for day in self.timeseries.query("query", "day", since=since, bucket=bucket_name):
             trends["daily_queries"].append({
-                "date": day,
-                "queries": count,
-                "avg_response_time": sum(daily_response_times[day]) / len(daily_response_times[day])
+                "date": datetime.fromtimestamp(day["start"]).strftime('%Y-%m-%d'),
+                "queries": day["count"],
+                "avg_response_time": day["avg"],
+                "p95_response_time": day["p95"]
             })
+            trends["total_activity"] += day["count"]
+        
+        for mode in self.timeseries.query("query", "day", since=since, by=("mode",), bucket=bucket_name):
+            trends["query_modes"][mode["mode"]] = trends["query_modes"].get(mode["mode"], 0) + mode["count"]
+        
+        period = self.timeseries.total("query", "day", since=since, bucket=bucket_name)
+        trends["response_time_percentiles"] = {p: period[p] for p in ("p50", "p95", "p99")}
         
         return trends
     
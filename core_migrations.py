@@ -0,0 +1,235 @@
+"""
+Schema Migrations for Lizzy
+Versioned, idempotent upgrades for project databases, tracked with PRAGMA user_version
+"""
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from core_blobstore import BLOBS_TABLE, externalize_columns
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def _tracking_tables(cursor: sqlite3.Cursor):
+    """Brainstorm and write tracking tables, formerly created in each pipeline's setup_tracking_tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS brainstorm_sessions (
+            session_id TEXT PRIMARY KEY,
+            project_name TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            total_scenes INTEGER,
+            buckets_used TEXT,
+            user_guidance TEXT,
+            status TEXT DEFAULT 'running'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS brainstorm_steps (
+            step_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            step_type TEXT,
+            timestamp TIMESTAMP,
+            act INTEGER,
+            scene INTEGER,
+            bucket TEXT,
+            content TEXT,
+            metadata TEXT,
+            FOREIGN KEY (session_id) REFERENCES brainstorm_sessions (session_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS brainstorm_outputs (
+            output_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            act INTEGER,
+            scene INTEGER,
+            bucket TEXT,
+            prompt_used TEXT,
+            response TEXT,
+            timestamp TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES brainstorm_sessions (session_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS write_sessions (
+            session_id TEXT PRIMARY KEY,
+            project_name TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            total_scenes INTEGER,
+            successful_scenes INTEGER,
+            buckets_used TEXT,
+            user_guidance TEXT,
+            status TEXT DEFAULT 'running'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS write_steps (
+            step_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            step_type TEXT,
+            timestamp TIMESTAMP,
+            act INTEGER,
+            scene INTEGER,
+            content TEXT,
+            metadata TEXT,
+            FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scene_generations (
+            generation_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            act INTEGER,
+            scene INTEGER,
+            context_used TEXT,
+            prompt_used TEXT,
+            generated_text TEXT,
+            word_count INTEGER,
+            timestamp TIMESTAMP,
+            success BOOLEAN,
+            status TEXT,
+            ttft_seconds REAL,
+            tokens_per_sec REAL,
+            completion_tokens INTEGER,
+            FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
+        )
+    ''')
+    # Projects created before streaming generation lack the metrics columns
+    cursor.execute("PRAGMA table_info(scene_generations)")
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in [('status', 'TEXT'), ('ttft_seconds', 'REAL'),
+                                ('tokens_per_sec', 'REAL'), ('completion_tokens', 'INTEGER')]:
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE scene_generations ADD COLUMN {column} {column_type}")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS final_scenes (
+            scene_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            act INTEGER,
+            scene INTEGER,
+            scene_text TEXT,
+            word_count INTEGER,
+            character_count INTEGER,
+            timestamp TIMESTAMP,
+            version INTEGER DEFAULT 1,
+            FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
+        )
+    ''')
+
+
+# Index name -> (table, columns); each backs one of the hot pipeline queries
+HOT_QUERY_INDEXES = {
+    # fetch_brainstorm_insights: WHERE act = ? AND scene = ? ORDER BY timestamp DESC
+    "idx_brainstorm_outputs_scene": ("brainstorm_outputs", "act, scene, timestamp"),
+    "idx_brainstorm_outputs_session": ("brainstorm_outputs", "session_id, act, scene"),
+    # get_session_summary: WHERE session_id = ? GROUP BY step_type
+    "idx_brainstorm_steps_session": ("brainstorm_steps", "session_id, step_type"),
+    "idx_write_steps_session": ("write_steps", "session_id, step_type"),
+    # get_previous_scene_text / export_screenplay / get_session_summary
+    "idx_final_scenes_session": ("final_scenes", "session_id, act, scene"),
+    "idx_final_scenes_scene": ("final_scenes", "act, scene"),
+    "idx_scene_generations_session": ("scene_generations", "session_id, act, scene"),
+}
+
+
+def _hot_query_indexes(cursor: sqlite3.Cursor):
+    for name, (table, columns) in HOT_QUERY_INDEXES.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        if not {column.strip() for column in columns.split(",")} <= existing_columns:
+            # Hand-made tables missing a column keep working, just without this index
+            print(f"⚠️ Skipping {name}: {table} lacks one of ({columns})")
+            continue
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    cursor.execute("ANALYZE")
+
+
+def _brainstorm_reuse(cursor: sqlite3.Cursor):
+    """Input fingerprints on brainstorm outputs, so unchanged scenes can be reused instead of re-queried"""
+    cursor.execute("ALTER TABLE brainstorm_outputs ADD COLUMN input_fingerprint TEXT")
+    cursor.execute("ALTER TABLE brainstorm_sessions ADD COLUMN reused_scenes INTEGER DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_brainstorm_outputs_fingerprint "
+                   "ON brainstorm_outputs (input_fingerprint, timestamp)")
+
+
+def _blob_store(cursor: sqlite3.Cursor):
+    """Content-addressed blob table; existing large prompts, contexts and generations move into it"""
+    cursor.execute(BLOBS_TABLE)
+    converted = externalize_columns(cursor)
+    if any(converted.values()):
+        print(f"🗜️ Moved {sum(converted.values())} stored texts into the blob store")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "brainstorm and write tracking tables", _tracking_tables),
+    Migration(2, "indexes for hot pipeline queries", _hot_query_indexes),
+    Migration(3, "brainstorm output fingerprints", _brainstorm_reuse),
+    Migration(4, "content-addressed blob store", _blob_store),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations, each in its own transaction; returns the versions applied"""
+    applied = []
+    if conn.in_transaction:
+        conn.commit()
+    current = schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the write lock
+            if schema_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+            migration.apply(cursor)
+            cursor.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration.version)
+    return applied
+
+
+_migrated: Dict[str, Tuple[int, int]] = {}
+_migrate_lock = threading.Lock()
+
+
+def ensure_migrated(db_path: str) -> List[int]:
+    """Migrate a project database once per process (again only if the file is replaced)"""
+    if not os.path.exists(db_path):
+        return []
+    path = os.path.realpath(db_path)
+    stat = os.stat(path)
+    identity = (stat.st_dev, stat.st_ino)
+    with _migrate_lock:
+        if _migrated.get(path) == identity:
+            return []
+        conn = sqlite3.connect(path)
+        try:
+            applied = migrate(conn)
+        finally:
+            conn.close()
+        _migrated[path] = identity
+    if applied:
+        print(f"🗄️ Migrated {os.path.basename(path)} to schema v{LATEST_VERSION}")
+    return applied
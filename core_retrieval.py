@@ -0,0 +1,285 @@
+"""
+Template Retrieval for Lizzy
+Runs the LightRAG placeholders of a prompt template as real, concurrent bucket queries
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from util_template_engine import Placeholder, UNRESOLVED, parse_template
+
+LIGHTRAG_MODES = ("naive", "local", "global", "hybrid", "mix")
+DEFAULT_MODE = "hybrid"
+DEFAULT_FOCUS = 5
+DEFAULT_BUDGET_SECONDS = 8.0
+DEFAULT_CONTEXT_TOKENS = 6000
+
+# Share of the token budget per context section; unused budget rolls over to the next section
+SECTION_SHARES = (("entities", 0.3), ("relationships", 0.2), ("sources", 0.5))
+SECTION_ALIASES = {"entities": "entities", "entity": "entities", "relationships": "relationships",
+                   "relations": "relationships", "sources": "sources", "chunks": "sources",
+                   "document chunks": "sources"}
+
+
+def focus_to_top_k(focus: Any) -> int:
+    """Map focus 1-10 to retrieval depth; LightRAG's own default (60) sits at focus 6"""
+    try:
+        focus = int(focus)
+    except (TypeError, ValueError):
+        focus = DEFAULT_FOCUS
+    return max(1, min(10, focus)) * 10
+
+
+@dataclass(frozen=True)
+class RetrievalRequest:
+    """One distinct bucket query behind one or more placeholders"""
+    bucket: str
+    guidance: str
+    mode: str
+    focus: int
+
+    @property
+    def top_k(self) -> int:
+        return focus_to_top_k(self.focus)
+
+    def query_text(self, query: str = "") -> str:
+        if self.guidance and query:
+            return f"{self.guidance}\n\nFor this request: {query}"
+        return self.guidance or query or f"Key insights from {self.bucket}"
+
+
+@dataclass
+class RetrievalResult:
+    request: RetrievalRequest
+    context: str = ""
+    error: Optional[str] = None
+    timed_out: bool = False
+    response_time: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return bool(self.context) and not self.error and not self.timed_out
+
+    def to_dict(self) -> Dict:
+        return {
+            "bucket": self.request.bucket,
+            "mode": self.request.mode,
+            "focus": self.request.focus,
+            "top_k": self.request.top_k,
+            "success": self.success,
+            "timed_out": self.timed_out,
+            "error": self.error,
+            "response_time": round(self.response_time, 3),
+            "context_length": len(self.context)
+        }
+
+
+def retrieval_request(placeholder: Placeholder) -> Optional[RetrievalRequest]:
+    """RetrievalRequest for a {lightrag.bucket[|guidance|mode|focus]} placeholder, else None"""
+    if placeholder.namespace != 'lightrag' or len(placeholder.path) != 2:
+        return None
+    mode = placeholder.option('mode', DEFAULT_MODE)
+    focus = placeholder.option('focus', DEFAULT_FOCUS)
+    try:
+        focus = int(focus)
+    except (TypeError, ValueError):
+        focus = DEFAULT_FOCUS
+    return RetrievalRequest(
+        bucket=placeholder.name,
+        guidance=placeholder.option('guidance', ""),
+        mode=mode if mode in LIGHTRAG_MODES else DEFAULT_MODE,
+        focus=max(1, min(10, focus))
+    )
+
+
+class TemplateRetriever:
+    """Resolves every LightRAG placeholder in a template concurrently under one latency budget"""
+
+    # query_fn(bucket, query, mode=, only_need_context=, top_k=) -> LightRAGManager-style result dict
+    def __init__(self, query_fn: Callable[..., Awaitable[Dict]], budget_seconds: float = DEFAULT_BUDGET_SECONDS,
+                 context_only: bool = True):
+        self.query_fn = query_fn
+        self.budget_seconds = budget_seconds
+        self.context_only = context_only
+
+    async def _run(self, request: RetrievalRequest, query: str) -> RetrievalResult:
+        start = time.perf_counter()
+        try:
+            result = await self.query_fn(request.bucket, request.query_text(query), mode=request.mode,
+                                         only_need_context=self.context_only, top_k=request.top_k)
+        except Exception as e:
+            return RetrievalResult(request, error=str(e), response_time=time.perf_counter() - start)
+        elapsed = time.perf_counter() - start
+        if result.get("error"):
+            return RetrievalResult(request, error=result["error"], response_time=elapsed)
+        return RetrievalResult(request, context=str(result.get("response") or ""), response_time=elapsed)
+
+    async def retrieve(self, template: str, query: str = "") -> Dict[RetrievalRequest, RetrievalResult]:
+        """Run each distinct placeholder query once; unfinished queries are cancelled at the budget"""
+        requests = []
+        for placeholder in parse_template(template).namespace('lightrag'):
+            request = retrieval_request(placeholder)
+            if request and request not in requests:
+                requests.append(request)
+        return await self.run_requests(requests, query)
+
+    async def run_requests(self, requests: List[RetrievalRequest], query: str = "") -> Dict[RetrievalRequest, RetrievalResult]:
+        """Run bucket queries concurrently, returning partial results when the budget runs out"""
+        if not requests:
+            return {}
+
+        tasks = {asyncio.ensure_future(self._run(request, query)): request for request in requests}
+        done, pending = await asyncio.wait(tasks, timeout=self.budget_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = {}
+        for task, request in tasks.items():
+            if task in done:
+                results[request] = task.result()
+            else:
+                results[request] = RetrievalResult(request, timed_out=True, response_time=self.budget_seconds)
+        return results
+
+
+def format_retrieval(result: RetrievalResult) -> str:
+    """Block substituted for a placeholder in the compiled prompt"""
+    request = result.request
+    header = f"=== {request.bucket.upper()} KNOWLEDGE ({request.mode}, focus {request.focus}/10) ==="
+    if result.success:
+        return f"{header}\n{result.context.strip()}"
+    if result.timed_out:
+        return f"{header}\n[No context: retrieval exceeded the {result.response_time:g}s budget]"
+    return f"{header}\n[No context: {result.error or 'no relevant results'}]"
+
+
+def render_retrievals(text: str, results: Dict[RetrievalRequest, RetrievalResult]) -> str:
+    """Replace LightRAG placeholders in text with retrieved context; everything else is left as-is"""
+    def resolve(placeholder: Placeholder):
+        request = retrieval_request(placeholder)
+        if request is None or request not in results:
+            return UNRESOLVED
+        return format_retrieval(results[request])
+    return parse_template(text).render(resolve)
+
+
+def retrieval_summary(results: Dict[RetrievalRequest, RetrievalResult]) -> List[Dict]:
+    return [result.to_dict() for result in results.values()]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for budgeting"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def parse_context_sections(text: str) -> Dict[str, List[str]]:
+    """Split a LightRAG only_need_context result into entity, relationship and source items"""
+    sections = {name: [] for name, _ in SECTION_SHARES}
+    current = None
+    found_header = False
+    skip_header_row = False
+    for line in text.splitlines():
+        header = re.match(r'^-{3,}\s*([A-Za-z ]+?)(?:\s*\(.*\))?\s*-{3,}$', line.strip())
+        if header:
+            found_header = True
+            current = SECTION_ALIASES.get(header.group(1).strip().lower())
+            skip_header_row = True
+            continue
+        stripped = line.strip()
+        if current is None or not stripped or stripped.startswith("```") or stripped in ("[", "]"):
+            continue
+        if skip_header_row:
+            skip_header_row = False
+            # CSV column header row (id,entity,type,...)
+            if re.match(r'^"?id"?\s*,', stripped):
+                continue
+        sections[current].append(stripped.rstrip(","))
+
+    if not found_header and text.strip():
+        # Plain-text context: treat paragraphs as source chunks
+        sections["sources"] = [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+    return sections
+
+
+def _dedupe_key(item: str) -> str:
+    # Row ids differ between buckets, so compare rows without a leading numeric id column
+    item = re.sub(r'^"?\d+"?\s*,\s*', '', item)
+    item = re.sub(r'"id"\s*:\s*\d+\s*,?\s*', '', item)
+    return re.sub(r'\s+', ' ', item).strip().lower()
+
+
+def merge_contexts(bucket_contexts: Dict[str, str], token_budget: int = DEFAULT_CONTEXT_TOKENS) -> Dict:
+    """Merge per-bucket retrieval context, dropping duplicates and trimming to a token budget"""
+    parsed = {bucket: parse_context_sections(text) for bucket, text in bucket_contexts.items() if text}
+    seen = set()
+    duplicates = 0
+    kept, dropped = 0, 0
+    used = 0
+    carry = 0
+    blocks = []
+
+    for section, share in SECTION_SHARES:
+        allowance = int(token_budget * share) + carry
+        section_used = 0
+        lines = []
+        # Round-robin across buckets so every bucket is represented before any bucket's tail
+        queues = [deque((bucket, item) for item in sections[section]) for bucket, sections in parsed.items()]
+        while any(queues):
+            for queue in queues:
+                if not queue:
+                    continue
+                bucket, item = queue.popleft()
+                key = _dedupe_key(item)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                cost = estimate_tokens(item) + 2
+                if section_used + cost > allowance:
+                    dropped += 1
+                    continue
+                seen.add(key)
+                section_used += cost
+                kept += 1
+                lines.append(f"[{bucket}] {item}")
+        if lines:
+            blocks.append(f"=== {section.upper()} ===\n" + "\n".join(lines))
+        used += section_used
+        carry = allowance - section_used
+
+    return {
+        "text": "\n\n".join(blocks),
+        "tokens": used,
+        "token_budget": token_budget,
+        "items_kept": kept,
+        "items_dropped": dropped,
+        "duplicates_removed": duplicates,
+        "buckets": list(parsed.keys())
+    }
+
+
+RETRIEVAL_MODES = ("context", "per_bucket")
+
+
+def default_retrieval_mode() -> str:
+    """context: one merged retrieval + one generation; per_bucket: a full LightRAG answer per bucket"""
+    mode = os.getenv("LIZZY_RETRIEVAL_MODE", "context").strip().lower()
+    return mode if mode in RETRIEVAL_MODES else "context"
+
+
+async def gather_bucket_context(query_fn: Callable[..., Awaitable[Dict]], buckets: List[str], query: str,
+                                mode: str = DEFAULT_MODE, focus: int = DEFAULT_FOCUS,
+                                token_budget: int = DEFAULT_CONTEXT_TOKENS,
+                                budget_seconds: float = DEFAULT_BUDGET_SECONDS) -> Dict:
+    """Context-only retrieval from several buckets at once, merged and deduped under a token budget"""
+    requests = [RetrievalRequest(bucket, "", mode, focus) for bucket in buckets]
+    results = await TemplateRetriever(query_fn, budget_seconds).run_requests(requests, query)
+    merged = merge_contexts({r.request.bucket: r.context for r in results.values() if r.success}, token_budget)
+    merged["retrieval"] = retrieval_summary(results)
+    return merged
@@ -0,0 +1,108 @@
+"""
+Project Snapshot for Lizzy
+Loads characters, outline and project info once per session so context assembly is dictionary lookups
+"""
+
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_LOGLINE = "A romantic comedy about unexpected love"
+CHARACTER_FIELDS = ("name", "gender", "age", "romantic_challenge", "lovable_trait", "comedic_flaw")
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Key used to match outline character lists against the characters table"""
+    return " ".join((name or "").split()).casefold()
+
+
+@dataclass(frozen=True)
+class OutlineScene:
+    act: int
+    scene: int
+    key_characters: str
+    key_events: str
+
+    @property
+    def character_names(self) -> List[str]:
+        return [name.strip() for name in (self.key_characters or "").split(",") if name.strip()]
+
+    @property
+    def description(self) -> str:
+        return f"Characters: {self.key_characters}\nEvents: {self.key_events}"
+
+
+@dataclass(frozen=True)
+class ProjectSnapshot:
+    """Read-only view of the project tables taken at one point in time"""
+    characters: Tuple[Mapping[str, str], ...] = ()
+    characters_by_name: Mapping[str, Tuple[int, ...]] = field(default_factory=lambda: MappingProxyType({}))
+    outline: Mapping[Tuple[int, int], OutlineScene] = field(default_factory=lambda: MappingProxyType({}))
+    project_info: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def logline(self) -> str:
+        return self.project_info.get("description") or DEFAULT_LOGLINE
+
+    def scenes(self) -> List[Tuple[int, int]]:
+        return sorted(self.outline)
+
+    def scene(self, act: int, scene: int) -> OutlineScene:
+        outline_scene = self.outline.get((act, scene))
+        if outline_scene is None:
+            raise ValueError(f"Scene not found: Act {act}, Scene {scene}")
+        return outline_scene
+
+    def previous_scene(self, act: int, scene: int) -> Optional[OutlineScene]:
+        return self.outline.get((act, scene - 1)) if scene > 1 else None
+
+    def character(self, name: str) -> Optional[Dict]:
+        indexes = self.characters_by_name.get(normalize_name(name))
+        return dict(self.characters[indexes[0]]) if indexes else None
+
+    def scene_characters(self, outline_scene: OutlineScene) -> List[Dict]:
+        """Character rows named in a scene, in characters-table order"""
+        indexes = set()
+        for name in outline_scene.character_names:
+            indexes.update(self.characters_by_name.get(normalize_name(name), ()))
+        return [dict(self.characters[i]) for i in sorted(indexes)]
+
+
+def _table_exists(cursor: sqlite3.Cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+
+def load_project_snapshot(conn: sqlite3.Connection) -> ProjectSnapshot:
+    """Read characters, story_outline and project_info in one pass; missing tables load as empty"""
+    cursor = conn.cursor()
+
+    characters = []
+    by_name = {}
+    if _table_exists(cursor, "characters"):
+        cursor.execute(f"SELECT {', '.join(CHARACTER_FIELDS)} FROM characters")
+        for row in cursor.fetchall():
+            by_name.setdefault(normalize_name(row[0]), []).append(len(characters))
+            characters.append(MappingProxyType(dict(zip(CHARACTER_FIELDS, row))))
+
+    outline = {}
+    if _table_exists(cursor, "story_outline"):
+        cursor.execute("SELECT act, scene, key_characters, key_events FROM story_outline ORDER BY act, scene")
+        for act, scene, key_characters, key_events in cursor.fetchall():
+            # First row wins, matching the fetchone() lookups this replaces
+            outline.setdefault((act, scene), OutlineScene(act, scene, key_characters, key_events))
+
+    project_info = {}
+    if _table_exists(cursor, "project_info"):
+        cursor.execute("SELECT key, value FROM project_info")
+        project_info = {key: value for key, value in cursor.fetchall()}
+
+    return ProjectSnapshot(
+        characters=tuple(characters),
+        characters_by_name=MappingProxyType({name: tuple(i) for name, i in by_name.items()}),
+        outline=MappingProxyType(outline),
+        project_info=MappingProxyType(project_info)
+    )
@@ -0,0 +1,124 @@
+"""
+Step Logger for Lizzy
+Buffers tracking-table writes and flushes them with executemany, one transaction per scene
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from util_metrics import DB_COMMIT_SECONDS
+from util_tracing import span
+
+# full: commit every statement (the old behaviour)
+# scene: one transaction per scene, or every flush_interval_ms, whichever comes first
+# relaxed: like scene, with PRAGMA synchronous=NORMAL on this connection (fewer fsyncs, last commits can be
+#          lost on power failure but the database stays consistent)
+DURABILITY_LEVELS = ("full", "scene", "relaxed")
+DEFAULT_DURABILITY = "scene"
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_MAX_PENDING = 500
+
+
+def default_durability() -> str:
+    level = os.getenv("LIZZY_STEP_DURABILITY", DEFAULT_DURABILITY).strip().lower()
+    return level if level in DURABILITY_LEVELS else DEFAULT_DURABILITY
+
+
+class StepLogger:
+    """Write-behind queue for one sqlite connection; statements keep their order across tables"""
+
+    def __init__(self, conn: sqlite3.Connection, durability: Optional[str] = None,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS, max_pending: int = DEFAULT_MAX_PENDING):
+        self.conn = conn
+        self.durability = durability if durability in DURABILITY_LEVELS else default_durability()
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.pending: List[Tuple[str, Sequence[Any]]] = []
+        self.last_flush = time.monotonic()
+        self.scene_depth = 0
+        self.commits = 0
+        self.statements = 0
+        self.batches = 0
+        self.failed = 0
+        if self.durability == "relaxed":
+            conn.execute("PRAGMA synchronous = NORMAL")
+
+    @property
+    def buffered(self) -> bool:
+        return self.durability != "full"
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        """Queue a write; flushed immediately at full durability, otherwise at the next boundary"""
+        self.pending.append((sql, tuple(params)))
+        if not self.buffered or len(self.pending) >= self.max_pending:
+            self.flush()
+        elif time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every queued statement in one transaction, batching runs of the same statement"""
+        if not self.pending:
+            self.last_flush = time.monotonic()
+            return 0
+        pending, self.pending = self.pending, []
+        with span("db.flush", "db", statements=len(pending), durability=self.durability), \
+                DB_COMMIT_SECONDS.time(durability=self.durability):
+            try:
+                for sql, rows in self._batches(pending):
+                    self.conn.executemany(sql, rows)
+                    self.batches += 1
+                self.conn.commit()
+            except sqlite3.Error as e:
+                # One bad row (e.g. a duplicate step_id) must not take the rest of the scene with it
+                self.conn.rollback()
+                print(f"⚠️ Step log batch failed ({e}); retrying {len(pending)} statements individually")
+                for sql, params in pending:
+                    try:
+                        self.conn.execute(sql, params)
+                    except sqlite3.Error as row_error:
+                        self.failed += 1
+                        print(f"⚠️ Dropped step log write: {row_error}")
+                self.conn.commit()
+        self.commits += 1
+        self.statements += len(pending)
+        self.last_flush = time.monotonic()
+        return len(pending)
+
+    @staticmethod
+    def _batches(pending: List[Tuple[str, Sequence[Any]]]) -> Iterator[Tuple[str, List[Sequence[Any]]]]:
+        sql, rows = None, []
+        for statement, params in pending:
+            if statement != sql and rows:
+                yield sql, rows
+                rows = []
+            sql = statement
+            rows.append(params)
+        if rows:
+            yield sql, rows
+
+    @contextmanager
+    def scene(self):
+        """Transaction boundary for one scene; queued writes are flushed even if the scene raises"""
+        self.scene_depth += 1
+        try:
+            yield self
+        finally:
+            self.scene_depth -= 1
+            if self.scene_depth == 0:
+                self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "durability": self.durability,
+            "commits": self.commits,
+            "statements": self.statements,
+            "batches": self.batches,
+            "pending": len(self.pending),
+            "failed": self.failed
+        }
+
+    def close(self):
+        self.flush()
@@ -7,6 +7,7 @@ import json
 import os
 from datetime import datetime
 from typing import Dict, List, Any, Optional
+from util_template_engine import render_values
 
 
 class TemplateManager:
@@ -374,17 +375,20 @@ WRITE THE COMPLETE SCENE NOW:
         else:
             return ""
         
-        # Format with context
+        # Format with context (copied, so the caller's dict is left alone)
         try:
+            values = dict(context)
+            
             # Add focus areas if present
             if "focus_areas" in template:
-                context["focus_areas"] = "\n".join(f"- {area}" for area in template["focus_areas"])
+                values["focus_areas"] = "\n".join(f"- {area}" for area in template["focus_areas"])
             
             # Add requirements if present
             if "requirements" in template:
-                context["requirements"] = "\n".join(f"- {req}" for req in template["requirements"])
+                values["requirements"] = "\n".join(f"- {req}" for req in template["requirements"])
             
-            prompt = prompt_template.format(**context)
+            # Parsed once per template string; all missing keys are reported before rendering
+            prompt = render_values(prompt_template, values)
             
             # Add system prompt if present
             if "system_prompt" in template:
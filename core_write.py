@@ -13,6 +13,16 @@ from dataclasses import dataclass
 from core_templates import TemplateManager, PromptInspector
 from core_knowledge import LightRAGManager
 from lightrag.llm.openai import gpt_4o_mini_complete, openai_embed
+from util_llm import OPENAI_AVAILABLE, GenerationStats, TextAccumulator, stream_completion
+from core_steplog import StepLogger
+from util_events import COALESCE, EventBus
+from util_ratelimit import limit_llm
+from util_accounting import get_ledger, operation
+from util_tracing import span, trace_session
+from core_blobstore import BlobStore
+from core_migrations import migrate
+from core_snapshot import ProjectSnapshot, load_project_snapshot
+from core_retrieval import DEFAULT_CONTEXT_TOKENS, default_retrieval_mode, gather_bucket_context
 
 
 @dataclass
@@ -45,7 +55,9 @@ class TransparentWriter:
     """Transparent screenplay writing engine with full visibility"""
     
     def __init__(self, project_path: str, template_manager: TemplateManager = None, 
-                 lightrag_manager: LightRAGManager = None):
+                 lightrag_manager: LightRAGManager = None, stream_generation: bool = True,
+                 flush_interval: float = 2.0, retrieval_mode: str = None,
+                 context_token_budget: int = DEFAULT_CONTEXT_TOKENS, durability: str = None, trace: bool = None):
         self.project_path = project_path
         self.project_name = os.path.basename(project_path)
         self.db_path = os.path.join(project_path, f"{self.project_name}.sqlite")
@@ -55,12 +67,34 @@ class TransparentWriter:
         self.lightrag_manager = lightrag_manager or LightRAGManager()
         self.prompt_inspector = PromptInspector(self.template_manager)
         
+        # Stream scene text token by token, persisting partial text every flush_interval seconds
+        self.stream_generation = stream_generation and OPENAI_AVAILABLE
+        self.flush_interval = flush_interval
+        
+        # "context": merged context-only retrieval feeds the scene prompt; "per_bucket": one LightRAG answer per bucket
+        self.retrieval_mode = retrieval_mode or default_retrieval_mode()
+        self.context_token_budget = context_token_budget
+        
         # Connect to database
         self.conn = sqlite3.connect(self.db_path)
         self.setup_tracking_tables()
         
+        # Step, generation and scene rows are buffered and committed once per scene (see core_steplog)
+        self.steps = StepLogger(self.conn, durability)
+        
+        # Large step contents, contexts, prompts and finished generations are stored once, compressed (see core_blobstore)
+        self.blobs = BlobStore(self.conn, execute=self.steps.execute)
+        
+        # Callbacks are queued per listener and run off the pipeline (see util_events.EventBus)
+        self.events = EventBus(f"{self.project_name}-writer")
+        
+        # Per-session Chrome/Perfetto traces (see util_tracing); None follows LIZZY_TRACE
+        self.trace = trace
+        self.last_trace = None
+        
         # Session tracking
         self.current_session = None
+        self.snapshot: Optional[ProjectSnapshot] = None
         self.steps_log = []
         self.callbacks = {
             'session_started': [],
@@ -70,6 +104,7 @@ class TransparentWriter:
             'bucket_queried': [],
             'prompt_compiled': [],
             'generation_started': [],
+            'scene_chunk': [],
             'scene_generated': [],
             'scene_saved': [],
             'session_completed': [],
@@ -77,86 +112,18 @@ class TransparentWriter:
         }
     
     def setup_tracking_tables(self):
-        """Setup tables for tracking writing sessions"""
-        cursor = self.conn.cursor()
-        
-        # Writing sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS write_sessions (
-                session_id TEXT PRIMARY KEY,
-                project_name TEXT,
-                start_time TIMESTAMP,
-                end_time TIMESTAMP,
-                total_scenes INTEGER,
-                successful_scenes INTEGER,
-                buckets_used TEXT,
-                user_guidance TEXT,
-                status TEXT DEFAULT 'running'
-            )
-        ''')
-        
-        # Writing steps table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS write_steps (
-                step_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                step_type TEXT,
-                timestamp TIMESTAMP,
-                act INTEGER,
-                scene INTEGER,
-                content TEXT,
-                metadata TEXT,
-                FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
-            )
-        ''')
-        
-        # Scene generations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scene_generations (
-                generation_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                act INTEGER,
-                scene INTEGER,
-                context_used TEXT,
-                prompt_used TEXT,
-                generated_text TEXT,
-                word_count INTEGER,
-                timestamp TIMESTAMP,
-                success BOOLEAN,
-                FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
-            )
-        ''')
-        
-        # Final scenes table (enhanced)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS final_scenes (
-                scene_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                act INTEGER,
-                scene INTEGER,
-                scene_text TEXT,
-                word_count INTEGER,
-                character_count INTEGER,
-                timestamp TIMESTAMP,
-                version INTEGER DEFAULT 1,
-                FOREIGN KEY (session_id) REFERENCES write_sessions (session_id)
-            )
-        ''')
-        
-        self.conn.commit()
+        """Setup tables for tracking writing sessions (schema and indexes live in core_migrations)"""
+        migrate(self.conn)
     
-    def register_callback(self, event: str, callback: Callable):
-        """Register a callback for specific events"""
+    def register_callback(self, event: str, callback: Callable, maxsize: int = 1024, policy: str = COALESCE):
+        """Register a sync or async callback for specific events; it runs on the event bus, not in the pipeline"""
         if event in self.callbacks:
             self.callbacks[event].append(callback)
+            self.events.on(event, callback, maxsize=maxsize, policy=policy)
     
     def trigger_callback(self, event: str, data: Any):
-        """Trigger all callbacks for an event"""
-        for callback in self.callbacks.get(event, []):
-            try:
-                callback(data)
-            except Exception as e:
-                print(f"Callback error: {e}")
+        """Publish an event to its callbacks and carry on"""
+        self.events.publish(event, data)
     
     def start_session(self, buckets: List[str], user_guidance: str = "") -> str:
         """Start a new writing session"""
@@ -183,6 +150,7 @@ class TransparentWriter:
         self.conn.commit()
         
         self.steps_log = []
+        self.refresh_snapshot()
         
         self.trigger_callback('session_started', {
             'session_id': session_id,
@@ -192,13 +160,21 @@ class TransparentWriter:
         
         return session_id
     
+    def refresh_snapshot(self) -> ProjectSnapshot:
+        """Reload characters, outline and project info; call after editing them mid-session"""
+        self.snapshot = load_project_snapshot(self.conn)
+        return self.snapshot
+    
+    @property
+    def project_snapshot(self) -> ProjectSnapshot:
+        return self.snapshot or self.refresh_snapshot()
+    
     def log_step(self, step: WriteStep):
         """Log a writing step"""
         self.steps_log.append(step)
         
-        # Save to database
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        # Queue for the scene's transaction
+        self.steps.execute('''
             INSERT INTO write_steps 
             (step_id, session_id, step_type, timestamp, act, scene, content, metadata)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -209,10 +185,9 @@ class TransparentWriter:
             step.timestamp,
             step.act,
             step.scene,
-            json.dumps(step.content) if not isinstance(step.content, str) else step.content,
+            self.blobs.put(json.dumps(step.content) if not isinstance(step.content, str) else step.content),
             json.dumps(step.metadata or {})
         ))
-        self.conn.commit()
         
         self.trigger_callback('step_completed', {
             'step': step,
@@ -223,42 +198,15 @@ class TransparentWriter:
         """Assemble comprehensive context for writing a scene"""
         step_id = f"context_{act}_{scene}_{datetime.now().strftime('%H%M%S')}"
         
-        cursor = self.conn.cursor()
+        snapshot = self.project_snapshot
         
         # Get scene outline
-        cursor.execute('''
-            SELECT key_characters, key_events 
-            FROM story_outline 
-            WHERE act = ? AND scene = ?
-        ''', (act, scene))
-        scene_data = cursor.fetchone()
-        
-        if not scene_data:
-            raise ValueError(f"Scene not found: Act {act}, Scene {scene}")
-        
-        key_characters, key_events = scene_data
-        scene_description = f"Characters: {key_characters}\nEvents: {key_events}"
+        outline_scene = snapshot.scene(act, scene)
+        key_events = outline_scene.key_events
+        scene_description = outline_scene.description
         
         # Get character details
-        cursor.execute('''
-            SELECT name, gender, age, romantic_challenge, lovable_trait, comedic_flaw 
-            FROM characters
-        ''')
-        all_chars = cursor.fetchall()
-        
-        character_details = []
-        scene_chars = key_characters.split(',') if key_characters else []
-        
-        for char_data in all_chars:
-            if any(char_data[0].strip() == sc.strip() for sc in scene_chars):
-                character_details.append({
-                    'name': char_data[0],
-                    'gender': char_data[1],
-                    'age': char_data[2],
-                    'romantic_challenge': char_data[3],
-                    'lovable_trait': char_data[4],
-                    'comedic_flaw': char_data[5]
-                })
+        character_details = snapshot.scene_characters(outline_scene)
         
         # Get previous scene text for continuity
         previous_scene_text = self.get_previous_scene_text(act, scene)
@@ -301,14 +249,14 @@ class TransparentWriter:
         """Get the text of the previous scene for continuity"""
         cursor = self.conn.cursor()
         
-        # Try to get from current session first
+        # Try to get from current session first; the row-value bound lets one index range scan serve the ORDER BY
         cursor.execute('''
             SELECT scene_text 
             FROM final_scenes 
-            WHERE session_id = ? AND ((act = ? AND scene < ?) OR act < ?)
+            WHERE session_id = ? AND (act, scene) < (?, ?)
             ORDER BY act DESC, scene DESC 
             LIMIT 1
-        ''', (self.current_session["session_id"], act, scene, act))
+        ''', (self.current_session["session_id"], act, scene))
         
         result = cursor.fetchone()
         if result:
@@ -318,10 +266,10 @@ class TransparentWriter:
         cursor.execute('''
             SELECT scene_text 
             FROM final_scenes 
-            WHERE (act = ? AND scene < ?) OR act < ?
+            WHERE (act, scene) < (?, ?)
             ORDER BY act DESC, scene DESC 
             LIMIT 1
-        ''', (act, scene, act))
+        ''', (act, scene))
         
         result = cursor.fetchone()
         return result[0] if result else ""
@@ -419,12 +367,50 @@ class TransparentWriter:
                     metadata={"bucket": bucket, "success": False}
                 )
                 self.log_step(step)
-            
-            # Small delay between queries
-            await asyncio.sleep(0.3)
         
         return suggestions
     
+    async def gather_writing_context(self, context: WriteContext) -> str:
+        """Retrieve context from all active buckets concurrently, merged into one reference block"""
+        step_id = f"bucket_context_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
+        char_list = ", ".join([char['name'] for char in context.character_details])
+        query = f"Act {context.act}, Scene {context.scene}: {context.key_events}\nCharacters: {char_list}"
+        
+        for bucket in context.active_buckets:
+            self.trigger_callback('bucket_queried', {
+                'bucket': bucket,
+                'query_prompt': query[:200] + "...",
+                'context_only': True,
+                'step_id': step_id
+            })
+        
+        try:
+            merged = await gather_bucket_context(self.lightrag_manager.aquery_bucket, context.active_buckets, query,
+                                                 token_budget=self.context_token_budget)
+        except Exception as e:
+            self.log_step(WriteStep(
+                step_id=step_id,
+                step_type="bucket_query",
+                timestamp=datetime.now(),
+                act=context.act,
+                scene=context.scene,
+                content=f"Exception: {str(e)}",
+                metadata={"bucket": "all", "success": False, "mode": "context"}
+            ))
+            return ""
+        
+        self.log_step(WriteStep(
+            step_id=step_id,
+            step_type="bucket_query",
+            timestamp=datetime.now(),
+            act=context.act,
+            scene=context.scene,
+            content=merged["text"],
+            metadata={"bucket": "all", "success": bool(merged["text"]), "mode": "context",
+                      **{k: v for k, v in merged.items() if k != "text"}}
+        ))
+        return merged["text"]
+    
     def create_writing_query_prompt(self, bucket: str, context: WriteContext) -> str:
         """Create bucket-specific writing query"""
         char_list = ", ".join([char['name'] for char in context.character_details])
@@ -475,7 +461,8 @@ class TransparentWriter:
         
         return prompts.get(bucket, prompts["scripts"])
     
-    def compile_final_prompt(self, context: WriteContext, bucket_suggestions: Dict[str, str]) -> str:
+    def compile_final_prompt(self, context: WriteContext, bucket_suggestions: Dict[str, str],
+                             reference_context: str = "") -> str:
         """Compile the enhanced Write Tab prompt with full Lizzy specification"""
         step_id = f"prompt_compile_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
         
@@ -513,6 +500,9 @@ class TransparentWriter:
                 snippet = suggestion[:250] + "..." if len(suggestion) > 250 else suggestion
                 insight_parts.append(f"{bucket_tag} {snippet}")
             reference_insights = "\n".join(insight_parts)
+        if reference_context:
+            # Already deduplicated and trimmed to the token budget, so include it whole
+            reference_insights = (reference_insights + "\n\n" if reference_insights else "") + reference_context
         
         # Enhanced Lizzy prompt with full specification
         final_prompt = f"""# Writing a Screenplay with Lizzy
@@ -587,7 +577,7 @@ WRITE THE COMPLETE SCENE NOW:"""
                 "prompt_length": len(final_prompt),
                 "has_continuity": bool(context.previous_scene_text),
                 "has_brainstorm": bool(context.brainstorm_insights),
-                "has_suggestions": bool(bucket_suggestions)
+                "has_suggestions": bool(bucket_suggestions or reference_context)
             }
         )
         self.log_step(step)
@@ -598,7 +588,7 @@ WRITE THE COMPLETE SCENE NOW:"""
             'components': {
                 'continuity': bool(context.previous_scene_text),
                 'brainstorm': bool(context.brainstorm_insights),
-                'suggestions': bool(bucket_suggestions)
+                'suggestions': bool(bucket_suggestions or reference_context)
             },
             'step_id': step_id
         })
@@ -606,23 +596,63 @@ WRITE THE COMPLETE SCENE NOW:"""
         return final_prompt
     
     async def generate_scene(self, final_prompt: str, context: WriteContext) -> str:
-        """Generate the actual scene text"""
+        """Generate the actual scene text, streaming chunks as they arrive"""
         step_id = f"generation_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
         
         self.trigger_callback('generation_started', {
             'act': context.act,
             'scene': context.scene,
             'prompt_length': len(final_prompt),
+            'streaming': self.stream_generation,
             'step_id': step_id
         })
         
+        # Record the generation up front so partial text survives a crash
+        self.steps.execute('''
+            INSERT INTO scene_generations
+            (generation_id, session_id, act, scene, context_used, prompt_used, 
+             generated_text, word_count, timestamp, success, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            step_id,
+            self.current_session["session_id"],
+            context.act,
+            context.scene,
+            self.blobs.put(json.dumps(context.__dict__, default=str)),
+            self.blobs.put(final_prompt),
+            "",
+            0,
+            datetime.now(),
+            False,
+            "streaming"
+        ))
+        
+        stats = GenerationStats()
+        accumulator = TextAccumulator(lambda text: self.update_generation_text(step_id, text), self.flush_interval)
+        
         try:
-            # Generate scene text
-            scene_text = await gpt_4o_mini_complete(final_prompt)
+            if self.stream_generation:
+                async for chunk in stream_completion(final_prompt, stats=stats):
+                    accumulator.append(chunk)
+                    self.trigger_callback('scene_chunk', {
+                        'act': context.act,
+                        'scene': context.scene,
+                        'text': chunk,
+                        'char_count': stats.characters,
+                        'step_id': step_id
+                    })
+            else:
+                scene_text = await limit_llm(gpt_4o_mini_complete)(final_prompt)
+                stats.on_chunk(scene_text)
+                stats.finish()
+                accumulator.append(scene_text)
+            
+            scene_text = accumulator.text
             
             # Calculate metrics
             word_count = len(scene_text.split())
             char_count = len(scene_text)
+            metrics = stats.to_dict()
             
             # Log generation
             step = WriteStep(
@@ -635,31 +665,29 @@ WRITE THE COMPLETE SCENE NOW:"""
                 metadata={
                     "word_count": word_count,
                     "char_count": char_count,
-                    "success": True
+                    "success": True,
+                    **metrics
                 }
             )
             self.log_step(step)
             
-            # Save generation record
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO scene_generations
-                (generation_id, session_id, act, scene, context_used, prompt_used, 
-                 generated_text, word_count, timestamp, success)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            # Finalize generation record
+            self.steps.execute('''
+                UPDATE scene_generations
+                SET generated_text = ?, word_count = ?, timestamp = ?, success = ?, status = ?,
+                    ttft_seconds = ?, tokens_per_sec = ?, completion_tokens = ?
+                WHERE generation_id = ?
             ''', (
-                step_id,
-                self.current_session["session_id"],
-                context.act,
-                context.scene,
-                json.dumps(context.__dict__, default=str),
-                final_prompt,
-                scene_text,
+                self.blobs.put(scene_text),
                 word_count,
                 datetime.now(),
-                True
+                True,
+                "completed",
+                metrics["ttft_seconds"],
+                metrics["tokens_per_sec"],
+                metrics["tokens"],
+                step_id
             ))
-            self.conn.commit()
             
             self.trigger_callback('scene_generated', {
                 'act': context.act,
@@ -667,7 +695,8 @@ WRITE THE COMPLETE SCENE NOW:"""
                 'scene_text': scene_text,
                 'word_count': word_count,
                 'success': True,
-                'step_id': step_id
+                'step_id': step_id,
+                **metrics
             })
             
             return scene_text
@@ -685,26 +714,22 @@ WRITE THE COMPLETE SCENE NOW:"""
             )
             self.log_step(step)
             
-            # Save failed generation record
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO scene_generations
-                (generation_id, session_id, act, scene, context_used, prompt_used, 
-                 generated_text, word_count, timestamp, success)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            # Keep whatever text streamed before the failure
+            partial_text = accumulator.text
+            self.steps.execute('''
+                UPDATE scene_generations
+                SET generated_text = ?, word_count = ?, timestamp = ?, success = ?, status = ?,
+                    ttft_seconds = ?
+                WHERE generation_id = ?
             ''', (
-                step_id,
-                self.current_session["session_id"],
-                context.act,
-                context.scene,
-                json.dumps(context.__dict__, default=str),
-                final_prompt,
-                f"Generation failed: {str(e)}",
-                0,
+                self.blobs.put(partial_text or f"Generation failed: {str(e)}"),
+                len(partial_text.split()),
                 datetime.now(),
-                False
+                False,
+                "failed",
+                stats.to_dict()["ttft_seconds"],
+                step_id
             ))
-            self.conn.commit()
             
             self.trigger_callback('scene_generated', {
                 'act': context.act,
@@ -716,17 +741,23 @@ WRITE THE COMPLETE SCENE NOW:"""
             
             raise e
     
+    def update_generation_text(self, generation_id: str, text: str):
+        """Persist partial scene text while it is still streaming; also commits the queued step rows"""
+        self.steps.execute('''
+            UPDATE scene_generations SET generated_text = ?, word_count = ?
+            WHERE generation_id = ?
+        ''', (text, len(text.split()), generation_id))
+        self.steps.flush()
+    
     def save_scene(self, scene_text: str, context: WriteContext) -> bool:
         """Save the generated scene"""
         step_id = f"save_{context.act}_{context.scene}_{datetime.now().strftime('%H%M%S')}"
         
         try:
-            cursor = self.conn.cursor()
-            
             word_count = len(scene_text.split())
             char_count = len(scene_text)
             
-            cursor.execute('''
+            self.steps.execute('''
                 INSERT INTO final_scenes
                 (scene_id, session_id, act, scene, scene_text, word_count, 
                  character_count, timestamp)
@@ -742,8 +773,6 @@ WRITE THE COMPLETE SCENE NOW:"""
                 datetime.now()
             ))
             
-            self.conn.commit()
-            
             # Update session stats
             self.current_session["scenes_written"] += 1
             self.current_session["total_words"] += word_count
@@ -786,40 +815,48 @@ WRITE THE COMPLETE SCENE NOW:"""
             'scene': scene
         })
         
-        try:
-            # 1. Assemble context
-            context = self.assemble_write_context(act, scene)
-            
-            # 2. Query buckets for writing suggestions
-            bucket_suggestions = await self.query_buckets_for_writing(context)
-            
-            # 3. Compile final prompt
-            final_prompt = self.compile_final_prompt(context, bucket_suggestions)
-            
-            # 4. Generate scene
-            scene_text = await self.generate_scene(final_prompt, context)
-            
-            # 5. Save scene
-            success = self.save_scene(scene_text, context)
-            
-            return success
-            
-        except Exception as e:
-            print(f"❌ Error writing scene {act}-{scene}: {e}")
-            return False
+        # One transaction per scene; queued step writes are flushed even if the scene fails
+        # LLM and embedding calls made for the scene are attributed to it in the usage ledger
+        with span("write_scene", "scene", act=act, scene=scene), self.steps.scene(), \
+                operation(project=self.project_name, session=self.current_session["session_id"], scene=f"{act}.{scene}"):
+            try:
+                # 1. Assemble context
+                with span("assemble_context"):
+                    context = self.assemble_write_context(act, scene)
+                
+                # 2. Query buckets for writing suggestions
+                with operation(stage="retrieval"), span("retrieval", mode=self.retrieval_mode):
+                    if self.retrieval_mode == "context":
+                        bucket_suggestions = {}
+                        reference_context = await self.gather_writing_context(context)
+                    else:
+                        bucket_suggestions = await self.query_buckets_for_writing(context)
+                        reference_context = ""
+                
+                # 3. Compile final prompt
+                with span("compile_prompt"):
+                    final_prompt = self.compile_final_prompt(context, bucket_suggestions, reference_context)
+                
+                # 4. Generate scene
+                with operation(stage="generation"), span("generation", streaming=self.stream_generation):
+                    scene_text = await self.generate_scene(final_prompt, context)
+                
+                # 5. Save scene
+                with span("save_scene", "db"):
+                    success = self.save_scene(scene_text, context)
+                
+                return success
+                
+            except Exception as e:
+                print(f"❌ Error writing scene {act}-{scene}: {e}")
+                return False
     
     async def write_all_scenes(self, buckets: List[str], user_guidance: str = "") -> str:
         """Write all scenes with full transparency"""
         session_id = self.start_session(buckets, user_guidance)
         
         # Get all scenes
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT act, scene 
-            FROM story_outline 
-            ORDER BY act, scene
-        ''')
-        scenes = cursor.fetchall()
+        scenes = self.project_snapshot.scenes()
         
         if not scenes:
             print("❌ No scenes found in story outline")
@@ -828,33 +865,171 @@ WRITE THE COMPLETE SCENE NOW:"""
         print(f"📝 Writing {len(scenes)} scenes")
         print(f"🧠 Using buckets: {', '.join(buckets)}")
         
+        await self.write_scenes(scenes)
+        self.complete_session(len(scenes))
+        await self.events.adrain()
+        return session_id
+    
+    async def resume_session(self, session_id: str) -> str:
+        """Continue an interrupted session, writing only scenes it has no saved text for"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT buckets_used, user_guidance, start_time
+            FROM write_sessions
+            WHERE session_id = ?
+        ''', (session_id,))
+        session_data = cursor.fetchone()
+        if not session_data:
+            raise ValueError(f"Write session not found: {session_id}")
+        buckets_used, user_guidance, start_time = session_data
+        buckets = buckets_used.split(',') if buckets_used else []
+        
+        cursor.execute('''
+            SELECT COUNT(DISTINCT act || '-' || scene), COALESCE(SUM(word_count), 0)
+            FROM final_scenes
+            WHERE session_id = ?
+        ''', (session_id,))
+        scenes_written, total_words = cursor.fetchone()
+        
+        self.current_session = {
+            "session_id": session_id,
+            "start_time": start_time,
+            "buckets": buckets,
+            "user_guidance": user_guidance or "",
+            "scenes_written": scenes_written,
+            "total_words": total_words,
+            "status": "running",
+            "resumed_at": datetime.now()
+        }
+        self.steps_log = []
+        self.refresh_snapshot()
+        
+        # Generations cut off mid-stream will never finish
+        cursor.execute('''
+            UPDATE scene_generations SET status = 'interrupted'
+            WHERE session_id = ? AND status = 'streaming'
+        ''', (session_id,))
+        cursor.execute('''
+            UPDATE write_sessions SET status = 'running', end_time = NULL
+            WHERE session_id = ?
+        ''', (session_id,))
+        self.conn.commit()
+        
+        done = self.saved_scenes(session_id)
+        scenes = self.project_snapshot.scenes()
+        
+        # Scenes generated before the interruption but never saved only need saving
+        recovered = 0
+        for act, scene, scene_text in self.unsaved_generations(session_id):
+            if (act, scene) in done or (act, scene) not in self.project_snapshot.outline:
+                continue
+            with self.steps.scene():
+                context = self.assemble_write_context(act, scene)
+                if self.save_scene(scene_text, context):
+                    done.add((act, scene))
+                    recovered += 1
+        
+        remaining = [pair for pair in scenes if pair not in done]
+        
+        self.trigger_callback('session_started', {
+            'session_id': session_id,
+            'buckets': buckets,
+            'user_guidance': user_guidance,
+            'resumed': True,
+            'remaining_scenes': len(remaining)
+        })
+        
+        print(f"🔁 Resuming {session_id}: {len(done)}/{len(scenes)} scenes saved"
+              + (f" ({recovered} recovered from finished generations)" if recovered else ""))
+        print(f"📝 Writing {len(remaining)} remaining scenes")
+        
+        await self.write_scenes(remaining)
+        self.complete_session(len(scenes))
+        await self.events.adrain()
+        return session_id
+    
+    def saved_scenes(self, session_id: str) -> set:
+        """(act, scene) pairs the session already has final text for"""
+        self.steps.flush()
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT act, scene FROM final_scenes WHERE session_id = ?
+        ''', (session_id,))
+        return {(act, scene) for act, scene in cursor.fetchall()}
+    
+    def unsaved_generations(self, session_id: str) -> List[tuple]:
+        """Latest completed generation per scene, for scenes whose save never happened"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT g.act, g.scene, g.generated_text
+            FROM scene_generations g
+            WHERE g.session_id = ? AND g.status = 'completed' AND g.success = 1
+              AND COALESCE(g.generated_text, '') != ''
+            ORDER BY g.act, g.scene, g.timestamp DESC
+        ''', (session_id,))
+        latest = {}
+        for act, scene, text in cursor.fetchall():
+            latest.setdefault((act, scene), text)
+        return [(act, scene, self.blobs.resolve(text)) for (act, scene), text in latest.items()]
+    
+    def interrupted_sessions(self) -> List[Dict]:
+        """Write sessions left 'running', newest first"""
+        self.steps.flush()
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT s.session_id, s.start_time, s.buckets_used,
+                   (SELECT COUNT(DISTINCT f.act || '-' || f.scene) FROM final_scenes f WHERE f.session_id = s.session_id)
+            FROM write_sessions s
+            WHERE s.status = 'running'
+            ORDER BY s.start_time DESC
+        ''')
+        return [{"session_id": session_id, "start_time": start_time, "buckets": buckets,
+                 "scenes_saved": saved} for session_id, start_time, buckets, saved in cursor.fetchall()]
+    
+    async def write_scenes(self, scenes: List[tuple]) -> int:
+        """Write the given (act, scene) pairs in order; returns how many succeeded"""
         successful_scenes = 0
         
-        for act, scene in scenes:
-            print(f"\n🎬 Writing Act {act}, Scene {scene}")
-            
-            success = await self.write_scene(act, scene)
-            
-            if success:
-                successful_scenes += 1
-                print(f"  ✅ Scene completed")
-            else:
-                print(f"  ❌ Scene failed")
-            
-            # Brief pause between scenes
-            await asyncio.sleep(1)
+        # With tracing on, nested scene timings go to <project>/traces/<session_id>.json
+        with trace_session(self.current_session["session_id"], os.path.join(self.project_path, "traces"),
+                           enabled=self.trace, project=self.project_name, pipeline="write") as trace:
+            self.last_trace = trace
+            for act, scene in scenes:
+                print(f"\n🎬 Writing Act {act}, Scene {scene}")
+                
+                success = await self.write_scene(act, scene)
+                
+                if success:
+                    successful_scenes += 1
+                    print(f"  ✅ Scene completed")
+                else:
+                    print(f"  ❌ Scene failed")
         
-        # Complete session
+        return successful_scenes
+    
+    def complete_session(self, total_scenes: int):
+        """Mark the current session completed, with stats counted from the scenes it actually saved"""
+        session_id = self.current_session["session_id"]
         self.current_session["end_time"] = datetime.now()
         self.current_session["status"] = "completed"
         
+        self.steps.flush()
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(DISTINCT act || '-' || scene), COALESCE(SUM(word_count), 0)
+            FROM final_scenes
+            WHERE session_id = ?
+        ''', (session_id,))
+        successful_scenes, total_words = cursor.fetchone()
+        self.current_session["total_words"] = total_words
+        
         cursor.execute('''
             UPDATE write_sessions 
             SET end_time = ?, total_scenes = ?, successful_scenes = ?, status = ?
             WHERE session_id = ?
         ''', (
             datetime.now(), 
-            len(scenes), 
+            total_scenes, 
             successful_scenes, 
             "completed", 
             session_id
@@ -863,15 +1038,14 @@ WRITE THE COMPLETE SCENE NOW:"""
         
         self.trigger_callback('session_completed', {
             'session_id': session_id,
-            'total_scenes': len(scenes),
+            'total_scenes': total_scenes,
             'successful_scenes': successful_scenes,
-            'total_words': self.current_session["total_words"]
+            'total_words': total_words
         })
-        
-        return session_id
     
     def get_session_summary(self, session_id: str) -> Dict:
         """Get comprehensive summary of a writing session"""
+        self.steps.flush()
         cursor = self.conn.cursor()
         
         # Get session info
@@ -912,11 +1086,14 @@ WRITE THE COMPLETE SCENE NOW:"""
             "total_words": total_words,
             "average_words_per_scene": avg_words,
             "step_counts": step_counts,
-            "scenes_detail": scenes
+            "scenes_detail": scenes,
+            "llm_usage": get_ledger().totals(session=session_id),
+            "llm_usage_by_stage": get_ledger().rollup(by=("stage", "bucket"), session=session_id)
         }
     
     def export_screenplay(self, session_id: str) -> str:
         """Export the complete screenplay"""
+        self.steps.flush()
         cursor = self.conn.cursor()
         
         cursor.execute('''
@@ -972,6 +1149,7 @@ class WriteConsole:
         self.writer.register_callback('bucket_queried', self.on_bucket_queried)
         self.writer.register_callback('prompt_compiled', self.on_prompt_compiled)
         self.writer.register_callback('generation_started', self.on_generation_started)
+        self.writer.register_callback('scene_chunk', self.on_scene_chunk)
         self.writer.register_callback('scene_generated', self.on_scene_generated)
         self.writer.register_callback('scene_saved', self.on_scene_saved)
         self.writer.register_callback('session_completed', self.on_session_completed)
@@ -1012,10 +1190,15 @@ class WriteConsole:
         act, scene = data['act'], data['scene']
         print(f"  ⚡ Generating scene text...")
     
+    def on_scene_chunk(self, data):
+        print(data['text'], end='', flush=True)
+    
     def on_scene_generated(self, data):
         if data['success']:
             word_count = data['word_count']
-            print(f"  ✅ Scene generated ({word_count} words)")
+            print(f"\n  ✅ Scene generated ({word_count} words)")
+            if data.get('ttft_seconds') is not None:
+                print(f"    First token: {data['ttft_seconds']}s, {data['tokens_per_sec']} tokens/sec")
         else:
             error = data['error']
             print(f"  ❌ Generation failed: {error}")
@@ -1038,9 +1221,9 @@ class WriteConsole:
         print(f"📝 Total words: {total_words}")
 
 
-async def demo_transparent_write():
-    """Demonstrate transparent writing"""
-    project_path = "exports/the_wrong_wedding_20250813_1253"
+async def demo_transparent_write(project_path: str = "exports/the_wrong_wedding_20250813_1253",
+                                 resume: Optional[str] = None):
+    """Demonstrate transparent writing; resume continues an interrupted session ("latest" for the newest)"""
     
     if not os.path.exists(project_path):
         print(f"Project not found: {project_path}")
@@ -1054,11 +1237,20 @@ async def demo_transparent_write():
     print("TRANSPARENT WRITING DEMO")
     print("="*60)
     
-    # Run writing with full transparency
-    session_id = await writer.write_all_scenes(
-        buckets=["scripts", "books"],
-        user_guidance="Focus on witty dialogue and authentic emotion"
-    )
+    if resume:
+        if resume == "latest":
+            interrupted = writer.interrupted_sessions()
+            if not interrupted:
+                print("No interrupted write sessions to resume")
+                return
+            resume = interrupted[0]["session_id"]
+        session_id = await writer.resume_session(resume)
+    else:
+        # Run writing with full transparency
+        session_id = await writer.write_all_scenes(
+            buckets=["scripts", "books"],
+            user_guidance="Focus on witty dialogue and authentic emotion"
+        )
     
     # Export screenplay
     writer.export_screenplay(session_id)
@@ -1074,4 +1266,10 @@ async def demo_transparent_write():
 
 
 if __name__ == "__main__":
-    asyncio.run(demo_transparent_write())
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Transparent screenplay writing for a Lizzy project")
+    parser.add_argument("project_path", nargs="?", default="exports/the_wrong_wedding_20250813_1253")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="SESSION_ID",
+                        help="continue an interrupted session (default: the most recent one)")
+    args = parser.parse_args()
+    asyncio.run(demo_transparent_write(args.project_path, args.resume))
\ No newline at end of file
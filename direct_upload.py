@@ -6,7 +6,6 @@ import sys
 sys.path.append('/Users/elle/Desktop/Elizabeth_PI')
 
 from core_knowledge import LightRAGManager
-import time
 
 def main():
     # Check for OpenAI API key in environment
@@ -45,8 +44,6 @@ def main():
                 print(f"✅ Successfully uploaded {filename}")
             else:
                 print(f"❌ Failed to upload {filename}")
-                
-            time.sleep(2)  # Brief pause between uploads
             
         except Exception as e:
             print(f"❌ Error uploading {filename}: {e}")
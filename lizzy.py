@@ -12,6 +12,7 @@ import shutil
 import re
 from datetime import datetime
 from openai import OpenAI
+from core_migrations import ensure_migrated
 
 # Optional imports with graceful fallbacks
 try:
@@ -120,6 +121,7 @@ class Session:
             
             # Ensure all required tables exist
             self.ensure_all_tables_exist()
+            ensure_migrated(db_path)
             
             return True
         return False
@@ -454,6 +456,7 @@ def create_project_database(project_name):
     
     conn.commit()
     conn.close()
+    ensure_migrated(db_path)
     return True
 
 def select_project():
@@ -14,6 +14,12 @@ from datetime import datetime
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import networkx as nx
+from util_async import AsyncApp, run_sync, wants_asgi, serve_asgi
+from core_jobs import JobStore, JobRunner, register_job_routes
+from util_uploads import UploadError, is_multipart, spool_request_files, save_upload
+from util_ratelimit import limit_embedding, limit_llm, llm_limit_stats
+from util_accounting import operation
+from util_metrics import INGEST_BYTES, INGEST_DOCUMENTS, INGEST_SECONDS, instrument_flask
 
 # Import LightRAG components
 try:
@@ -46,6 +52,7 @@ except Exception as e:
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "project_bucket_manager")
 
 class ProjectBucketManager:
     """Manages buckets for individual projects with cross-project browsing"""
@@ -386,8 +393,8 @@ class ProjectBucketManager:
                 # Initialize LightRAG instance
                 rag = LightRAG(
                     working_dir=str(bucket_dir),
-                    embedding_func=openai_embed,
-                    llm_model_func=gpt_4o_mini_complete,
+                    embedding_func=limit_embedding(openai_embed),
+                    llm_model_func=limit_llm(gpt_4o_mini_complete),
                 )
                 
                 # IMPORTANT: Both initialization calls are required per LightRAG docs
@@ -414,36 +421,62 @@ class ProjectBucketManager:
         if not bucket_dir.exists():
             return {"success": False, "error": "Bucket not found"}
         
-        file_path = bucket_dir / filename
-        
         try:
-            # Save the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            # Save the file; identical content already in the bucket is kept once and not reprocessed
+            saved = save_upload(str(bucket_dir), filename, file_content)
+            filename = saved["filename"]
+            if saved["duplicate"]:
+                return {"success": True, "file": filename, "processed": False, "duplicate_of": saved["duplicate_of"]}
             
-            # Process with LightRAG if available
+            # Queue LightRAG processing in the background job runner
             if HAS_LIGHTRAG:
-                try:
-                    # Run async LightRAG processing
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    result = loop.run_until_complete(self._process_file_with_lightrag(bucket_name, file_content, project_name))
-                    loop.close()
-                    
-                    if result:
-                        return {"success": True, "file": filename, "processed": True, "message": "File saved and processed with LightRAG"}
-                    else:
-                        return {"success": True, "file": filename, "processed": False, "message": "File saved but LightRAG processing failed"}
-                        
-                except Exception as e:
-                    print(f"⚠️ LightRAG processing error: {e}")
-                    return {"success": True, "file": filename, "processed": False, "error": f"File saved but processing failed: {str(e)}"}
+                job_id = job_runner.submit("process_files", bucket_name, [saved["path"]], project_name)
+                return {"success": True, "file": filename, "processed": False, "job_id": job_id,
+                        "message": "File saved and queued for LightRAG processing"}
             
             return {"success": True, "file": filename, "processed": False, "message": "File saved (LightRAG not available)"}
             
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def get_bucket_dir(self, bucket_name, project_name=None):
+        """Directory of a bucket in a project's LightRAG folder"""
+        if project_name is None:
+            project_name = self.current_project
+        return self.base_dir / f"lightrag_{project_name.lower()}" / bucket_name
+
+    def register_uploaded_files(self, bucket_name, spooled_files, project_name=None):
+        """Queue files already spooled into the bucket as a single processing job"""
+        if project_name is None:
+            project_name = self.current_project
+        
+        new_files = [f for f in spooled_files if not f["duplicate"]]
+        result = {
+            "success": True,
+            "files": [f["filename"] for f in new_files],
+            "duplicates": [{"file": f["filename"], "duplicate_of": f["duplicate_of"]} for f in spooled_files if f["duplicate"]],
+            "bytes_received": sum(f["size"] for f in spooled_files),
+            "processed": False
+        }
+        
+        if new_files and HAS_LIGHTRAG:
+            result["job_id"] = job_runner.submit("process_files", bucket_name, [f["path"] for f in new_files], project_name)
+            result["message"] = f"{len(new_files)} file(s) saved and queued for LightRAG processing"
+        
+        return result
+
+    def get_processable_files(self, bucket_name, project_name=None):
+        """Text files in a bucket that LightRAG can ingest"""
+        if project_name is None:
+            project_name = self.current_project
+        
+        bucket_dir = self.get_bucket_dir(bucket_name, project_name)
+        if not bucket_dir.exists():
+            return None
+        
+        return [file_path for file_path in sorted(bucket_dir.iterdir())
+                if file_path.is_file() and file_path.suffix.lower() in ['.txt', '.md', '.csv']]
+
     async def _process_file_with_lightrag(self, bucket_name, file_content, project_name):
         """Process file content with LightRAG"""
         try:
@@ -480,6 +513,24 @@ class ProjectBucketManager:
 # Initialize the manager
 manager = ProjectBucketManager()
 
+def process_job_file(job, file):
+    """Insert one file into its project bucket's LightRAG instance"""
+    with open(file["path"], 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    with operation(project=job["project"], bucket=job["bucket"], document=file["filename"], stage="ingest") as usage, \
+            INGEST_SECONDS.time(bucket=job["bucket"]):
+        success = run_sync(manager._process_file_with_lightrag(job["bucket"], content, job["project"]))
+    INGEST_DOCUMENTS.inc(bucket=job["bucket"], status="ok" if success else "error")
+    if success:
+        INGEST_BYTES.inc(len(content), bucket=job["bucket"])
+    return {"success": success, "error": None if success else "LightRAG processing failed", "llm_usage": usage.to_dict()}
+
+# Background processing jobs persist next to the project LightRAG directories
+job_store = JobStore(str(manager.base_dir / "lightrag_jobs" / "jobs.sqlite"))
+job_runner = JobRunner(job_store, process_job_file, max_workers=2)
+register_job_routes(app, job_runner)
+
 # API Routes
 
 @app.route('/')
@@ -542,7 +593,19 @@ def import_bucket(source_project, bucket_name):
 
 @app.route('/api/buckets/<bucket_name>/files', methods=['POST'])
 def add_file_to_bucket(bucket_name):
-    """Add a file to a bucket"""
+    """Add files to a bucket (multipart, streamed to disk; or JSON)"""
+    if is_multipart(request.content_type):
+        bucket_dir = manager.get_bucket_dir(bucket_name)
+        if not bucket_dir.exists():
+            return jsonify({"success": False, "error": "Bucket not found"}), 404
+        try:
+            spooled = spool_request_files(request.stream, request.content_type, str(bucket_dir))
+        except UploadError as e:
+            return jsonify({"success": False, "error": str(e)}), e.status
+        if not spooled["files"]:
+            return jsonify({"success": False, "error": "No files in upload"}), 400
+        return jsonify(manager.register_uploaded_files(bucket_name, spooled["files"]))
+    
     data = request.json
     result = manager.add_file_to_bucket(
         bucket_name,
@@ -557,71 +620,30 @@ def delete_file(bucket_name, filename):
     result = manager.delete_file_from_bucket(bucket_name, filename)
     return jsonify(result)
 
-@app.route('/api/buckets/<bucket_name>/process', methods=['POST'])
-def process_bucket_files(bucket_name):
-    """Process all files in a bucket with LightRAG"""
-    
+def submit_bucket_processing(bucket_name):
+    """Queue every processable file in a bucket as one background job, returning (payload, status)"""
     if not HAS_LIGHTRAG:
-        return jsonify({"success": False, "error": "LightRAG not available"})
+        return {"success": False, "error": "LightRAG not available"}, 500
     
-    try:
-        # Get bucket directory
-        lightrag_project_dir = manager.base_dir / f"lightrag_{manager.current_project.lower()}"
-        bucket_dir = lightrag_project_dir / bucket_name
-        
-        if not bucket_dir.exists():
-            return jsonify({"success": False, "error": "Bucket not found"})
-        
-        # Find all text files
-        text_files = []
-        for file_path in bucket_dir.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in ['.txt', '.md', '.csv']:
-                text_files.append(file_path)
-        
-        if not text_files:
-            return jsonify({"success": False, "error": "No processable files found"})
-        
-        # Process files with LightRAG
-        processed_files = []
-        failed_files = []
-        
-        # Run async processing
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        async def process_all():
-            rag = await manager.get_lightrag_instance(bucket_name)
-            if rag is None:
-                return False
-            
-            for file_path in text_files:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    await rag.ainsert(content)
-                    processed_files.append(file_path.name)
-                    print(f"✅ Processed {file_path.name}")
-                    
-                except Exception as e:
-                    failed_files.append({"file": file_path.name, "error": str(e)})
-                    print(f"⚠️ Failed to process {file_path.name}: {e}")
-            
-            return True
-        
-        success = loop.run_until_complete(process_all())
-        loop.close()
-        
-        return jsonify({
-            "success": success,
-            "processed_files": processed_files,
-            "failed_files": failed_files,
-            "total_processed": len(processed_files),
-            "total_failed": len(failed_files)
-        })
-        
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+    text_files = manager.get_processable_files(bucket_name)
+    if text_files is None:
+        return {"success": False, "error": "Bucket not found"}, 404
+    if not text_files:
+        return {"success": False, "error": "No processable files found"}, 400
+    
+    job_id = job_runner.submit("process_bucket", bucket_name, [str(p) for p in text_files], manager.current_project)
+    return {
+        "success": True,
+        "job_id": job_id,
+        "queued_files": len(text_files),
+        "status_url": f"/api/jobs/{job_id}"
+    }, 202
+
+@app.route('/api/buckets/<bucket_name>/process', methods=['POST'])
+def process_bucket_files(bucket_name):
+    """Queue all files in a bucket for LightRAG processing"""
+    result, status = submit_bucket_processing(bucket_name)
+    return jsonify(result), status
 
 @app.route('/api/stats')
 def get_stats():
@@ -649,6 +671,7 @@ def health_check():
         "current_project": manager.current_project,
         "lightrag_dir": str(manager.lightrag_dir),
         "api_key_available": bool(os.environ.get('OPENAI_API_KEY')),
+        "llm_limits": llm_limit_stats(),
         "timestamp": datetime.now().isoformat()
     })
 
@@ -696,9 +719,21 @@ def switch_project(project_name):
         "lightrag_dir": str(manager.lightrag_dir)
     })
 
+# Async serving mode: LLM-bound routes run as coroutines, the rest falls through to Flask
+asgi_app = AsyncApp(app)
+
+@asgi_app.route('/api/buckets/<bucket_name>/process', methods=['POST'])
+async def process_bucket_files_async(req, bucket_name):
+    """Queue all files in a bucket without holding a worker thread"""
+    return submit_bucket_processing(bucket_name)
+
 if __name__ == '__main__':
     print("🚀 Starting Project-Specific Bucket Manager Server...")
     print(f"📊 Current Project: {manager.current_project}")
     print(f"📁 LightRAG Directory: {manager.lightrag_dir}")
     print("🌐 Access at http://localhost:8002")
-    app.run(host='0.0.0.0', port=8002, debug=False)
\ No newline at end of file
+    job_runner.start()
+    if wants_asgi():
+        serve_asgi(asgi_app, '0.0.0.0', 8002, fallback=lambda: app.run(host='0.0.0.0', port=8002, debug=False, threaded=True))
+    else:
+        app.run(host='0.0.0.0', port=8002, debug=False)
\ No newline at end of file
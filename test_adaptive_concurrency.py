@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test AIMD concurrency: additive increase, multiplicative decrease, fairness across threads and loops
+"""
+
+import asyncio
+import threading
+import time
+
+from util_concurrency import (SUCCESS, THROTTLED, TIMEOUT, AdaptiveLimiter, classify_outcome,
+                              configure_concurrency, concurrency_stats)
+from util_ratelimit import call_with_limit, configure_limits
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_additive_increase_multiplicative_decrease():
+    limiter = AdaptiveLimiter("aimd", initial=4, max_limit=8, cooldown=0)
+    # Roughly one step per limit's worth of successes
+    for _ in range(4):
+        limiter.acquire_sync()
+        limiter.release(SUCCESS)
+    assert limiter.limit == 4
+    limiter.acquire_sync()
+    limiter.release(SUCCESS)
+    assert limiter.limit == 5
+    for _ in range(50):
+        limiter.acquire_sync()
+        limiter.release(SUCCESS)
+    assert limiter.limit == 8
+
+    limiter.acquire_sync()
+    limiter.release(THROTTLED)
+    assert limiter.limit == 4
+    limiter.acquire_sync()
+    limiter.release(TIMEOUT)
+    assert limiter.limit == 2 and limiter.stats()["decreases"] == 2
+    for _ in range(5):
+        limiter.acquire_sync()
+        limiter.release(THROTTLED)
+    assert limiter.limit == 1
+
+
+def test_burst_of_429s_cuts_once():
+    limiter = AdaptiveLimiter("burst", initial=16, max_limit=16, cooldown=60)
+    for _ in range(10):
+        limiter.acquire_sync()
+    for _ in range(10):
+        limiter.release(THROTTLED)
+    assert limiter.limit == 8 and limiter.stats()["throttled_calls"] == 10
+
+
+def test_outcome_classification():
+    assert classify_outcome(None) == SUCCESS
+    assert classify_outcome(RateLimitError()) == THROTTLED
+    assert classify_outcome(asyncio.TimeoutError()) == TIMEOUT
+    assert classify_outcome(type("APITimeoutError", (Exception,), {})()) == TIMEOUT
+    assert classify_outcome(ValueError("bad prompt")) == "error"
+
+
+def test_in_flight_never_exceeds_limit():
+    limiter = AdaptiveLimiter("cap", initial=3, max_limit=3)
+    peak = [0]
+
+    async def call():
+        async with limiter.slot():
+            peak[0] = max(peak[0], limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(20)))
+
+    # Two event loops in two threads plus a blocking caller share the one limiter
+    threads = [threading.Thread(target=asyncio.run, args=(run(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in range(5):
+        with limiter.slot_sync():
+            time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    stats = limiter.stats()
+    assert stats["peak_in_flight"] == 3 and stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert stats["success_calls"] == 45
+
+
+def test_cancelled_waiter_releases_its_slot():
+    limiter = AdaptiveLimiter("cancel", initial=1, max_limit=1)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        limiter.release(SUCCESS)
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(limiter.acquire(), 1)
+        limiter.release(SUCCESS)
+
+    asyncio.run(run())
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_throttled_upstream_settles_below_its_capacity():
+    """Simulated provider that 429s above 6 concurrent calls"""
+    configure_limits("sim-model", rpm=1_000_000, tpm=1_000_000_000)
+    limiter = configure_concurrency("sim-model", initial=4, max_limit=32)
+    limiter.cooldown = 0.05
+    active = [0]
+    throttles = [0]
+
+    async def provider(prompt):
+        active[0] += 1
+        try:
+            await asyncio.sleep(0.005)
+            if active[0] > 6:
+                throttles[0] += 1
+                error = RateLimitError("slow down")
+                error.response = type("Response", (), {"status_code": 429, "headers": {"retry-after-ms": "1"}})()
+                raise error
+            return prompt
+        finally:
+            active[0] -= 1
+
+    async def run():
+        return await asyncio.gather(*(call_with_limit("sim-model", 1, provider, i) for i in range(300)))
+
+    results = asyncio.run(run())
+    stats = next(s for s in concurrency_stats() if s["model"] == "sim-model")
+    print(f"📊 300 calls, {throttles[0]} throttled, limit settled at {stats['limit']} "
+          f"(peak {stats['peak_in_flight']}, {stats['decreases']} decreases)")
+    assert results == list(range(300))
+    assert 2 <= stats["limit"] <= 12 and stats["decreases"] >= 1
+
+
+if __name__ == "__main__":
+    print("🧪 Adaptive Concurrency Test")
+    print("=" * 40)
+    test_additive_increase_multiplicative_decrease()
+    test_burst_of_429s_cuts_once()
+    test_outcome_classification()
+    test_in_flight_never_exceeds_limit()
+    test_cancelled_waiter_releases_its_slot()
+    test_throttled_upstream_settles_below_its_capacity()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Load test for the async serving mode
+Compares thread-per-request (WSGI fallback) against async routes for LLM-shaped latency
+"""
+
+import asyncio
+import json
+import time
+
+from util_async import AsyncApp, get_shared_loop, on_shared_loop, run_sync
+
+LLM_LATENCY = 0.2       # seconds per simulated LLM call
+CONCURRENT_REQUESTS = 200
+WSGI_THREADS = 16
+
+
+def blocking_wsgi_app(environ, start_response):
+    """WSGI app whose only route blocks its worker thread for the whole 'LLM call'"""
+    time.sleep(LLM_LATENCY)
+    start_response("200 OK", [("Content-Type", "application/json")])
+    return [json.dumps({"response": "ok"}).encode()]
+
+
+def build_app() -> AsyncApp:
+    asgi_app = AsyncApp(blocking_wsgi_app, max_wsgi_threads=WSGI_THREADS)
+
+    @asgi_app.route('/api/buckets/<bucket_name>/query', methods=['POST'])
+    async def query(req, bucket_name):
+        async def fake_llm():
+            await asyncio.sleep(LLM_LATENCY)
+            return f"answer from {bucket_name}"
+        response = await on_shared_loop(fake_llm())
+        return {"bucket": bucket_name, "question": req.get_json()["question"], "response": response}
+
+    return asgi_app
+
+
+async def call(asgi_app, method, path, body=b""):
+    """Drive one request through the ASGI app and collect the response"""
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(b"content-type", b"application/json")]}
+    sent = {"body": b""}
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+        else:
+            sent["body"] += message.get("body", b"")
+
+    await asyncio.wait_for(asgi_app(scope, receive, send), timeout=60)
+    return sent
+
+
+async def fire(asgi_app, method, path, body=b""):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[call(asgi_app, method, path, body) for _ in range(CONCURRENT_REQUESTS)])
+    return time.perf_counter() - start, responses
+
+
+def test_async_route_returns_json():
+    """Async routes match Flask-style rules and return JSON"""
+    asgi_app = build_app()
+    result = asyncio.run(call(asgi_app, "POST", "/api/buckets/scripts/query", b'{"question": "who?"}'))
+    assert result["status"] == 200
+    payload = json.loads(result["body"])
+    assert payload["bucket"] == "scripts"
+    assert payload["response"] == "answer from scripts"
+    print("✅ Async route OK")
+
+
+def test_unmatched_routes_fall_back_to_wsgi():
+    """Anything without an async route is served by the wrapped WSGI app"""
+    asgi_app = build_app()
+    result = asyncio.run(call(asgi_app, "GET", "/api/buckets"))
+    assert result["status"] == 200
+    assert json.loads(result["body"]) == {"response": "ok"}
+    print("✅ WSGI fallback OK")
+
+
+def test_wsgi_fallback_streams_the_request_body():
+    """Flask routes read the body from receive() as they go; async routes' buffered bodies are capped"""
+    chunk, chunks = b"x" * 65536, 64
+    pulled = []
+
+    def upload_app(environ, start_response):
+        # Nothing has been read ahead of the app
+        before = len(pulled)
+        stream, total, reads = environ["wsgi.input"], 0, 0
+        for data in iter(lambda: stream.read(65536), b""):
+            total += len(data)
+            reads += 1
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return [json.dumps({"before": before, "total": total, "reads": reads}).encode()]
+
+    asgi_app = AsyncApp(upload_app, max_body_size=1024)
+
+    @asgi_app.route('/api/echo', methods=['POST'])
+    async def echo(req):
+        return {"size": len(req.body)}
+
+    async def post(path, count):
+        scope = {"type": "http", "method": "POST", "path": path, "query_string": b"",
+                 "headers": [(b"content-type", b"multipart/form-data; boundary=x")]}
+        sent = {"body": b""}
+
+        async def receive():
+            pulled.append(1)
+            if len(pulled) > count:
+                await asyncio.sleep(3600)
+            return {"type": "http.request", "body": chunk, "more_body": len(pulled) < count}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                sent["status"] = message["status"]
+            else:
+                sent["body"] += message.get("body", b"")
+
+        await asyncio.wait_for(asgi_app(scope, receive, send), timeout=30)
+        return sent
+
+    result = asyncio.run(post("/api/buckets/scripts/files", chunks))
+    payload = json.loads(result["body"])
+    assert result["status"] == 200 and payload["before"] == 0
+    assert payload["total"] == len(chunk) * chunks and payload["reads"] >= chunks
+
+    pulled.clear()
+    assert asyncio.run(post("/api/echo", 4))["status"] == 413
+    print(f"✅ {len(chunk) * chunks // 1024} KB streamed to the WSGI app in {payload['reads']} reads")
+
+
+def test_run_sync_uses_single_shared_loop():
+    """Sync callers reuse one long-lived loop instead of building a loop per request"""
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = run_sync(current_loop())
+    second = run_sync(current_loop())
+    assert first is second is get_shared_loop().loop
+    assert not first.is_closed()
+    print("✅ Shared loop reused")
+
+
+def test_concurrency_gain():
+    """Hundreds of in-flight LLM calls multiplex on the loop instead of queueing for threads"""
+    asgi_app = build_app()
+
+    threaded_time, threaded = asyncio.run(fire(asgi_app, "GET", "/api/chat"))
+    async_time, async_responses = asyncio.run(
+        fire(asgi_app, "POST", "/api/buckets/scripts/query", b'{"question": "who?"}'))
+
+    assert all(r["status"] == 200 for r in threaded + async_responses)
+
+    speedup = threaded_time / async_time
+    print(f"📊 {CONCURRENT_REQUESTS} concurrent requests @ {LLM_LATENCY}s simulated LLM latency")
+    print(f"   Thread pool ({WSGI_THREADS} workers): {threaded_time:.2f}s "
+          f"({CONCURRENT_REQUESTS / threaded_time:.0f} req/s)")
+    print(f"   Async routes:                 {async_time:.2f}s "
+          f"({CONCURRENT_REQUESTS / async_time:.0f} req/s)")
+    print(f"   Speedup: {speedup:.1f}x")
+
+    # Thread-bound path needs ceil(200/16) sequential waves; async completes in roughly one
+    assert async_time < LLM_LATENCY * 4
+    assert speedup > 4
+
+
+if __name__ == "__main__":
+    print("🧪 Async Server Load Test")
+    print("=" * 40)
+    test_async_route_returns_json()
+    test_unmatched_routes_fall_back_to_wsgi()
+    test_wsgi_fallback_streams_the_request_body()
+    test_run_sync_uses_single_shared_loop()
+    test_concurrency_gain()
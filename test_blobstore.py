@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed blob store: round trips, deduplication, and migrating existing rows
+"""
+
+import sqlite3
+
+from core_blobstore import BLOBS_TABLE, BlobStore, blob_report, format_report, is_blob_ref
+from core_migrations import MIGRATIONS, migrate
+
+PROMPT = "You are writing a romantic comedy scene. " * 40
+
+
+def test_put_and_resolve():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(BLOBS_TABLE)
+    store = BlobStore(conn)
+
+    ref = store.put(PROMPT)
+    assert is_blob_ref(ref) and store.put(PROMPT) == ref
+    assert store.put("short") == "short" and store.put(None) is None
+    assert store.put(ref) == ref
+    assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+
+    # A fresh store (no cache) reads and decompresses from the table
+    assert BlobStore(conn).resolve(ref) == PROMPT
+    assert BlobStore(conn).resolve("blob:not-a-hash") == "blob:not-a-hash"
+    size, stored = conn.execute("SELECT size, stored_size FROM blobs").fetchone()
+    assert stored < size / 10
+    print(f"✅ {size:,} bytes stored as {stored:,}")
+
+
+def test_migration_externalizes_existing_rows():
+    conn = sqlite3.connect(":memory:")
+    for migration in MIGRATIONS[:-1]:
+        migration.apply(conn.cursor())
+    conn.execute("PRAGMA user_version = 3")
+    # Every scene's generation and prompt-compile step carry the same prompt
+    for scene in range(1, 21):
+        conn.execute("""INSERT INTO scene_generations (generation_id, session_id, act, scene, context_used,
+                        prompt_used, generated_text) VALUES (?, 'WS_1', 1, ?, '{}', ?, 'INT. CAFE')""",
+                     (f"gen_{scene}", scene, PROMPT))
+        conn.execute("INSERT INTO write_steps (step_id, session_id, step_type, content) VALUES (?, 'WS_1', 'prompt_compile', ?)",
+                     (f"step_{scene}", PROMPT))
+    conn.commit()
+
+    assert migrate(conn) == [4]
+    assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+    ref, text = conn.execute("SELECT prompt_used, generated_text FROM scene_generations LIMIT 1").fetchone()
+    assert is_blob_ref(ref) and text == "INT. CAFE"
+    assert BlobStore(conn).resolve(ref) == PROMPT
+
+    report = blob_report(conn)
+    print("\n".join(format_report(report)))
+    assert report["referenced_bytes"] == 40 * len(PROMPT)
+    assert report["bytes_saved"] > 0.9 * report["referenced_bytes"]
+
+
+if __name__ == "__main__":
+    print("🧪 Blob Store Test")
+    print("=" * 40)
+    test_put_and_resolve()
+    test_migration_externalizes_existing_rows()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test context-only multi-bucket retrieval: section parsing, cross-bucket dedup and the token budget
+"""
+
+import asyncio
+import time
+
+from core_retrieval import estimate_tokens, gather_bucket_context, merge_contexts, parse_context_sections
+
+
+def lightrag_context(entities, relationships, sources):
+    """Context string in the shape LightRAG returns for only_need_context=True"""
+    return (
+        "-----Entities-----\n```csv\nid,entity,type,description,rank\n"
+        + "\n".join(f'{i},"{e}"' for i, e in enumerate(entities))
+        + "\n```\n-----Relationships-----\n```csv\nid,source,target,description,keywords,weight,rank\n"
+        + "\n".join(f'{i},"{r}"' for i, r in enumerate(relationships))
+        + "\n```\n-----Sources-----\n```csv\nid,content\n"
+        + "\n".join(f'{i},"{s}"' for i, s in enumerate(sources))
+        + "\n```"
+    )
+
+
+SCRIPTS = lightrag_context(
+    ["ELLE, person, a barista who hides behind jokes", "MARCUS, person, a reserved architect"],
+    ["ELLE, MARCUS, spilled coffee leads to a bickering truce"],
+    ["INT. COFFEE SHOP - DAY. Elle collides with Marcus.", "Banter escalates over the ruined blueprint."]
+)
+BOOKS = lightrag_context(
+    ["MARCUS, person, a reserved architect", "MEET-CUTE, concept, the first charged encounter"],
+    ["ELLE, MARCUS, spilled coffee leads to a bickering truce"],
+    ["The meet-cute should establish both flaws at once."]
+)
+
+
+def test_parse_sections():
+    sections = parse_context_sections(SCRIPTS)
+    assert len(sections["entities"]) == 2 and len(sections["relationships"]) == 1
+    assert sections["sources"][0].startswith('0,"INT. COFFEE SHOP')
+    plain = parse_context_sections("First paragraph.\n\nSecond paragraph.")
+    assert plain["sources"] == ["First paragraph.", "Second paragraph."] and not plain["entities"]
+    print("✅ Context sections parsed")
+
+
+def test_merge_dedupes_across_buckets():
+    merged = merge_contexts({"scripts": SCRIPTS, "books": BOOKS}, token_budget=2000)
+    assert merged["duplicates_removed"] == 2
+    assert merged["text"].count("a reserved architect") == 1
+    assert merged["text"].count("bickering truce") == 1
+    assert "[books] " in merged["text"] and "[scripts] " in merged["text"]
+    assert merged["text"].index("=== ENTITIES ===") < merged["text"].index("=== SOURCES ===")
+    print(f"✅ Merged {merged['items_kept']} items, {merged['duplicates_removed']} duplicates removed")
+
+
+def test_merge_respects_token_budget():
+    big = {f"bucket{b}": lightrag_context([], [], [f"bucket {b} source chunk {i} " + "detail " * 40 for i in range(20)])
+           for b in range(3)}
+    merged = merge_contexts(big, token_budget=600)
+    assert merged["tokens"] <= 600 and merged["items_dropped"] > 0
+    assert estimate_tokens(merged["text"]) <= 700
+    # Round-robin keeps every bucket represented
+    assert all(f"[bucket{b}]" in merged["text"] for b in range(3))
+    print(f"✅ Budget held: {merged['tokens']}/600 tokens, {merged['items_dropped']} items dropped")
+
+
+def test_gather_is_concurrent_and_context_only():
+    calls = []
+
+    async def query(bucket, query, mode="hybrid", only_need_context=False, top_k=None):
+        calls.append((bucket, only_need_context))
+        await asyncio.sleep(0.2)
+        if bucket == "plays":
+            return {"error": "Bucket not found: plays"}
+        return {"response": {"scripts": SCRIPTS, "books": BOOKS}[bucket]}
+
+    start = time.perf_counter()
+    merged = asyncio.run(gather_bucket_context(query, ["scripts", "books", "plays"], "Elle meets Marcus"))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.4
+    assert all(context_only for _, context_only in calls)
+    assert merged["buckets"] == ["scripts", "books"] or merged["buckets"] == ["books", "scripts"]
+    assert {r["bucket"]: r["success"] for r in merged["retrieval"]}["plays"] is False
+    print(f"📊 3 context-only bucket queries in {elapsed:.2f}s, {merged['tokens']} merged tokens")
+
+
+if __name__ == "__main__":
+    print("🧪 Context Merge Test")
+    print("=" * 40)
+    test_parse_sections()
+    test_merge_dedupes_across_buckets()
+    test_merge_respects_token_budget()
+    test_gather_is_concurrent_and_context_only()
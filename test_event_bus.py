@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test the pipeline event bus: publishing never waits on listeners, overflow policies and lag metrics
+"""
+
+import asyncio
+import threading
+import time
+
+from util_events import BLOCK, COALESCE, DROP_OLDEST, EventBus, EventHub
+
+
+def test_slow_listener_does_not_slow_publisher():
+    bus = EventBus("slow")
+    seen = []
+
+    def slow_printer(data):
+        time.sleep(0.01)
+        seen.append(data["i"])
+
+    bus.on("step_completed", slow_printer, maxsize=100)
+    start = time.perf_counter()
+    for i in range(50):
+        bus.publish("step_completed", {"i": i})
+    elapsed = time.perf_counter() - start
+
+    assert bus.drain(timeout=5)
+    stats = bus.stats()["subscribers"][0]
+    print(f"📊 50 events to a 10 ms listener published in {elapsed * 1000:.1f} ms, "
+          f"max lag {stats['max_lag_seconds'] * 1000:.0f} ms, handler {stats['avg_handler_ms']:.1f} ms")
+    assert elapsed < 0.25
+    assert seen == list(range(50))
+    assert stats["delivered"] == 50 and stats["dropped"] == 0 and stats["max_lag_seconds"] > 0.1
+
+
+def test_overflow_policies():
+    bus = EventBus("policies")
+    gate = threading.Event()
+    received = {DROP_OLDEST: [], COALESCE: [], BLOCK: []}
+
+    def listener(policy):
+        def handle(data):
+            gate.wait()
+            received[policy].append((data["event"], data["n"]))
+        handle.__qualname__ = policy
+        return handle
+
+    for policy in received:
+        subscriber = bus.subscribe(policy, maxsize=2, policy=policy, block_timeout=0.05)
+        for event in ("step_started", "progress"):
+            subscriber.route(event, listener(policy))
+
+    bus.publish("step_started", {"event": "step_started", "n": 1})
+    # Each listener's worker is now stuck handling the first event
+    while not all(s.busy for s in bus.subscribers):
+        time.sleep(0.001)
+    for n in (2, 3, 4, 5):
+        bus.publish("progress", {"event": "progress", "n": n})
+    gate.set()
+    assert bus.drain(timeout=5)
+
+    stats = {s["subscriber"]: s for s in bus.stats()["subscribers"]}
+    # Two more fit in each queue
+    assert received[DROP_OLDEST] == [("step_started", 1), ("progress", 4), ("progress", 5)]
+    assert received[COALESCE] == [("step_started", 1), ("progress", 2), ("progress", 5)]
+    assert stats[COALESCE]["dropped"] == 2 and stats[COALESCE]["high_water"] == 2
+    # block waited its block_timeout on each overflow before falling back to dropping the oldest
+    assert stats[BLOCK]["blocked_seconds"] >= 0.1 and len(received[BLOCK]) == 3
+    print("✅ Overflow policies OK")
+
+
+def test_block_policy_is_lossless_when_listener_keeps_up():
+    bus = EventBus("block")
+    seen = []
+    bus.on("scene_chunk", lambda data: (time.sleep(0.001), seen.append(data)), maxsize=4, policy=BLOCK)
+    for i in range(100):
+        bus.publish("scene_chunk", i)
+    assert bus.drain(timeout=5)
+    assert seen == list(range(100)) and bus.stats()["subscribers"][0]["dropped"] == 0
+
+
+def test_block_policy_never_waits_on_the_event_loop():
+    bus = EventBus("loop")
+    gate = threading.Event()
+    bus.on("scene_chunk", lambda data: gate.wait(), maxsize=2, policy=BLOCK, block_timeout=1.0)
+
+    async def pipeline():
+        # Publishing from a coroutine, as the pipelines do once per streamed token
+        start = time.perf_counter()
+        for i in range(20):
+            bus.publish("scene_chunk", i)
+            await asyncio.sleep(0)
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(pipeline())
+    gate.set()
+    assert bus.drain(timeout=5)
+    stats = bus.stats()["subscribers"][0]
+    assert elapsed < 0.2 and stats["blocked_seconds"] == 0 and stats["dropped"] > 0
+    print(f"✅ 20 chunks to a stuck BLOCK listener published on the loop in {elapsed * 1000:.1f} ms")
+
+
+class Display:
+    """Bound methods of one listener share a queue, like WritingDisplay"""
+
+    def __init__(self):
+        self.lines = []
+
+    def on_scene_started(self, data):
+        self.lines.append(f"start {data}")
+
+    async def on_scene_chunk(self, data):
+        await asyncio.sleep(0)
+        self.lines.append(f"chunk {data}")
+
+    def on_error(self, data):
+        raise RuntimeError("listener bug")
+
+
+def test_bound_methods_keep_order_and_async_handlers_run():
+    bus = EventBus("display")
+    display = Display()
+    bus.on("scene_started", display.on_scene_started)
+    bus.on("scene_chunk", display.on_scene_chunk)
+    bus.on("scene_started", display.on_error)
+    assert len(bus.subscribers) == 1
+
+    for scene in (1, 2):
+        bus.publish("scene_started", scene)
+        bus.publish("scene_chunk", scene)
+    bus.publish("unrouted", None)
+    assert bus.drain(timeout=5)
+    assert display.lines == ["start 1", "chunk 1", "start 2", "chunk 2"]
+    assert bus.stats()["subscribers"][0]["errors"] == 2
+    print("✅ Ordering and async handlers OK")
+
+
+def test_bridge_numbers_events_in_publish_order():
+    class Pipeline:
+        def __init__(self):
+            self.callbacks = {"step_started": [], "step_completed": []}
+            self.events = EventBus("pipeline")
+
+    hub = EventHub()
+    pipeline = Pipeline()
+    channel = hub.bridge(pipeline, "RUN_BUS")
+    subscription = channel.subscribe()
+    for i in range(3):
+        pipeline.events.publish("step_started", {"i": i})
+        pipeline.events.publish("step_completed", {"i": i})
+    pipeline.events.drain()
+
+    events = [subscription.get(timeout=1) for _ in range(6)]
+    assert [(e["event"], e["data"]["i"]) for e in events] == [
+        (event, i) for i in range(3) for event in ("step_started", "step_completed")]
+    assert [e["id"] for e in events] == list(range(1, 7))
+
+
+if __name__ == "__main__":
+    print("🧪 Event Bus Test")
+    print("=" * 40)
+    test_slow_listener_does_not_slow_publisher()
+    test_overflow_policies()
+    test_block_policy_is_lossless_when_listener_keeps_up()
+    test_block_policy_never_waits_on_the_event_loop()
+    test_bound_methods_keep_order_and_async_handlers_run()
+    test_bridge_numbers_events_in_publish_order()
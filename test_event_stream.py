@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test live event streaming: callback bridging, drop policies, replay and SSE framing
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+
+from util_events import EventHub, EventChannel, DROP_NEWEST, COALESCE, format_sse, sse_stream, async_sse_stream
+
+
+@dataclass
+class FakeStep:
+    step_id: str
+    scene: int
+
+
+class FakePipeline:
+    """Same callback surface as TransparentBrainstormer / TransparentWriter"""
+
+    def __init__(self):
+        self.callbacks = {'step_started': [], 'step_completed': [], 'session_completed': []}
+
+    def register_callback(self, event, callback):
+        if event in self.callbacks:
+            self.callbacks[event].append(callback)
+
+    def trigger_callback(self, event, data):
+        for callback in self.callbacks.get(event, []):
+            callback(data)
+
+
+def test_bridge_publishes_pipeline_callbacks():
+    """Every pipeline callback lands on the run's channel with a JSON-safe payload"""
+    hub = EventHub()
+    pipeline = FakePipeline()
+    channel = hub.bridge(pipeline, "RUN_1")
+    subscription = channel.subscribe()
+
+    pipeline.trigger_callback('step_started', FakeStep("BS_1", 1))
+    pipeline.trigger_callback('step_completed', {"scene": 1})
+    hub.publish("RUN_1", "run_completed", {"session_id": "BS_1"})
+
+    events = [subscription.get(timeout=1) for _ in range(3)]
+    assert [e["event"] for e in events] == ['step_started', 'step_completed', 'run_completed']
+    assert events[0]["data"] == {"step_id": "BS_1", "scene": 1}
+    assert [e["id"] for e in events] == [1, 2, 3]
+    assert subscription.finished and channel.closed
+    print("✅ Bridge OK")
+
+
+def test_slow_subscriber_never_blocks_publish():
+    """A reader that never drains costs the publisher nothing beyond a bounded buffer"""
+    channel = EventChannel("RUN_SLOW")
+    slow = channel.subscribe(maxsize=10)
+
+    start = time.perf_counter()
+    for i in range(10000):
+        channel.publish("scene_chunk", {"i": i})
+    elapsed = time.perf_counter() - start
+
+    stats = slow.stats()
+    print(f"📊 10,000 events with a stalled subscriber in {elapsed * 1000:.1f} ms, dropped {stats['dropped']}")
+    assert stats["queued"] == 10 and stats["dropped"] == 9990
+    # drop_oldest keeps the newest events
+    assert slow.get()["data"] == {"i": 9990}
+
+
+def test_drop_newest_and_coalesce():
+    channel = EventChannel("RUN_POLICY")
+    newest = channel.subscribe(maxsize=2, policy=DROP_NEWEST)
+    coalesce = channel.subscribe(maxsize=2, policy=COALESCE)
+
+    channel.publish("step_started", {"n": 1})
+    channel.publish("progress", {"n": 2})
+    channel.publish("progress", {"n": 3})
+
+    assert [newest.get()["data"]["n"] for _ in range(2)] == [1, 2]
+    # The queued progress event is replaced by the latest one; step_started survives
+    assert [(e["event"], e["data"]["n"]) for e in (coalesce.get(), coalesce.get())] == [
+        ("step_started", 1), ("progress", 3)]
+    print("✅ Drop policies OK")
+
+
+def test_replay_after_last_event_id():
+    """Reconnecting clients resume from Last-Event-ID; late joiners of a finished run get the history"""
+    channel = EventChannel("RUN_REPLAY")
+    for i in range(5):
+        channel.publish("step_completed", {"i": i})
+    resumed = channel.subscribe(last_event_id=3)
+    assert [resumed.get()["id"] for _ in range(2)] == [4, 5]
+
+    channel.publish("run_failed", {"error": "boom"})
+    late = channel.subscribe()
+    assert late.closed and late.stats()["queued"] == 6
+    assert channel.publish("step_started") == {}
+    print("✅ Replay OK")
+
+
+def test_sse_stream_ends_on_terminal_event():
+    channel = EventChannel("RUN_SSE")
+    subscription = channel.subscribe()
+
+    def publish():
+        time.sleep(0.05)
+        channel.publish("step_started", {"step": "scene_1"})
+        channel.publish("run_completed", {"session_id": "WS_1"})
+
+    threading.Thread(target=publish).start()
+    frames = list(sse_stream(subscription, keepalive=1))
+    assert frames[0].startswith("retry:")
+    assert frames[1] == 'id: 1\nevent: step_started\ndata: {"step": "scene_1"}\n\n'
+    assert frames[-1].startswith("id: 2\nevent: run_completed")
+    assert channel.summary()["subscribers"] == []
+    print("✅ SSE stream OK")
+
+
+def test_async_stream():
+    """Async subscribers wake on publishes from another thread"""
+    channel = EventChannel("RUN_ASYNC")
+    subscription = channel.subscribe()
+
+    async def consume():
+        frames = []
+        async for frame in async_sse_stream(subscription, keepalive=0.05):
+            frames.append(frame)
+        return frames
+
+    def publish():
+        time.sleep(0.12)
+        channel.publish("scene_chunk", {"text": "INT."})
+        channel.publish("run_completed")
+
+    threading.Thread(target=publish).start()
+    frames = asyncio.run(consume())
+    assert ": keep-alive\n\n" in frames
+    assert [f for f in frames if f.startswith("id:")] == [
+        format_sse({"id": 1, "event": "scene_chunk", "data": {"text": "INT."}}),
+        format_sse({"id": 2, "event": "run_completed", "data": None})]
+    print("✅ Async stream OK")
+
+
+if __name__ == "__main__":
+    print("🧪 Live Event Stream Test")
+    print("=" * 40)
+    test_bridge_publishes_pipeline_callbacks()
+    test_slow_subscriber_never_blocks_publish()
+    test_drop_newest_and_coalesce()
+    test_replay_after_last_event_id()
+    test_sse_stream_ends_on_terminal_event()
+    test_async_stream()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test brainstorm input fingerprints: what changes them, what does not, and the reuse lookup
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from core_fingerprint import bucket_content_version, input_fingerprint
+from core_migrations import migrate
+
+REUSE_QUERY = '''
+    SELECT prompt_used, response
+    FROM brainstorm_outputs
+    WHERE input_fingerprint = ? AND response != ''
+    ORDER BY timestamp DESC
+    LIMIT 1
+'''
+
+
+def test_bucket_version_tracks_documents_not_queries():
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        with open(os.path.join(bucket_dir, "kv_store_full_docs.json"), "w") as f:
+            f.write('{"doc-1": "When Harry Met Sally"}')
+        version = bucket_content_version(bucket_dir)
+        assert version and bucket_content_version(bucket_dir) == version
+
+        # Queries only touch the LLM response cache
+        with open(os.path.join(bucket_dir, "kv_store_llm_response_cache.json"), "w") as f:
+            f.write('{"q": "cached"}')
+        assert bucket_content_version(bucket_dir) == version
+
+        time.sleep(0.01)
+        with open(os.path.join(bucket_dir, "kv_store_full_docs.json"), "a") as f:
+            f.write(" ")
+        assert bucket_content_version(bucket_dir) != version
+        assert bucket_content_version(os.path.join(bucket_dir, "missing")) == ""
+        print("✅ Bucket content version OK")
+
+
+def test_fingerprint_inputs():
+    base = input_fingerprint("Act 1, Scene 1: Elle", "per_bucket", {"scripts": "v1"})
+    assert base == input_fingerprint("Act 1, Scene 1: Elle", "per_bucket", {"scripts": "v1"})
+    assert base != input_fingerprint("Act 1, Scene 1: Elle, now a chef", "per_bucket", {"scripts": "v1"})
+    assert base != input_fingerprint("Act 1, Scene 1: Elle", "context", {"scripts": "v1"})
+    assert base != input_fingerprint("Act 1, Scene 1: Elle", "per_bucket", {"scripts": "v2"})
+    both = input_fingerprint("p", "context", {"scripts": "v1", "books": "v1"})
+    assert both == input_fingerprint("p", "context", {"books": "v1", "scripts": "v1"})
+
+
+def test_only_edited_scene_misses():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    prompts = {(1, s): f"Scene {s} with Elle and Marcus" for s in range(1, 6)}
+
+    def run(session_id, prompts):
+        misses = 0
+        for (act, scene), prompt in prompts.items():
+            fingerprint = input_fingerprint(prompt, "per_bucket", {"scripts": "v1"})
+            row = conn.execute(REUSE_QUERY, (fingerprint,)).fetchone()
+            if row is None:
+                misses += 1
+                response = f"ideas for {prompt}"
+            else:
+                response = row[1]
+            conn.execute('''INSERT INTO brainstorm_outputs (output_id, session_id, act, scene, bucket, prompt_used,
+                            response, timestamp, input_fingerprint) VALUES (?, ?, ?, ?, 'scripts', ?, ?, ?, ?)''',
+                         (f"{session_id}_{scene}", session_id, act, scene, prompt, response, time.time(), fingerprint))
+        conn.commit()
+        return misses
+
+    assert run("BS_1", prompts) == 5
+    prompts[(1, 3)] = "Scene 3 with Elle, Marcus and Priya"
+    assert run("BS_2", prompts) == 1
+    print("✅ Re-run after editing one scene queries only that scene")
+
+
+if __name__ == "__main__":
+    print("🧪 Input Fingerprint Test")
+    print("=" * 40)
+    test_bucket_version_tracks_documents_not_queries()
+    test_fingerprint_inputs()
+    test_only_edited_scene_misses()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test the background job runner used for bucket processing
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from core_jobs import JobStore, JobRunner
+
+
+def make_files(directory, count, size=100):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"doc_{i}.txt")
+        with open(path, 'w') as f:
+            f.write("x" * size)
+        paths.append(path)
+    return paths
+
+
+def wait_for(runner, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        progress = runner.get_progress(job_id)
+        if progress["status"] in ("completed", "failed", "cancelled"):
+            return progress
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_progress_and_completion():
+    """Submit returns immediately; progress reports per-file state, throughput and ETA"""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_files(tmp, 4)
+        seen = []
+
+        def processor(job, file):
+            time.sleep(0.05)
+            seen.append(file["filename"])
+            if file["filename"] == "doc_2.txt":
+                return {"success": False, "error": "bad document"}
+            return {"success": True}
+
+        runner = JobRunner(JobStore(os.path.join(tmp, "jobs.sqlite")), processor, max_workers=1, poll_interval=0.05)
+        start = time.time()
+        job_id = runner.submit("process_files", "scripts", files)
+        assert time.time() - start < 0.5
+
+        progress = wait_for(runner, job_id)
+        runner.stop()
+
+        print(f"📊 {progress['processed_files']}/{progress['total_files']} processed, "
+              f"{progress['throughput']['files_per_minute']} files/min")
+        assert progress["status"] == "completed"
+        assert progress["processed_files"] == 3 and progress["failed_files"] == 1
+        assert progress["percent"] == 100.0
+        assert progress["eta_seconds"] == 0.0
+        assert progress["throughput"]["files_per_minute"] > 0
+        assert [f["status"] for f in progress["files"]] == ["done", "done", "failed", "done"]
+        assert progress["files"][2]["error"] == "bad document"
+        assert seen == ["doc_0.txt", "doc_1.txt", "doc_2.txt", "doc_3.txt"]
+        print("✅ Job progress OK")
+
+
+def test_cancel_running_job():
+    """Cancelling stops a running job after its current file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_files(tmp, 10)
+        started = threading.Event()
+
+        def processor(job, file):
+            started.set()
+            time.sleep(0.1)
+            return {"success": True}
+
+        runner = JobRunner(JobStore(os.path.join(tmp, "jobs.sqlite")), processor, max_workers=1, poll_interval=0.05)
+        job_id = runner.submit("process_files", "scripts", files)
+        started.wait(5)
+        assert runner.cancel(job_id)["status"] == "cancelling"
+
+        progress = wait_for(runner, job_id)
+        runner.stop()
+        assert progress["status"] == "cancelled"
+        assert progress["processed_files"] < 10
+        assert any(f["status"] == "cancelled" for f in progress["files"])
+        assert runner.cancel("JOB_missing")["success"] is False
+        print("✅ Cancel OK")
+
+
+def test_jobs_survive_restart():
+    """Jobs interrupted mid-run are requeued and only their unfinished files are processed again"""
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_files(tmp, 3)
+        db_path = os.path.join(tmp, "jobs.sqlite")
+
+        # Simulate a crash: first file done, second in progress, process dies
+        store = JobStore(db_path)
+        job_id = store.create_job("process_files", "scripts", files)
+        job = store.claim_next_job()
+        first, second, _ = store.pending_files(job_id)
+        store.mark_file_finished(job_id, first, True, 0.1)
+        store.mark_file_started(job_id, second["position"])
+        store.conn.close()
+
+        processed = []
+
+        def processor(job, file):
+            processed.append(file["filename"])
+            return {"success": True}
+
+        runner = JobRunner(JobStore(db_path), processor, max_workers=1, poll_interval=0.05)
+        runner.start()
+        progress = wait_for(runner, job_id)
+        runner.stop()
+
+        assert progress["status"] == "completed"
+        assert progress["processed_files"] == 3
+        assert processed == ["doc_1.txt", "doc_2.txt"]
+        print("✅ Restart recovery OK")
+
+
+def test_bounded_concurrency():
+    """No more than max_workers jobs run at once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        lock = threading.Lock()
+        state = {"current": 0, "peak": 0}
+
+        def processor(job, file):
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+            time.sleep(0.05)
+            with lock:
+                state["current"] -= 1
+            return {"success": True}
+
+        runner = JobRunner(JobStore(os.path.join(tmp, "jobs.sqlite")), processor, max_workers=2, poll_interval=0.05)
+        job_ids = [runner.submit("process_files", f"bucket_{i}", make_files(tmp, 2)) for i in range(6)]
+        for job_id in job_ids:
+            wait_for(runner, job_id)
+        runner.stop()
+
+        assert state["peak"] == 2
+        assert len(runner.list_jobs(status="completed")) == 6
+        print(f"✅ Bounded concurrency OK (peak {state['peak']})")
+
+
+if __name__ == "__main__":
+    print("🧪 Job Runner Test")
+    print("=" * 40)
+    test_job_progress_and_completion()
+    test_cancel_running_job()
+    test_jobs_survive_restart()
+    test_bounded_concurrency()
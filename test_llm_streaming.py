@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test streaming generation helpers: latency metrics and incremental persistence
+"""
+
+import asyncio
+import time
+
+from util_llm import GenerationStats, TextAccumulator, sse_token_stream, async_sse_token_stream
+
+
+def test_generation_stats():
+    """TTFT is measured to the first chunk; throughput covers the generating phase only"""
+    stats = GenerationStats()
+    assert stats.ttft is None and stats.tokens_per_sec is None
+
+    time.sleep(0.05)
+    for word in ["INT. ", "KITCHEN ", "- ", "NIGHT"]:
+        stats.on_chunk(word)
+        time.sleep(0.01)
+    stats.finish()
+
+    metrics = stats.to_dict()
+    print(f"📊 {metrics}")
+    assert 0.05 <= stats.ttft < stats.total_time
+    assert metrics["tokens"] == 4 and stats.characters == len("INT. KITCHEN - NIGHT")
+    assert stats.tokens_per_sec > 4 / stats.total_time
+
+    # Reported usage wins over the chunk count
+    stats.finish(usage_tokens=6)
+    assert stats.tokens == 6
+    print("✅ Generation stats OK")
+
+
+def test_accumulator_flushes_on_interval():
+    """Partial text is flushed at most once per interval, and a final flush catches the tail"""
+    flushed = []
+    accumulator = TextAccumulator(flushed.append, flush_interval=0.05)
+
+    for i in range(20):
+        accumulator.append(f"line {i}\n")
+        time.sleep(0.01)
+    accumulator.flush()
+    accumulator.flush()
+
+    assert 1 < len(flushed) < 20
+    assert flushed[-1] == accumulator.text == "".join(f"line {i}\n" for i in range(20))
+    assert all(flushed[i + 1].startswith(flushed[i]) for i in range(len(flushed) - 1))
+    print(f"✅ Accumulator OK ({len(flushed)} flushes for 20 chunks)")
+
+
+def fake_upstream(stats, state, tokens=100):
+    """Stands in for stream_chat_sync: records whether it was closed before finishing"""
+    try:
+        for i in range(tokens):
+            stats.on_chunk(f"tok{i} ")
+            yield f"tok{i} "
+        state["finished"] = True
+    finally:
+        stats.finish()
+        state["closed"] = True
+
+
+def test_sse_token_stream_frames_and_completes():
+    stats, state = GenerationStats(), {}
+    frames = list(sse_token_stream(fake_upstream(stats, state, 3), stats, "test chat"))
+
+    assert frames[0] == 'id: 1\nevent: token\ndata: {"text": "tok0 "}\n\n'
+    assert frames[-1].startswith("id: 4\nevent: done\n")
+    assert '"tokens": 3' in frames[-1]
+    assert state == {"finished": True, "closed": True}
+    print("✅ SSE token framing OK")
+
+
+def test_disconnect_closes_upstream():
+    """Closing the response iterator (client disconnect) stops the upstream generation"""
+    stats, state = GenerationStats(), {}
+    stream = sse_token_stream(fake_upstream(stats, state), stats, "test chat")
+    for _ in range(5):
+        next(stream)
+    stream.close()
+
+    assert state == {"closed": True}
+    assert stats.tokens == 5
+
+    async def run_async():
+        async def upstream():
+            try:
+                for i in range(100):
+                    await asyncio.sleep(0)
+                    yield f"tok{i}"
+            finally:
+                state["async_closed"] = True
+
+        stream = async_sse_token_stream(upstream(), GenerationStats(), "test chat")
+        for _ in range(3):
+            await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run_async())
+    assert state["async_closed"]
+    print("✅ Disconnect cancels generation")
+
+
+if __name__ == "__main__":
+    print("🧪 Streaming Generation Test")
+    print("=" * 40)
+    test_generation_stats()
+    test_accumulator_flushes_on_interval()
+    test_sse_token_stream_frames_and_completes()
+    test_disconnect_closes_upstream()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the /metrics registry: Prometheus text format, histogram buckets, collectors and request timing
+"""
+
+import ast
+import asyncio
+import glob
+import os
+import sqlite3
+
+from core_steplog import StepLogger
+from test_async_server import call
+from util_accounting import UsageLedger, record_call, set_ledger
+from util_async import AsyncApp
+from util_metrics import (CACHE_REQUESTS, DB_COMMIT_SECONDS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, LLM_CALLS,
+                          LLM_TOKENS, MetricsRegistry, render_metrics)
+from util_prompt_cache import PromptCache
+from util_ratelimit import configure_limits
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    queries = registry.counter("test_queries_total", "Queries", ("bucket",))
+    queries.inc(bucket="books")
+    queries.inc(2, bucket='say "hi"\n')
+    registry.gauge("test_in_flight", "In flight").set(3)
+    latency = registry.histogram("test_seconds", "Latency", ("mode",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, mode="hybrid")
+    registry.register_collector(lambda: [("test_live", "gauge", "Live", [({"model": "m"}, 1.5)])])
+
+    text = registry.render()
+    print(text)
+    assert "# TYPE test_queries_total counter" in text
+    assert 'test_queries_total{bucket="books"} 1' in text
+    assert 'test_queries_total{bucket="say \\"hi\\"\\n"} 2' in text
+    assert "test_in_flight 3" in text
+    # Buckets are cumulative and end in +Inf == _count
+    assert 'test_seconds_bucket{mode="hybrid",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{mode="hybrid",le="1"} 3' in text
+    assert 'test_seconds_bucket{mode="hybrid",le="+Inf"} 4' in text
+    assert 'test_seconds_count{mode="hybrid"} 4' in text and 'test_seconds_sum{mode="hybrid"} 6.05' in text
+    assert 'test_live{model="m"} 1.5' in text and text.endswith("\n")
+
+    assert registry.counter("test_queries_total", "Queries", ("bucket",)) is queries
+    for bad in (lambda: registry.gauge("test_queries_total", "Queries", ("bucket",)),
+                lambda: queries.inc(-1, bucket="books"),
+                lambda: queries.inc(mode="hybrid")):
+        try:
+            bad()
+            assert False, "must be rejected"
+        except ValueError:
+            pass
+
+
+def test_a_failing_collector_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.counter("test_ok_total", "Still here").inc()
+
+    def broken():
+        raise RuntimeError("limiter gone")
+
+    registry.register_collector(broken)
+    text = registry.render()
+    assert "test_ok_total 1" in text and "# collector broken failed: limiter gone" in text
+
+
+def test_pipeline_hooks_record_into_the_global_registry():
+    set_ledger(UsageLedger(":memory:"))
+    calls = LLM_CALLS.value(kind="llm", model="metrics-model", status="ok")
+    record_call("llm", "metrics-model", 100, 20, 0.5)
+    record_call("llm", "metrics-model", 10, 0, 0.1, error=RuntimeError("boom"))
+    assert LLM_CALLS.value(kind="llm", model="metrics-model", status="ok") == calls + 1
+    assert LLM_CALLS.value(kind="llm", model="metrics-model", status="error") >= 1
+    assert LLM_TOKENS.value(kind="llm", model="metrics-model", type="completion") >= 20
+
+    hits = CACHE_REQUESTS.value(cache="prompt", result="hit")
+    cache = PromptCache()
+    cache.get_or_compile(("p", "t", "h", 1), lambda: "compiled")
+    cache.get_or_compile(("p", "t", "h", 1), lambda: "compiled")
+    assert CACHE_REQUESTS.value(cache="prompt", result="hit") == hits + 1
+
+    commits = DB_COMMIT_SECONDS.count(durability="full")
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE steps (id TEXT)")
+    steps = StepLogger(conn, "full")
+    steps.execute("INSERT INTO steps VALUES (?)", ("1",))
+    steps.flush()
+    assert DB_COMMIT_SECONDS.count(durability="full") == commits + 1
+
+    configure_limits("metrics-model", rpm=600, tpm=100_000)
+    text = render_metrics()
+    assert 'lizzy_llm_rate_rpm{model="metrics-model"} 600' in text
+    assert 'lizzy_llm_calls_total{kind="llm",model="metrics-model",status="error"}' in text
+    assert "# TYPE lizzy_llm_in_flight gauge" in text and "lizzy_process_start_time_seconds" in text
+
+
+def test_async_routes_are_timed_by_rule():
+    asgi_app = AsyncApp()
+
+    @asgi_app.route('/api/buckets/<bucket_name>/query', methods=['POST'])
+    async def query(req, bucket_name):
+        if bucket_name == "broken":
+            raise RuntimeError("bucket failed")
+        return {"bucket": bucket_name}
+
+    async def run():
+        for bucket in ("books", "scripts", "broken"):
+            await call(asgi_app, "POST", f"/api/buckets/{bucket}/query", b"{}")
+
+    labels = {"server": "asgi", "route": "/api/buckets/<bucket_name>/query", "method": "POST"}
+    before = (HTTP_REQUEST_SECONDS.count(**labels), HTTP_REQUESTS.value(status="200", **labels),
+              HTTP_REQUESTS.value(status="500", **labels))
+    asyncio.run(run())
+    after = (HTTP_REQUEST_SECONDS.count(**labels), HTTP_REQUESTS.value(status="200", **labels),
+             HTTP_REQUESTS.value(status="500", **labels))
+    # One series for the rule, not one per bucket name
+    assert [a - b for a, b in zip(after, before)] == [3, 2, 1]
+    print("✅ Async route timed under its rule")
+
+
+def test_every_flask_server_exposes_metrics():
+    """Each module that builds a Flask app instruments it (checked from source; flask is optional here)"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    servers = {}
+    for path in glob.glob(os.path.join(root, "**", "*.py"), recursive=True):
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)]
+        if any(call.func.id == "Flask" for call in calls):
+            servers[os.path.relpath(path, root)] = [call for call in calls if call.func.id == "instrument_flask"]
+    assert len(servers) >= 6, sorted(servers)
+    missing = [name for name, instrumented in servers.items() if not instrumented]
+    assert not missing, f"No /metrics on: {missing}"
+    labels = [call.args[1].value for instrumented in servers.values() for call in instrumented]
+    assert len(labels) == len(set(labels)), labels
+    print(f"✅ /metrics on {len(servers)} servers: {', '.join(sorted(labels))}")
+
+
+if __name__ == "__main__":
+    print("🧪 Metrics Test")
+    print("=" * 40)
+    test_exposition_format()
+    test_a_failing_collector_does_not_break_the_scrape()
+    test_pipeline_hooks_record_into_the_global_registry()
+    test_async_routes_are_timed_by_rule()
+    test_every_flask_server_exposes_metrics()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test project database migrations and keep the pipeline's hot queries index-backed (EXPLAIN QUERY PLAN)
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from core_migrations import LATEST_VERSION, ensure_migrated, migrate, schema_version
+
+# The hot queries as issued by core_write / core_brainstorm
+HOT_QUERIES = {
+    "fetch_brainstorm_insights": ('''
+        SELECT bucket, response
+        FROM brainstorm_outputs
+        WHERE act = ? AND scene = ?
+        ORDER BY timestamp DESC
+    ''', (1, 2)),
+    "get_previous_scene_text (session)": ('''
+        SELECT scene_text
+        FROM final_scenes
+        WHERE session_id = ? AND (act, scene) < (?, ?)
+        ORDER BY act DESC, scene DESC
+        LIMIT 1
+    ''', ("WS_1", 1, 2)),
+    "get_previous_scene_text (any)": ('''
+        SELECT scene_text
+        FROM final_scenes
+        WHERE (act, scene) < (?, ?)
+        ORDER BY act DESC, scene DESC
+        LIMIT 1
+    ''', (1, 2)),
+    "write get_session_summary steps": ('''
+        SELECT step_type, COUNT(*)
+        FROM write_steps
+        WHERE session_id = ?
+        GROUP BY step_type
+    ''', ("WS_1",)),
+    "brainstorm get_session_summary steps": ('''
+        SELECT step_type, COUNT(*)
+        FROM brainstorm_steps
+        WHERE session_id = ?
+        GROUP BY step_type
+    ''', ("BS_1",)),
+    "reusable brainstorm output": ('''
+        SELECT bucket, response, prompt_used
+        FROM brainstorm_outputs
+        WHERE input_fingerprint = ? AND response != ''
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ''', ("abc",)),
+    "export_screenplay": ('''
+        SELECT act, scene, scene_text, word_count
+        FROM final_scenes
+        WHERE session_id = ?
+        ORDER BY act, scene
+    ''', ("WS_1",)),
+}
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def test_fresh_and_legacy_databases_migrate():
+    conn = sqlite3.connect(":memory:")
+    assert migrate(conn) == [1, 2, 3, 4] and schema_version(conn) == LATEST_VERSION
+    assert migrate(conn) == []
+
+    # A project whose tables predate the streaming metrics columns
+    legacy = sqlite3.connect(":memory:")
+    legacy.execute("""CREATE TABLE scene_generations (generation_id TEXT PRIMARY KEY, session_id TEXT, act INTEGER,
+                      scene INTEGER, context_used TEXT, prompt_used TEXT, generated_text TEXT, word_count INTEGER,
+                      timestamp TIMESTAMP, success BOOLEAN)""")
+    legacy.execute("INSERT INTO scene_generations (generation_id, generated_text) VALUES ('g1', 'INT. CAFE')")
+    legacy.commit()
+    migrate(legacy)
+    columns = {row[1] for row in legacy.execute("PRAGMA table_info(scene_generations)")}
+    assert {"status", "ttft_seconds", "completion_tokens"} <= columns
+    assert legacy.execute("SELECT generated_text FROM scene_generations").fetchone()[0] == "INT. CAFE"
+    print(f"✅ Migrated to schema v{LATEST_VERSION}")
+
+
+def test_hot_queries_use_indexes():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = query_plan(conn, sql, params)
+        print(f"📊 {name}: {' | '.join(plan)}")
+        assert any("USING INDEX" in step or "USING COVERING INDEX" in step for step in plan), name
+        assert not any(step.startswith("SCAN") and "INDEX" not in step for step in plan), name
+        assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan), name
+
+
+def test_ensure_migrated_runs_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "demo.sqlite")
+        sqlite3.connect(db_path).close()
+        assert ensure_migrated(db_path) == [1, 2, 3, 4]
+        assert ensure_migrated(db_path) == []
+        assert ensure_migrated(os.path.join(tmp, "missing.sqlite")) == []
+
+
+if __name__ == "__main__":
+    print("🧪 Migrations Test")
+    print("=" * 40)
+    test_fresh_and_legacy_databases_migrate()
+    test_hot_queries_use_indexes()
+    test_ensure_migrated_runs_once()
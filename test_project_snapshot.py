@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the per-session project snapshot: lookups, immutability, explicit refresh and scaling
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from core_snapshot import load_project_snapshot, normalize_name
+
+
+def make_project(conn, characters=3, scenes=4):
+    conn.execute("""CREATE TABLE characters (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, gender TEXT,
+                    age TEXT, romantic_challenge TEXT, lovable_trait TEXT, comedic_flaw TEXT)""")
+    conn.execute("""CREATE TABLE story_outline (id INTEGER PRIMARY KEY AUTOINCREMENT, act INTEGER NOT NULL,
+                    scene INTEGER NOT NULL, key_characters TEXT, key_events TEXT)""")
+    conn.execute("CREATE TABLE project_info (key TEXT PRIMARY KEY, value TEXT)")
+    names = ["Elle", "Marcus", "Priya"] + [f"Extra {i}" for i in range(characters - 3)]
+    conn.executemany("INSERT INTO characters (name, gender, age, romantic_challenge, lovable_trait, comedic_flaw) "
+                     "VALUES (?, 'F', '30', 'trust', 'warm', 'clumsy')", [(n,) for n in names[:characters]])
+    conn.executemany("INSERT INTO story_outline (act, scene, key_characters, key_events) VALUES (?, ?, ?, ?)",
+                     [(1 + i // 2, 1 + i % 2, " marcus , Elle" if i == 0 else ", ".join(names[:4]), f"Event {i}")
+                      for i in range(scenes)])
+    conn.execute("INSERT INTO project_info VALUES ('description', 'Rival baristas fall for each other')")
+    conn.commit()
+
+
+def test_lookups_match_outline():
+    conn = sqlite3.connect(":memory:")
+    make_project(conn)
+    snapshot = load_project_snapshot(conn)
+
+    assert snapshot.scenes() == [(1, 1), (1, 2), (2, 1), (2, 2)]
+    first = snapshot.scene(1, 1)
+    # Matching is whitespace- and case-insensitive; rows keep characters-table order
+    assert [c["name"] for c in snapshot.scene_characters(first)] == ["Elle", "Marcus"]
+    assert snapshot.previous_scene(1, 2).key_events == "Event 0" and snapshot.previous_scene(1, 1) is None
+    assert snapshot.logline == "Rival baristas fall for each other"
+    assert snapshot.character("  PRIYA ")["name"] == "Priya"
+    assert normalize_name(" Mary  Jane ") == "mary jane"
+
+    try:
+        snapshot.scene(9, 9)
+        raise AssertionError("expected ValueError")
+    except ValueError as e:
+        assert "Act 9, Scene 9" in str(e)
+
+    try:
+        snapshot.characters[0]["name"] = "Changed"
+        raise AssertionError("snapshot rows should be read-only")
+    except TypeError:
+        pass
+    # Callers get their own copies
+    snapshot.scene_characters(first)[0]["name"] = "Changed"
+    assert snapshot.scene_characters(first)[0]["name"] == "Elle"
+    print("✅ Snapshot lookups OK")
+
+
+def test_refresh_is_explicit_and_tables_optional():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "demo.sqlite"))
+        assert load_project_snapshot(conn).scenes() == []
+        assert load_project_snapshot(conn).logline == "A romantic comedy about unexpected love"
+
+        make_project(conn)
+        snapshot = load_project_snapshot(conn)
+        conn.execute("UPDATE characters SET lovable_trait = 'generous' WHERE name = 'Elle'")
+        conn.commit()
+        assert snapshot.character("Elle")["lovable_trait"] == "warm"
+        assert load_project_snapshot(conn).character("Elle")["lovable_trait"] == "generous"
+        conn.close()
+        print("✅ Explicit refresh OK")
+
+
+def test_large_project_assembly():
+    conn = sqlite3.connect(":memory:")
+    make_project(conn, characters=2000, scenes=400)
+
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    legacy = []
+    for act, scene in cursor.execute("SELECT act, scene FROM story_outline ORDER BY act, scene").fetchall():
+        key_characters = cursor.execute("SELECT key_characters FROM story_outline WHERE act = ? AND scene = ?",
+                                        (act, scene)).fetchone()[0]
+        scene_chars = key_characters.split(',')
+        rows = cursor.execute("SELECT name, gender, age, romantic_challenge, lovable_trait, comedic_flaw "
+                              "FROM characters").fetchall()
+        legacy.append([r[0] for r in rows if any(r[0].strip() == sc.strip() for sc in scene_chars)])
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = load_project_snapshot(conn)
+    assembled = [[c["name"] for c in snapshot.scene_characters(snapshot.scene(act, scene))]
+                 for act, scene in snapshot.scenes()]
+    snapshot_time = time.perf_counter() - start
+
+    assert assembled[1:] == legacy[1:]
+    print(f"📊 400 scenes x 2000 characters: per-scene queries {legacy_time * 1000:.0f} ms, "
+          f"snapshot {snapshot_time * 1000:.0f} ms")
+    assert snapshot_time < legacy_time
+
+
+if __name__ == "__main__":
+    print("🧪 Project Snapshot Test")
+    print("=" * 40)
+    test_lookups_match_outline()
+    test_refresh_is_explicit_and_tables_optional()
+    test_large_project_assembly()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test the compiled-prompt cache: hits across chat turns, invalidation on data and template changes
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from util_prompt_cache import PromptCache, DataVersionTracker
+
+
+def make_project_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE characters (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO characters (name) VALUES (?)", [("Elle",), ("Marcus",)])
+    conn.commit()
+    conn.close()
+
+
+def test_data_version_tracks_other_connections():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "demo.sqlite")
+        make_project_db(db_path)
+        tracker = DataVersionTracker()
+
+        before = tracker.version(db_path)
+        assert tracker.version(db_path) == before
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE characters SET name = 'Ella' WHERE id = 1")
+        conn.commit()
+        conn.close()
+
+        assert tracker.version(db_path) != before
+        assert tracker.version(os.path.join(tmp, "missing.sqlite")) is None
+        tracker.close()
+        print("✅ Data version OK")
+
+
+def test_cache_hits_until_template_or_data_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "demo.sqlite")
+        make_project_db(db_path)
+        cache = PromptCache()
+        compiles = []
+
+        def compile_fn(template):
+            def run():
+                time.sleep(0.01)  # stands in for the SELECT * and regex passes
+                compiles.append(template)
+                return template.replace("{sql.characters}", "Elle, Marcus")
+            return run
+
+        template = "You know these characters: {sql.characters}"
+        for turn in range(10):
+            compiled, cached = cache.get_or_compile(cache.key("demo", db_path, 7, template), compile_fn(template))
+            assert cached == (turn > 0)
+        assert compiled == "You know these characters: Elle, Marcus"
+        assert len(compiles) == 1
+
+        # Editing the template changes the hash
+        edited = template + "\nStay in voice."
+        cache.get_or_compile(cache.key("demo", db_path, 7, edited), compile_fn(edited))
+        assert len(compiles) == 2
+        assert cache.stats()["entries"] == 1
+
+        # Writing to the project database bumps the data version
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO characters (name) VALUES ('Priya')")
+        conn.commit()
+        conn.close()
+        _, cached = cache.get_or_compile(cache.key("demo", db_path, 7, edited), compile_fn(edited))
+        assert not cached and len(compiles) == 3
+
+        cache.invalidate("demo")
+        assert cache.stats()["entries"] == 0
+        print(f"✅ Prompt cache OK: {cache.stats()}")
+        cache.tracker.close()
+
+
+def test_lru_bound():
+    cache = PromptCache(max_entries=3)
+    for i in range(5):
+        cache.get_or_compile(("demo", "preview", None, f"hash{i}", None), lambda: i)
+    assert cache.stats()["entries"] == 3
+    _, cached = cache.get_or_compile(("demo", "preview", None, "hash4", None), lambda: -1)
+    assert cached
+
+
+if __name__ == "__main__":
+    print("🧪 Prompt Cache Test")
+    print("=" * 40)
+    test_data_version_tracks_other_connections()
+    test_cache_hits_until_template_or_data_changes()
+    test_lru_bound()
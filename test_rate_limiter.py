@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the per-model rate limiter: RPM/TPM pacing, Retry-After handling and the call wrappers
+"""
+
+import asyncio
+import dataclasses
+import time
+
+from util_ratelimit import (ModelLimiter, TokenBucket, call_with_limit, call_with_limit_sync, configure_limits,
+                            get_limiter, is_rate_limit_error, limit_embedding, limit_llm, parse_limits, retry_after)
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.status_code = 429
+        self.headers = headers
+
+
+class RateLimitError(Exception):
+    """Shaped like openai.RateLimitError"""
+
+    def __init__(self, message, headers=None):
+        super().__init__(message)
+        self.status_code = 429
+        self.response = FakeResponse(headers or {})
+
+
+def test_bucket_paces_after_burst():
+    bucket = TokenBucket(per_minute=600)  # 10 per second, burst of 600
+    now = bucket.updated
+    assert bucket.reserve(600, now) == 0.0
+    assert abs(bucket.reserve(5, now) - 0.5) < 1e-9
+    # Half a second later those 5 have refilled; the next call waits for its own share
+    assert abs(bucket.reserve(5, now + 0.5) - 0.5) < 1e-9
+
+
+def test_tpm_and_rpm_both_gate():
+    limiter = ModelLimiter("test-tpm", rpm=6000, tpm=600)
+    assert limiter.reserve(600) == 0.0
+    delay = limiter.reserve(60)
+    assert 5.5 < delay <= 6.0, delay
+    limiter = ModelLimiter("test-rpm", rpm=60, tpm=1_000_000)
+    for _ in range(60):
+        limiter.reserve(1)
+    assert 0.9 < limiter.reserve(1) <= 1.0
+    assert limiter.stats()["waited"] == 1
+
+
+def test_retry_after_parsing():
+    assert retry_after(RateLimitError("slow down", {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(RateLimitError("slow down", {"retry-after": "3"})) == 3.0
+    assert retry_after(RateLimitError("Rate limit reached. Please try again in 1.5s.")) == 1.5
+    assert retry_after(RateLimitError("Please try again in 120ms")) == 0.12
+    assert retry_after(RateLimitError("no hint")) is None
+    assert is_rate_limit_error(RateLimitError("slow down"))
+    assert not is_rate_limit_error(RateLimitError("insufficient_quota"))
+    assert not is_rate_limit_error(ValueError("bad request"))
+    assert parse_limits("gpt-4o-mini=5000:2000000, bad, text-embedding-3-small=10000:5000000") == {
+        "gpt-4o-mini": (5000.0, 2000000.0), "text-embedding-3-small": (10000.0, 5000000.0)}
+
+
+def test_429_pauses_slows_and_retries():
+    limiter = configure_limits("test-429", rpm=6000, tpm=1_000_000)
+    attempts = []
+
+    async def flaky(prompt):
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise RateLimitError("slow down", {"retry-after-ms": "100"})
+        return f"ok: {prompt}"
+
+    assert asyncio.run(call_with_limit("test-429", 10, flaky, "hi")) == "ok: hi"
+    stats = limiter.stats()
+    assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.09
+    assert stats["rate_limited"] == 1 and stats["rpm"] < 6000
+    print(f"✅ 429 honoured Retry-After ({(attempts[1] - attempts[0]) * 1000:.0f} ms), rate now {stats['rpm']} RPM")
+
+    async def always_limited(prompt):
+        raise RateLimitError("insufficient_quota")
+
+    try:
+        asyncio.run(call_with_limit("test-429", 10, always_limited, "hi"))
+        assert False, "quota errors must not be retried"
+    except RateLimitError:
+        pass
+
+
+@dataclasses.dataclass
+class EmbeddingFunc:
+    """Stand-in for lightrag.utils.EmbeddingFunc"""
+    embedding_dim: int
+    max_token_size: int
+    func: callable
+
+
+def test_wrappers_share_the_process_limiter():
+    configure_limits("test-llm", rpm=6000, tpm=1_000_000)
+    configure_limits("test-embed", rpm=6000, tpm=1_000_000)
+
+    async def complete(prompt, system_prompt=None, history_messages=None, **kwargs):
+        return prompt.upper()
+
+    async def embed(texts):
+        return [[len(t)] for t in texts]
+
+    llm = limit_llm(complete, model="test-llm")
+    assert limit_llm(llm, model="test-llm") is llm
+    embedding = limit_embedding(EmbeddingFunc(1536, 8192, embed), model="test-embed")
+    assert embedding.embedding_dim == 1536 and embedding.func.rate_limited
+
+    async def run():
+        return await llm("scene", system_prompt="be funny", max_tokens=50), await embedding.func(["ab", "cde"])
+
+    assert asyncio.run(run()) == ("SCENE", [[2], [3]])
+    assert get_limiter("test-llm").stats()["calls"] == 1 and get_limiter("test-embed").stats()["calls"] == 1
+
+    # OpenAI's create() takes model= too; it must reach func rather than clash with the limiter's own argument
+    async def create(**kwargs):
+        return kwargs["model"]
+
+    assert asyncio.run(call_with_limit("test-llm", 10, create, model="test-llm")) == "test-llm"
+    assert call_with_limit_sync("test-llm", 10, lambda **kwargs: kwargs["model"], model="test-llm") == "test-llm"
+    print("✅ LLM and embedding wrappers OK")
+
+
+def test_concurrent_callers_are_spread_over_the_minute():
+    configure_limits("test-spread", rpm=1200, tpm=1_000_000)  # 20 per second after a burst of 1200
+    limiter = get_limiter("test-spread")
+    for _ in range(1200):
+        limiter.reserve(1)
+
+    async def call(i):
+        await limiter.acquire(1)
+        return time.perf_counter()
+
+    async def run():
+        return await asyncio.gather(*(call(i) for i in range(10)))
+
+    start = time.perf_counter()
+    finished = asyncio.run(run())
+    elapsed = max(finished) - start
+    print(f"📊 10 calls over an exhausted 1200 RPM bucket took {elapsed * 1000:.0f} ms")
+    assert 0.45 < elapsed < 0.8
+
+
+if __name__ == "__main__":
+    print("🧪 Rate Limiter Test")
+    print("=" * 40)
+    test_bucket_paces_after_burst()
+    test_tpm_and_rpm_both_gate()
+    test_retry_after_parsing()
+    test_429_pauses_slows_and_retries()
+    test_wrappers_share_the_process_limiter()
+    test_concurrent_callers_are_spread_over_the_minute()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test circuit breakers, latency percentiles and hedged calls used for bucket queries
+"""
+
+import asyncio
+import time
+
+from util_resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LatencyWindow, hedged
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("books", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure("timeout")
+    assert breaker.state == CLOSED
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN and not breaker.allow()
+    assert breaker.stats()["rejected"] == 1 and breaker.retry_in() > 0
+
+    time.sleep(0.06)
+    # Only one probe gets through while half open
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    stats = breaker.stats()
+    assert stats["state"] == CLOSED and stats["consecutive_failures"] == 0
+    assert stats["failures"] == 4 and stats["successes"] == 1 and stats["last_error"] == "still down"
+    print(f"✅ Breaker cycle OK: {stats}")
+
+
+def test_cancelled_calls_are_not_failures():
+    breaker = CircuitBreaker("books", failure_threshold=3, reset_timeout=0.05)
+    # Callers cancelling at their retrieval budget must not open the breaker on a healthy, slow bucket
+    for _ in range(5):
+        assert breaker.allow()
+        breaker.record_cancelled()
+    assert breaker.state == CLOSED and breaker.stats()["failures"] == 0
+
+    for _ in range(3):
+        breaker.record_failure("down")
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # A cancelled probe gives no verdict but frees the slot for the next caller
+    breaker.record_cancelled()
+    assert breaker.state == HALF_OPEN and breaker.allow()
+
+
+def test_latency_percentiles():
+    window = LatencyWindow(size=100)
+    assert window.percentile(95) is None
+    for ms in range(1, 201):
+        window.record(ms / 1000.0)
+    # Only the last 100 samples count
+    assert len(window) == 100
+    assert window.percentile(50) == 0.15 and window.percentile(95) == 0.195
+    assert window.percentile(100) == 0.2
+
+
+def test_hedge_returns_faster_copy_and_cancels_loser():
+    calls = []
+    cancelled = []
+
+    async def query():
+        # The first call is stuck behind a slow replica, the hedge is fast
+        delay = 1.0 if not calls else 0.01
+        calls.append(delay)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return f"answer after {delay}s"
+
+    start = time.perf_counter()
+    result, was_hedged = asyncio.run(hedged(query, hedge_after=0.05))
+    elapsed = time.perf_counter() - start
+    assert was_hedged and result == "answer after 0.01s"
+    assert cancelled == [1.0] and elapsed < 0.5
+    print(f"✅ Hedged query answered in {elapsed * 1000:.0f} ms")
+
+
+def test_fast_or_unhedged_calls_run_once():
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    assert asyncio.run(hedged(query, hedge_after=0.5)) == ("ok", False)
+    assert asyncio.run(hedged(query, hedge_after=None)) == ("ok", False)
+    assert len(calls) == 2
+
+
+def test_hedge_survives_one_failure_and_raises_when_both_fail():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("replica down")
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert asyncio.run(hedged(flaky, hedge_after=0.01)) == ("ok", True)
+
+    async def broken():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("bucket corrupt")
+
+    try:
+        asyncio.run(hedged(broken, hedge_after=0.01))
+        assert False, "both copies failed"
+    except RuntimeError as e:
+        assert "corrupt" in str(e)
+
+
+def test_timeout_cancels_both_copies():
+    cancelled = []
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        await asyncio.wait_for(hedged(hang, hedge_after=0.01), 0.05)
+
+    try:
+        asyncio.run(run())
+        assert False, "should time out"
+    except asyncio.TimeoutError:
+        pass
+    assert len(cancelled) == 2
+
+
+if __name__ == "__main__":
+    print("🧪 Resilience Test")
+    print("=" * 40)
+    test_breaker_opens_probes_and_closes()
+    test_cancelled_calls_are_not_failures()
+    test_latency_percentiles()
+    test_hedge_returns_faster_copy_and_cancels_loser()
+    test_fast_or_unhedged_calls_run_once()
+    test_hedge_survives_one_failure_and_raises_when_both_fail()
+    test_timeout_cancels_both_copies()
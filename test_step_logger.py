@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the buffered step logger: ordering, flush-on-exception, bad-row recovery and commit reduction
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from core_steplog import StepLogger
+
+STEP_INSERT = '''INSERT INTO write_steps (step_id, session_id, step_type, timestamp, act, scene, content, metadata)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+GENERATION_INSERT = "INSERT INTO scene_generations (generation_id, generated_text, status) VALUES (?, ?, ?)"
+GENERATION_UPDATE = "UPDATE scene_generations SET generated_text = ?, status = ? WHERE generation_id = ?"
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE IF NOT EXISTS write_steps (step_id TEXT PRIMARY KEY, session_id TEXT, step_type TEXT,
+                    timestamp TIMESTAMP, act INTEGER, scene INTEGER, content TEXT, metadata TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS scene_generations (generation_id TEXT PRIMARY KEY,
+                    generated_text TEXT, status TEXT)''')
+    conn.commit()
+    commits = []
+    conn.set_trace_callback(lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None)
+    return conn, commits
+
+
+def step_row(scene, i):
+    return (f"step_{scene}_{i}", "WS_TEST", "bucket_query", "2026-01-01 10:00:00", 1, scene,
+            "content " * 50, json.dumps({"i": i}))
+
+
+def write_scene(log_write, scene, steps=10):
+    """The write pipeline's per-scene write pattern: steps, a generation row, its update, more steps"""
+    for i in range(steps // 2):
+        log_write(STEP_INSERT, step_row(scene, i))
+    log_write(GENERATION_INSERT, (f"gen_{scene}", "", "streaming"))
+    log_write(GENERATION_UPDATE, ("INT. CAFE - DAY", "completed", f"gen_{scene}"))
+    for i in range(steps // 2, steps):
+        log_write(STEP_INSERT, step_row(scene, i))
+
+
+def test_order_and_flush_on_exception():
+    conn, commits = connect(":memory:")
+    steps = StepLogger(conn, durability="scene", flush_interval_ms=60000)
+
+    try:
+        with steps.scene():
+            write_scene(steps.execute, scene=1)
+            assert conn.execute("SELECT COUNT(*) FROM write_steps").fetchone()[0] == 0
+            raise RuntimeError("generation failed")
+    except RuntimeError:
+        pass
+
+    # The update ran after the insert it depends on, and nothing was lost to the exception
+    assert conn.execute("SELECT status FROM scene_generations").fetchone()[0] == "completed"
+    assert conn.execute("SELECT COUNT(*) FROM write_steps").fetchone()[0] == 10
+    assert len(commits) == 1 and steps.stats()["batches"] == 4
+    print(f"✅ One commit for the scene, flushed on exception: {steps.stats()}")
+
+
+def test_duplicate_row_does_not_drop_scene():
+    conn, _ = connect(":memory:")
+    steps = StepLogger(conn, durability="scene")
+    with steps.scene():
+        steps.execute(STEP_INSERT, step_row(1, 0))
+        steps.execute(STEP_INSERT, step_row(1, 0))
+        steps.execute(STEP_INSERT, step_row(1, 1))
+    assert conn.execute("SELECT COUNT(*) FROM write_steps").fetchone()[0] == 2
+    assert steps.stats()["failed"] == 1
+
+
+def test_interval_and_full_durability():
+    conn, commits = connect(":memory:")
+    steps = StepLogger(conn, durability="scene", flush_interval_ms=50)
+    steps.execute(STEP_INSERT, step_row(1, 0))
+    time.sleep(0.06)
+    steps.execute(STEP_INSERT, step_row(1, 1))
+    assert len(commits) == 1 and not steps.pending
+
+    conn, commits = connect(":memory:")
+    steps = StepLogger(conn, durability="full")
+    write_scene(steps.execute, scene=1)
+    assert len(commits) == 12
+
+
+def test_benchmark_commits_per_scene():
+    """20 scenes of 12 writes each against a file database"""
+    scenes = 20
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, commits = connect(os.path.join(tmp, "legacy.sqlite"))
+
+        def legacy_write(sql, params):
+            conn.execute(sql, params)
+            conn.commit()
+
+        start = time.perf_counter()
+        for scene in range(scenes):
+            write_scene(legacy_write, scene)
+        legacy_time = time.perf_counter() - start
+        legacy_commits = len(commits)
+        conn.close()
+
+        conn, commits = connect(os.path.join(tmp, "buffered.sqlite"))
+        steps = StepLogger(conn, durability="scene")
+        start = time.perf_counter()
+        for scene in range(scenes):
+            with steps.scene():
+                write_scene(steps.execute, scene)
+        buffered_time = time.perf_counter() - start
+        assert conn.execute("SELECT COUNT(*) FROM write_steps").fetchone()[0] == scenes * 10
+        conn.close()
+
+    print(f"📊 {scenes} scenes: commit per step {legacy_commits} commits, "
+          f"{legacy_time / scenes * 1000:.2f} ms/scene")
+    print(f"   buffered: {len(commits)} commits, {buffered_time / scenes * 1000:.2f} ms/scene")
+    assert legacy_commits == scenes * 12 and len(commits) == scenes
+
+
+if __name__ == "__main__":
+    print("🧪 Step Logger Test")
+    print("=" * 40)
+    test_order_and_flush_on_exception()
+    test_duplicate_row_does_not_drop_scene()
+    test_interval_and_full_durability()
+    test_benchmark_commits_per_scene()
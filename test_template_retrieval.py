@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test concurrent LightRAG placeholder retrieval: parallelism, parameter mapping and the latency budget
+"""
+
+import asyncio
+import time
+
+from core_retrieval import TemplateRetriever, focus_to_top_k, render_retrievals, retrieval_summary
+
+TEMPLATE = (
+    'Characters: {sql.characters}\n'
+    '{lightrag.scripts|guidance:"meet-cute setups"|mode:"local"|focus:8}\n'
+    '{lightrag.books|guidance:"three-act pacing"|mode:"global"|focus:3}\n'
+    '{lightrag.plays}\n'
+    'Again: {lightrag.scripts|guidance:"meet-cute setups"|mode:"local"|focus:8}\n'
+)
+
+
+class FakeBuckets:
+    """Async bucket query with per-bucket latency, recording the parameters it was called with"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.cancelled = []
+
+    async def query(self, bucket, query, mode="hybrid", only_need_context=False, top_k=None):
+        self.calls.append({"bucket": bucket, "query": query, "mode": mode,
+                           "only_need_context": only_need_context, "top_k": top_k})
+        try:
+            await asyncio.sleep(self.delays.get(bucket, 0.1))
+        except asyncio.CancelledError:
+            self.cancelled.append(bucket)
+            raise
+        if bucket == "plays":
+            return {"error": "Bucket not found: plays"}
+        return {"bucket": bucket, "response": f"{bucket} context for: {query.splitlines()[0]}"}
+
+
+def test_concurrent_retrieval_and_parameters():
+    buckets = FakeBuckets({"scripts": 0.2, "books": 0.2, "plays": 0.2})
+    retriever = TemplateRetriever(buckets.query, budget_seconds=2)
+
+    start = time.perf_counter()
+    results = asyncio.run(retriever.retrieve(TEMPLATE, "Elle spills coffee on Marcus"))
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 3 bucket queries of 0.2s each resolved in {elapsed:.2f}s")
+    assert elapsed < 0.4
+    # The repeated scripts placeholder is queried once
+    assert len(buckets.calls) == 3
+    scripts = next(c for c in buckets.calls if c["bucket"] == "scripts")
+    assert scripts["mode"] == "local" and scripts["top_k"] == focus_to_top_k(8) == 80
+    assert scripts["only_need_context"] is True
+    assert "Elle spills coffee" in scripts["query"] and scripts["query"].startswith("meet-cute setups")
+    plays = next(c for c in buckets.calls if c["bucket"] == "plays")
+    assert plays["mode"] == "hybrid" and plays["top_k"] == 50
+
+    compiled = render_retrievals(TEMPLATE, results)
+    assert "{sql.characters}" in compiled and "{lightrag." not in compiled
+    assert compiled.count("=== SCRIPTS KNOWLEDGE (local, focus 8/10) ===\nscripts context") == 2
+    assert "[No context: Bucket not found: plays]" in compiled
+    print("✅ Concurrent retrieval OK")
+
+
+def test_budget_returns_partial_results():
+    buckets = FakeBuckets({"scripts": 0.05, "books": 5, "plays": 0.05})
+    retriever = TemplateRetriever(buckets.query, budget_seconds=0.3)
+
+    start = time.perf_counter()
+    results = asyncio.run(retriever.retrieve(TEMPLATE))
+    elapsed = time.perf_counter() - start
+
+    summary = {r["bucket"]: r for r in retrieval_summary(results)}
+    assert elapsed < 0.6
+    assert summary["scripts"]["success"] and summary["books"]["timed_out"]
+    assert buckets.cancelled == ["books"]
+    assert "retrieval exceeded the 0.3s budget" in render_retrievals(TEMPLATE, results)
+    print(f"✅ Budget enforced after {elapsed:.2f}s with partial results")
+
+
+def test_focus_mapping_is_clamped():
+    assert focus_to_top_k(1) == 10 and focus_to_top_k(10) == 100
+    assert focus_to_top_k(42) == 100 and focus_to_top_k("x") == 50
+    assert asyncio.run(TemplateRetriever(FakeBuckets({}).query).retrieve("No placeholders here")) == {}
+
+
+if __name__ == "__main__":
+    print("🧪 Template Retrieval Test")
+    print("=" * 40)
+    test_concurrent_retrieval_and_parameters()
+    test_budget_returns_partial_results()
+    test_focus_mapping_is_clamped()
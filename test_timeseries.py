@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test time-series rollups: sketch accuracy and merging, incremental minute/hour/day rollups and persistence
+"""
+
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from util_timeseries import QuantileSketch, Rollup, TimeSeriesStore, get_timeseries, interval_start
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def test_sketch_is_accurate_and_mergeable():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1.5) for _ in range(20000)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        exact = exact_quantile(values, q)
+        assert abs(whole.quantile(q) - exact) <= 0.011 * exact, (q, whole.quantile(q), exact)
+        # Merging halves gives exactly the sketch of the whole
+        assert left.quantile(q) == whole.quantile(q)
+    restored = QuantileSketch.from_json(whole.to_json())
+    assert restored.quantile(0.95) == whole.quantile(0.95) and restored.count == 20000
+    assert len(whole.bins) < 1000
+    print(f"✅ p95 {whole.quantile(0.95):.3f} vs exact {exact_quantile(values, 0.95):.3f} in {len(whole.bins)} bins")
+
+    empty = Rollup().to_dict()
+    assert empty["count"] == 0 and empty["p95"] == 0.0
+
+
+def test_rollups_per_resolution_bucket_and_mode():
+    store = TimeSeriesStore(":memory:")
+    # Yesterday mid-morning, so the minute rows are still inside their two-day retention
+    yesterday = datetime.now().replace(hour=10, minute=15, second=0, microsecond=0) - timedelta(days=1)
+    day = yesterday.timestamp()
+    for i in range(10):
+        store.record("query", "books", 1.0 + i, "hybrid", day + i * 30)
+    store.record("query", "books", 0.5, "naive", day + 3600)
+    store.record("query", "scripts", 4.0, "hybrid", day + 86400)
+
+    minutes = store.query("query", "minute", bucket="books", mode="hybrid")
+    assert [m["count"] for m in minutes] == [2, 2, 2, 2, 2]
+    hours = store.query("query", "hour", bucket="books")
+    assert [h["count"] for h in hours] == [10, 1]
+    books = store.total("query", bucket="books")
+    assert (books["count"], books["min"], books["max"], books["sum"]) == (11, 0.5, 10.0, 55.5)
+    # Nearest rank: a small sample's p99 is its slowest query, within the sketch's 1%
+    assert abs(books["p99"] - 10.0) <= 0.1
+
+    days = store.query("query", "day")
+    assert [d["count"] for d in days] == [11, 1]
+    assert days[0]["start"] == interval_start(day, "day")
+    assert datetime.fromtimestamp(days[1]["start"]).date() == yesterday.date() + timedelta(days=1)
+    modes = {row["mode"]: row["count"] for row in store.query("query", "day", by=("mode",))}
+    assert modes == {"hybrid": 11, "naive": 1}
+    by_bucket = store.query("query", "day", since=day + 86400, by=("bucket",))
+    assert by_bucket == [{"bucket": "scripts", **store.total("query", bucket="scripts")}]
+
+    try:
+        store.query("query", "week")
+        assert False, "unknown resolution must be rejected"
+    except ValueError:
+        pass
+
+
+def test_history_survives_restarts_and_minutes_age_out():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "_statistics", "timeseries.db")
+        now = time.time()
+        store = TimeSeriesStore(path)
+        assert store.is_empty()
+        # Older than the old 1000-record cap and the minute retention
+        assert store.backfill("query", [(now - 40 * 86400 + i, "books", "local", 2.0) for i in range(1500)]) == 1500
+        store.record("query", "books", 3.0, "hybrid", now)
+        store.close()
+
+        # A second process (or a restart) merges into the same rows instead of overwriting them
+        reopened = TimeSeriesStore(path)
+        reopened.record("query", "books", 5.0, "hybrid", now)
+        assert reopened.total("query", bucket="books")["count"] == 1502
+        assert reopened.total("query", "day", since=now - 30 * 86400)["count"] == 2
+        assert reopened.total("query", "minute")["count"] == 2
+        assert reopened.total("query", "hour")["count"] == 1502
+        today = reopened.query("query", "day", since=now, mode="hybrid")[0]
+        assert (today["count"], today["max"]) == (2, 5.0)
+        reopened.close()
+
+
+def test_trend_queries_read_rollups_not_events():
+    store = TimeSeriesStore(":memory:")
+    now = time.time()
+    rng = random.Random(3)
+    for i in range(50000):
+        store.record("query", f"bucket_{i % 5}", rng.uniform(0.1, 3.0), ("hybrid", "local")[i % 2],
+                     now - rng.uniform(0, 365 * 86400))
+    started = time.perf_counter()
+    year = store.query("query", "day", since=now - 365 * 86400, bucket="bucket_0")
+    elapsed = time.perf_counter() - started
+    print(f"📈 365-day trend over 50,000 queries: {len(year)} daily points in {elapsed * 1000:.1f} ms")
+    assert sum(day["count"] for day in year) == 10000 and len(year) <= 366
+    assert store.conn.execute("SELECT COUNT(*) FROM rollups WHERE resolution = 'day'").fetchone()[0] <= 5 * 2 * 366
+
+
+def test_one_store_per_database_per_process():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "_statistics", "timeseries.db")
+        seeded = []
+        first = get_timeseries(path, seed=seeded.append)
+        # A second manager over the same directory shares the connection and is not seeded again
+        second = get_timeseries(os.path.join(tmp, ".", "_statistics", "timeseries.db"), seed=seeded.append)
+        assert first is second and seeded == [first]
+        assert get_timeseries(os.path.join(tmp, "other.db")) is not first
+        first.record("query", "books", 1.0, "hybrid")
+        assert second.total("query")["count"] == 1
+        first.close()
+        get_timeseries(os.path.join(tmp, "other.db")).close()
+
+        # Closing unregisters the store, so the next caller gets a live connection that records again
+        reopened = get_timeseries(path, seed=seeded.append)
+        assert reopened is not first and seeded == [first, reopened]
+        reopened.record("query", "books", 2.0, "hybrid")
+        assert reopened.total("query")["count"] == 2
+        reopened.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Time-Series Rollups Test")
+    print("=" * 40)
+    test_sketch_is_accurate_and_mergeable()
+    test_rollups_per_resolution_bucket_and_mode()
+    test_history_survives_restarts_and_minutes_age_out()
+    test_trend_queries_read_rollups_not_events()
+    test_one_store_per_database_per_process()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test tracing spans: nesting, tracks per task, shared-loop propagation and Chrome trace export
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from core_steplog import StepLogger
+from util_async import run_sync
+from util_tracing import annotate, current_trace, span, trace_session, traced
+
+
+def test_spans_are_noops_outside_a_trace():
+    with span("orphan") as s:
+        annotate(ignored=True)
+    assert s is None and current_trace() is None
+
+
+def test_nested_spans_export_as_chrome_trace():
+    with tempfile.TemporaryDirectory() as tmp:
+        with trace_session("WS_test", tmp, enabled=True, project="demo") as trace:
+            with span("write_scene", "scene", act=1, scene=2):
+                with span("assemble_context"):
+                    time.sleep(0.01)
+                with span("generation") as generation:
+                    annotate(tokens=42)
+                    time.sleep(0.02)
+            try:
+                with span("save_scene", "db"):
+                    raise RuntimeError("disk full")
+            except RuntimeError:
+                pass
+
+        path = os.path.join(tmp, "WS_test.json")
+        with open(path) as f:
+            exported = json.load(f)
+        events = {e["name"]: e for e in exported["traceEvents"] if e["ph"] == "X"}
+        assert set(events) == {"WS_test", "write_scene", "assemble_context", "generation", "save_scene"}
+        scene, assemble, generate = events["write_scene"], events["assemble_context"], events["generation"]
+        # Children sit inside their parent on the same track
+        assert assemble["tid"] == scene["tid"] == generate["tid"]
+        assert scene["ts"] <= assemble["ts"] and assemble["ts"] + assemble["dur"] <= generate["ts"]
+        assert generate["ts"] + generate["dur"] <= scene["ts"] + scene["dur"]
+        assert generate["dur"] >= 20000 and generate["args"] == {"tokens": 42} and generation.args["tokens"] == 42
+        assert "disk full" in events["save_scene"]["args"]["error"]
+        assert exported["otherData"]["project"] == "demo"
+        assert trace.summary()[0]["name"] == "WS_test"
+
+        # A resumed session gets its own file instead of overwriting the first
+        with trace_session("WS_test", tmp, enabled=True):
+            pass
+        assert os.path.exists(os.path.join(tmp, "WS_test.2.json"))
+
+
+def test_concurrent_tasks_and_shared_loop_get_their_own_tracks():
+    @traced("query_bucket", "retrieval")
+    async def query(bucket):
+        annotate(bucket=bucket)
+        await asyncio.sleep(0.01)
+
+    async def on_shared_loop():
+        with span("lightrag.aquery"):
+            await asyncio.sleep(0)
+
+    async def scene():
+        with span("retrieval"):
+            await asyncio.gather(*(query(b) for b in ("books", "scripts")))
+            await asyncio.to_thread(run_sync, on_shared_loop())
+
+    with trace_session("BS_test", enabled=True) as trace:
+        asyncio.run(scene())
+
+    chrome = trace.to_chrome()
+    spans = [e for e in chrome["traceEvents"] if e["ph"] == "X"]
+    queries = [e for e in spans if e["name"] == "query_bucket"]
+    retrieval = next(e for e in spans if e["name"] == "retrieval")
+    shared = next(e for e in spans if e["name"] == "lightrag.aquery")
+    # Overlapping gathered queries would break nesting on one track
+    assert len({e["tid"] for e in queries}) == 2 and retrieval["tid"] not in {e["tid"] for e in queries}
+    assert {e["args"]["bucket"] for e in queries} == {"books", "scripts"}
+    assert all(e["args"]["parent"] == "retrieval" for e in queries)
+    assert shared["args"]["parent"] == "retrieval" and shared["tid"] != retrieval["tid"]
+    names = {e["args"]["name"] for e in chrome["traceEvents"] if e["name"] == "thread_name"}
+    assert any("lizzy-shared-loop" in name for name in names)
+
+
+def test_step_logger_flush_is_a_db_span():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE steps (id TEXT)")
+    steps = StepLogger(conn, "scene")
+    with trace_session("db", enabled=True) as trace:
+        with steps.scene():
+            for i in range(3):
+                steps.execute("INSERT INTO steps VALUES (?)", (str(i),))
+    flush = next(s for s in trace.spans if s.name == "db.flush")
+    assert flush.category == "db" and flush.args["statements"] == 3
+    print(f"✅ db.flush traced: {flush.duration * 1000:.2f} ms for 3 statements")
+
+
+if __name__ == "__main__":
+    print("🧪 Tracing Test")
+    print("=" * 40)
+    test_spans_are_noops_outside_a_trace()
+    test_nested_spans_export_as_chrome_trace()
+    test_concurrent_tasks_and_shared_loop_get_their_own_tracks()
+    test_step_logger_flush_is_a_db_span()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Test streamed multipart uploads: spooling, hashing, dedup and size limits
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import tracemalloc
+
+from util_uploads import (MultipartSpooler, UploadError, spool_request_files, load_upload_index, safe_filename,
+                          save_upload)
+
+BOUNDARY = "----LizzyBoundary7MA4YWxkTrZu0gW"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart_body(files, fields=None):
+    """Build a multipart body from [(filename, bytes)] and {name: value}"""
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for filename, data in files:
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                     f'Content-Type: text/plain\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+class GeneratedBody(io.RawIOBase):
+    """Multipart body for one large file, produced on the fly so the test itself stays small in memory"""
+
+    def __init__(self, filename, size):
+        self.head = io.BytesIO(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; '
+                               f'filename="{filename}"\r\n\r\n'.encode())
+        self.remaining = size
+        self.tail = io.BytesIO(f"\r\n--{BOUNDARY}--\r\n".encode())
+        self.block = (b"INT. WRITERS ROOM - NIGHT\n" * 2600)[:65536]
+
+    def read(self, n=-1):
+        data = self.head.read(n)
+        if data:
+            return data
+        if self.remaining > 0:
+            take = min(n, self.remaining, len(self.block))
+            self.remaining -= take
+            return self.block[:take]
+        return self.tail.read(n)
+
+
+def test_multiple_files_with_split_boundaries():
+    """Tiny read chunks split boundaries and headers across reads without corrupting files"""
+    with tempfile.TemporaryDirectory() as bucket:
+        script = b"FADE IN:\r\n--not a boundary\r\n" * 50
+        notes = os.urandom(5000)
+        body = multipart_body([("script.txt", script), ("../../etc/notes.md", notes)], {"source": "upload form"})
+
+        result = MultipartSpooler(bucket, chunk_size=7).spool(io.BytesIO(body), CONTENT_TYPE)
+
+        assert result["fields"] == {"source": "upload form"}
+        assert [f["filename"] for f in result["files"]] == ["script.txt", "notes.md"]
+        for f, data in zip(result["files"], [script, notes]):
+            assert f["size"] == len(data)
+            assert f["sha256"] == hashlib.sha256(data).hexdigest()
+            with open(f["path"], 'rb') as fh:
+                assert fh.read() == data
+        assert not [n for n in os.listdir(bucket) if n.endswith(".part")]
+        print("✅ Multi-file spooling OK")
+
+
+def test_dedup_within_and_across_requests():
+    """Identical content is kept once, both inside one request and against the bucket index"""
+    with tempfile.TemporaryDirectory() as bucket:
+        body = multipart_body([("a.txt", b"same text"), ("b.txt", b"same text"), ("c.txt", b"other")])
+        first = spool_request_files(io.BytesIO(body), CONTENT_TYPE, bucket)
+        assert [f["duplicate"] for f in first["files"]] == [False, True, False]
+        assert first["files"][1]["duplicate_of"] == "a.txt"
+        assert not os.path.exists(os.path.join(bucket, "b.txt"))
+
+        second = spool_request_files(io.BytesIO(multipart_body([("renamed.txt", b"other")])), CONTENT_TYPE, bucket)
+        assert second["files"][0]["duplicate"] and second["files"][0]["duplicate_of"] == "c.txt"
+        assert len(load_upload_index(bucket)) == 2
+
+        # JSON uploads share the same index
+        saved = save_upload(bucket, "d.txt", "same text")
+        assert saved["duplicate"] and saved["duplicate_of"] == "a.txt"
+        assert not os.path.exists(os.path.join(bucket, "d.txt"))
+        print("✅ Dedup OK")
+
+
+def test_size_limits_clean_up():
+    """Oversized uploads are rejected with 413 and leave nothing behind"""
+    with tempfile.TemporaryDirectory() as bucket:
+        body = multipart_body([("small.txt", b"x" * 100), ("big.txt", b"y" * 5000)])
+        try:
+            MultipartSpooler(bucket, max_file_size=1000).spool(io.BytesIO(body), CONTENT_TYPE)
+            raise AssertionError("expected UploadError")
+        except UploadError as e:
+            assert e.status == 413
+        # small.txt parsed fine before big.txt failed; it must not be left in the bucket either
+        assert os.listdir(bucket) == []
+
+        try:
+            MultipartSpooler(bucket, max_total_size=3000).spool(
+                io.BytesIO(multipart_body([("a.txt", b"a" * 2000), ("b.txt", b"b" * 2000)])), CONTENT_TYPE)
+            raise AssertionError("expected UploadError")
+        except UploadError as e:
+            assert e.status == 413
+
+        try:
+            MultipartSpooler(bucket).spool(io.BytesIO(body[:-40]), CONTENT_TYPE)
+            raise AssertionError("expected UploadError")
+        except UploadError as e:
+            assert "Truncated" in str(e)
+        assert not [n for n in os.listdir(bucket) if n.endswith(".part")]
+        print("✅ Limits OK")
+
+
+def test_same_name_different_bytes_is_not_overwritten():
+    """A new file reusing an existing name gets its own name; the old content and its index entry survive"""
+    with tempfile.TemporaryDirectory() as bucket:
+        spool_request_files(io.BytesIO(multipart_body([("draft.txt", b"version one")])), CONTENT_TYPE, bucket)
+        result = spool_request_files(io.BytesIO(multipart_body([("draft.txt", b"version two"),
+                                                                ("copy.txt", b"version two")])), CONTENT_TYPE, bucket)
+        assert result["files"][0]["filename"] == "draft-2.txt"
+        assert result["files"][1]["duplicate_of"] == "draft-2.txt"
+        with open(os.path.join(bucket, "draft.txt"), 'rb') as f:
+            assert f.read() == b"version one"
+        index = load_upload_index(bucket)
+        assert index[hashlib.sha256(b"version one").hexdigest()]["filename"] == "draft.txt"
+        assert index[hashlib.sha256(b"version two").hexdigest()]["filename"] == "draft-2.txt"
+
+        # The JSON path takes the same free name instead of overwriting
+        saved = save_upload(bucket, "draft.txt", "version three")
+        assert saved["filename"] == "draft-3.txt" and not saved["duplicate"]
+        with open(os.path.join(bucket, "draft.txt"), 'rb') as f:
+            assert f.read() == b"version one"
+        print("✅ Name collisions OK")
+
+
+def test_json_upload_never_deletes_existing_content():
+    """a.txt='AAA', b.txt='BBB', then a.txt='BBB': a.txt keeps AAA and later AAA uploads still find it"""
+    with tempfile.TemporaryDirectory() as bucket:
+        assert not save_upload(bucket, "a.txt", "AAA")["duplicate"]
+        assert not save_upload(bucket, "b.txt", "BBB")["duplicate"]
+        again = save_upload(bucket, "a.txt", "BBB")
+        assert again["duplicate"] and again["duplicate_of"] == "b.txt"
+        with open(os.path.join(bucket, "a.txt")) as f:
+            assert f.read() == "AAA"
+        later = save_upload(bucket, "c.txt", "AAA")
+        assert later["duplicate_of"] == "a.txt" and os.path.exists(os.path.join(bucket, "a.txt"))
+        assert sorted(os.listdir(bucket)) == ["a.txt", "b.txt", "upload_index.json"]
+
+        # An index entry whose file was removed no longer claims those bytes
+        os.remove(os.path.join(bucket, "a.txt"))
+        restored = save_upload(bucket, "c.txt", "AAA")
+        assert not restored["duplicate"] and os.path.exists(restored["path"])
+        assert load_upload_index(bucket)[hashlib.sha256(b"AAA").hexdigest()]["filename"] == "c.txt"
+        print("✅ JSON uploads keep existing content")
+
+
+def test_failed_request_leaves_no_partial_files():
+    """Files before the part that fails are not moved into the bucket"""
+    with tempfile.TemporaryDirectory() as bucket:
+        body = multipart_body([("first.txt", b"x" * 100), ("second.exe", b"y" * 100)])
+        try:
+            spool_request_files(io.BytesIO(body), CONTENT_TYPE, bucket, allowed_extensions=[".txt"])
+            raise AssertionError("expected UploadError")
+        except UploadError as e:
+            assert e.status == 415
+        assert os.listdir(bucket) == []
+        print("✅ Failed request left the bucket empty")
+
+
+def test_large_upload_memory_is_flat():
+    """A 50 MB upload is spooled with a small, constant memory footprint"""
+    with tempfile.TemporaryDirectory() as bucket:
+        size = 50 * 1024 * 1024
+        tracemalloc.start()
+        result = MultipartSpooler(bucket).spool(GeneratedBody("corpus.txt", size), CONTENT_TYPE)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert result["files"][0]["size"] == size
+        assert os.path.getsize(os.path.join(bucket, "corpus.txt")) == size
+        print(f"📊 50 MB upload spooled with peak {peak / 1024:.0f} KB traced memory")
+        assert peak < 1024 * 1024
+
+
+def test_safe_filename():
+    assert safe_filename("../../secret.txt") == "secret.txt"
+    assert safe_filename("C:\\Users\\elle\\draft v2.md") == "draft v2.md"
+    assert safe_filename("...") == "document.txt"
+
+
+if __name__ == "__main__":
+    print("🧪 Streaming Upload Test")
+    print("=" * 40)
+    test_multiple_files_with_split_boundaries()
+    test_dedup_within_and_across_requests()
+    test_size_limits_clean_up()
+    test_same_name_different_bytes_is_not_overwritten()
+    test_json_upload_never_deletes_existing_content()
+    test_failed_request_leaves_no_partial_files()
+    test_large_upload_memory_is_flat()
+    test_safe_filename()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test LLM usage accounting: operation attribution across tasks and threads, ledger rollups and the call wrappers
+"""
+
+import asyncio
+import dataclasses
+import threading
+from types import SimpleNamespace
+
+from util_accounting import UsageLedger, current_operation, operation, record_call, set_ledger
+from util_async import run_sync
+from util_llm import GenerationStats, record_stream_usage
+from util_ratelimit import call_with_limit_sync, configure_limits, limit_embedding, limit_llm
+
+
+def fresh_ledger() -> UsageLedger:
+    return set_ledger(UsageLedger(":memory:"))
+
+
+def test_operations_nest_and_tally():
+    ledger = fresh_ledger()
+    with operation(project="wedding", session="WS_1") as session:
+        with operation(scene="1.1", stage="retrieval", bucket="books") as retrieval:
+            record_call("llm", "gpt-4o-mini", 100, 20, 0.5)
+            assert current_operation() == {"project": "wedding", "session": "WS_1", "scene": "1.1",
+                                           "stage": "retrieval", "bucket": "books"}
+        with operation(scene="1.1", stage="generation"):
+            record_call("llm", "gpt-4o-mini", 300, 700, 2.0)
+            record_call("llm", "gpt-4o-mini", 300, 0, 0.1, error=RuntimeError("boom"))
+    assert current_operation() == {}
+    assert retrieval.to_dict()["llm_calls"] == 1
+    totals = session.to_dict()
+    assert totals["llm_calls"] == 3 and totals["llm_errors"] == 1 and totals["total_tokens"] == 1420
+
+    by_stage = {row["stage"]: row for row in ledger.rollup(by=("stage",), session="WS_1")}
+    assert by_stage["generation"]["calls"] == 2 and by_stage["generation"]["errors"] == 1
+    assert by_stage["retrieval"]["prompt_tokens"] == 100 and by_stage["retrieval"]["avg_latency_ms"] == 500.0
+    # Most expensive group first
+    assert [row["stage"] for row in ledger.rollup(by=("stage",))] == ["generation", "retrieval"]
+    assert ledger.totals(bucket="books")["calls"] == 1 and ledger.totals(bucket="nope")["calls"] == 0
+    assert "boom" in ledger.recent(1)[0]["error"]
+
+    try:
+        ledger.rollup(by=("prompt_tokens; DROP TABLE llm_calls",))
+        assert False, "unknown group field must be rejected"
+    except ValueError:
+        pass
+
+
+def test_context_follows_tasks_threads_and_shared_loop():
+    ledger = fresh_ledger()
+
+    async def scene_query(bucket):
+        with operation(bucket=bucket):
+            await asyncio.sleep(0)
+            record_call("llm", "gpt-4o-mini", 10, 5, 0.01)
+
+    async def scene():
+        with operation(session="WS_2", stage="retrieval") as usage:
+            await asyncio.gather(*(scene_query(bucket) for bucket in ("books", "scripts", "plays")))
+        return usage.to_dict()
+
+    assert asyncio.run(scene())["llm_calls"] == 3
+
+    async def on_loop():
+        record_call("embedding", "text-embedding-3-small", 50, 0, 0.02)
+
+    def ingest():
+        with operation(bucket="books", document="twenty_thousand_leagues.txt", stage="ingest") as usage:
+            run_sync(on_loop())
+        assert usage.to_dict()["llm_calls"] == 1
+
+    thread = threading.Thread(target=ingest)
+    thread.start()
+    thread.join()
+
+    rows = {row["bucket"]: row for row in ledger.rollup(by=("bucket",), session="WS_2")}
+    assert set(rows) == {"books", "scripts", "plays"}
+    ingest_row = ledger.rollup(by=("document", "kind"), stage="ingest")[0]
+    assert ingest_row["document"] == "twenty_thousand_leagues.txt" and ingest_row["kind"] == "embedding"
+    print(f"✅ Ingest attributed: {ingest_row}")
+
+
+@dataclasses.dataclass
+class EmbeddingFunc:
+    embedding_dim: int
+    max_token_size: int
+    func: callable
+
+
+def test_wrappers_record_calls():
+    ledger = fresh_ledger()
+    configure_limits("acct-llm", rpm=6000, tpm=1_000_000)
+    configure_limits("acct-embed", rpm=6000, tpm=1_000_000)
+
+    async def complete(prompt, system_prompt=None, history_messages=None, **kwargs):
+        if prompt == "fail":
+            raise ValueError("bad prompt")
+        return "x" * 400
+
+    async def embed(texts):
+        return [[len(t)] for t in texts]
+
+    llm = limit_llm(complete, model="acct-llm")
+    embedding = limit_embedding(EmbeddingFunc(1536, 8192, embed), model="acct-embed")
+
+    async def run():
+        with operation(bucket="books", stage="ingest"):
+            await llm("p" * 400, system_prompt="s" * 40)
+            await embedding.func(["a" * 80, "b" * 80])
+            try:
+                await llm("fail")
+            except ValueError:
+                pass
+
+    asyncio.run(run())
+    rows = {row["kind"]: row for row in ledger.rollup(by=("kind",), bucket="books")}
+    assert rows["llm"]["calls"] == 2 and rows["llm"]["errors"] == 1
+    assert rows["llm"]["completion_tokens"] == 101 and rows["llm"]["prompt_tokens"] > 100
+    assert rows["embedding"]["prompt_tokens"] == 41 and rows["embedding"]["completion_tokens"] == 0
+
+    # Direct OpenAI responses are recorded with their exact usage
+    response = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=34))
+    with operation(project="wedding", stage="chat"):
+        assert call_with_limit_sync("acct-llm", 50, lambda **kwargs: response, model="acct-llm") is response
+    row = ledger.recent(1)[0]
+    assert (row["prompt_tokens"], row["completion_tokens"], row["exact_tokens"], row["project"]) == (12, 34, 1, "wedding")
+
+
+def test_stream_attribution_is_captured_when_stats_are_created():
+    ledger = fresh_ledger()
+    with operation(project="wedding", stage="chat"):
+        stats = GenerationStats()
+    # The stream is read after the handler returned
+    for _ in range(7):
+        stats.on_chunk("word ")
+    stats.finish()
+    record_stream_usage("gpt-4o-mini", [{"role": "user", "content": "hello there"}], stats)
+    row = ledger.recent(1)[0]
+    assert row["project"] == "wedding" and row["completion_tokens"] == 7 and row["exact_tokens"] == 0
+
+
+if __name__ == "__main__":
+    print("🧪 Usage Ledger Test")
+    print("=" * 40)
+    test_operations_nest_and_tally()
+    test_context_follows_tasks_threads_and_shared_loop()
+    test_wrappers_record_calls()
+    test_stream_attribution_is_captured_when_stats_are_created()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test streamed bucket export: archive correctness and flat peak memory
+"""
+
+import io
+import os
+import tempfile
+import tracemalloc
+import zipfile
+
+from util_zipstream import stream_directory_zip, write_zip, directory_entries, parse_export_options
+
+
+def make_bucket(root, megabytes):
+    """Fake LightRAG bucket: vector JSON, GraphML, kv store and an already-compressed upload"""
+    os.makedirs(os.path.join(root, "nested"), exist_ok=True)
+    with open(os.path.join(root, "vdb_chunks.json"), 'w') as f:
+        row = '{"__id__": "chunk-%06d", "content": "Lorem ipsum dolor sit amet"},\n'
+        for i in range(megabytes * 1024 * 1024 // len(row % 0)):
+            f.write(row % i)
+    with open(os.path.join(root, "graph_chunk_entity_relation.graphml"), 'w') as f:
+        f.write("<graphml>" + "<node id='n'/>" * 1000 + "</graphml>")
+    with open(os.path.join(root, "nested", "kv_store_full_docs.json"), 'w') as f:
+        f.write('{"doc": "text"}')
+    with open(os.path.join(root, "reference.pdf"), 'wb') as f:
+        f.write(os.urandom(256 * 1024))
+
+
+def peak_memory_while_streaming(root):
+    tracemalloc.start()
+    total = 0
+    for chunk in stream_directory_zip(root):
+        total += len(chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, total
+
+
+def test_archive_contents():
+    """Streamed archive is a valid zip; already-compressed files are stored, text is deflated"""
+    with tempfile.TemporaryDirectory() as tmp:
+        make_bucket(tmp, 1)
+        data = b"".join(stream_directory_zip(tmp, compresslevel=9))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+
+        assert archive.testzip() is None
+        names = sorted(archive.namelist())
+        assert names == sorted(arc for arc, _ in directory_entries(tmp))
+        assert "nested/kv_store_full_docs.json" in names
+        assert archive.getinfo("reference.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("vdb_chunks.json").compress_type == zipfile.ZIP_DEFLATED
+        with open(os.path.join(tmp, "reference.pdf"), 'rb') as f:
+            assert archive.read("reference.pdf") == f.read()
+
+        no_store = zipfile.ZipFile(io.BytesIO(b"".join(stream_directory_zip(tmp, store_compressed=False))))
+        assert no_store.getinfo("reference.pdf").compress_type == zipfile.ZIP_DEFLATED
+        stored_only = zipfile.ZipFile(io.BytesIO(b"".join(stream_directory_zip(tmp, compresslevel=0))))
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in stored_only.infolist())
+        print("✅ Archive contents OK")
+
+
+def test_peak_memory_constant():
+    """Peak memory does not grow with bucket size"""
+    with tempfile.TemporaryDirectory() as small, tempfile.TemporaryDirectory() as large:
+        make_bucket(small, 2)
+        make_bucket(large, 16)
+
+        small_peak, small_size = peak_memory_while_streaming(small)
+        large_peak, large_size = peak_memory_while_streaming(large)
+
+        print(f"📊 2 MB bucket:  peak {small_peak / 1024:.0f} KB for {small_size / 1024:.0f} KB archive")
+        print(f"📊 16 MB bucket: peak {large_peak / 1024:.0f} KB for {large_size / 1024:.0f} KB archive")
+        assert large_peak < 2 * 1024 * 1024
+        assert large_peak < small_peak * 2
+
+
+def test_write_zip_and_options():
+    """Archives can be written to disk; request options are clamped"""
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+        make_bucket(tmp, 1)
+        dest = os.path.join(out, "bucket.zip")
+        size = write_zip(directory_entries(tmp), dest)
+        assert size == os.path.getsize(dest)
+        assert zipfile.ZipFile(dest).testzip() is None
+
+    assert parse_export_options({}) == (6, True)
+    assert parse_export_options({'level': '42', 'store_compressed': 'false'}) == (9, False)
+    assert parse_export_options({'level': 'fast'}) == (6, True)
+    print("✅ write_zip and options OK")
+
+
+if __name__ == "__main__":
+    print("🧪 Streaming Zip Export Test")
+    print("=" * 40)
+    test_archive_contents()
+    test_peak_memory_constant()
+    test_write_zip_and_options()
@@ -0,0 +1,300 @@
+"""
+Usage Accounting for Lizzy
+Per-call ledger of LLM and embedding calls, tokens and latency, attributed to the operation that made them
+"""
+
+import atexit
+import contextlib
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from util_metrics import LLM_CALL_SECONDS, LLM_CALLS, LLM_TOKENS
+
+# Attribution fields an operation can set; nested operations inherit and override them
+OPERATION_FIELDS = ("project", "session", "scene", "stage", "bucket", "document")
+ROLLUP_FIELDS = ("kind", "model") + OPERATION_FIELDS
+
+DEFAULT_LEDGER_PATH = os.path.join("lightrag_working_dir", "_statistics", "usage_ledger.db")
+# Rows are buffered so a burst of embedding calls does not commit once per call
+FLUSH_ROWS = 100
+FLUSH_SECONDS = 2.0
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT,
+    project TEXT,
+    session TEXT,
+    scene TEXT,
+    stage TEXT,
+    bucket TEXT,
+    document TEXT,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    latency_ms REAL DEFAULT 0,
+    retries INTEGER DEFAULT 0,
+    success INTEGER DEFAULT 1,
+    exact_tokens INTEGER DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_session ON llm_calls(session);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_bucket ON llm_calls(bucket);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_timestamp ON llm_calls(timestamp);
+"""
+
+
+class Tally:
+    """Running totals for one operation and everything nested inside it"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency: float, success: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if success else 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.latency_seconds += latency
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "llm_calls": self.calls,
+                "llm_errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "llm_seconds": round(self.latency_seconds, 3)
+            }
+
+
+# (attributes, tallies of every enclosing operation)
+_operation: contextvars.ContextVar = contextvars.ContextVar("lizzy_operation", default=({}, ()))
+
+
+def current_operation() -> Dict[str, str]:
+    return dict(_operation.get()[0])
+
+
+@contextlib.contextmanager
+def operation(**attrs: Any) -> Iterator[Tally]:
+    """Attribute every call made inside the block (including tasks it starts) to these fields"""
+    unknown = set(attrs) - set(OPERATION_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown operation fields: {', '.join(sorted(unknown))}")
+    parent_attrs, parent_tallies = _operation.get()
+    tally = Tally()
+    merged = {**parent_attrs, **{k: str(v) for k, v in attrs.items() if v is not None}}
+    token = _operation.set((merged, parent_tallies + (tally,)))
+    try:
+        yield tally
+    finally:
+        _operation.reset(token)
+
+
+class UsageLedger:
+    """SQLite ledger of calls with GROUP BY rollups over any attribution fields"""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(LEDGER_SCHEMA)
+        self.pending: List[Tuple] = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, row: Dict):
+        with self._lock:
+            self.pending.append(tuple(row.get(column) for column in _COLUMNS))
+            if len(self.pending) >= FLUSH_ROWS or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+                self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.conn.executemany(
+                f"INSERT INTO llm_calls ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                self.pending)
+            self.conn.commit()
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _where(self, since: Optional[float], filters: Dict) -> Tuple[str, List]:
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in ROLLUP_FIELDS:
+                raise ValueError(f"Cannot filter ledger by '{field}'")
+            if value is not None:
+                clauses.append(f"{field} = ?")
+                params.append(str(value))
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def rollup(self, by: Sequence[str] = ("bucket",), since: float = None, **filters) -> List[Dict]:
+        """Calls, tokens and latency grouped by the given fields, most tokens first"""
+        by = [field for field in by if field]
+        for field in by:
+            if field not in ROLLUP_FIELDS:
+                raise ValueError(f"Cannot group ledger by '{field}'")
+        where, params = self._where(since, filters)
+        group = f" GROUP BY {', '.join(by)}" if by else ""
+        columns = [*by, "COUNT(*)", "SUM(1 - success)", "SUM(prompt_tokens)", "SUM(completion_tokens)",
+                   "SUM(latency_ms)", "MAX(latency_ms)", "SUM(retries)"]
+        with self._lock:
+            self._flush()
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM llm_calls{where}{group} "
+                f"ORDER BY SUM(prompt_tokens + completion_tokens) DESC", params).fetchall()
+        results = []
+        for row in rows:
+            calls, errors, prompt, completion, latency, slowest, retries = row[len(by):]
+            if not calls:
+                continue
+            results.append({
+                **dict(zip(by, row[:len(by)])),
+                "calls": calls,
+                "errors": errors,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": prompt + completion,
+                "llm_seconds": round(latency / 1000.0, 3),
+                "avg_latency_ms": round(latency / calls, 1),
+                "max_latency_ms": round(slowest, 1),
+                "retries": retries
+            })
+        return results
+
+    def totals(self, since: float = None, **filters) -> Dict:
+        rows = self.rollup(by=(), since=since, **filters)
+        return rows[0] if rows else {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                     "total_tokens": 0, "llm_seconds": 0.0, "avg_latency_ms": 0.0,
+                                     "max_latency_ms": 0.0, "retries": 0}
+
+    def recent(self, limit: int = 50, **filters) -> List[Dict]:
+        where, params = self._where(None, filters)
+        with self._lock:
+            self._flush()
+            cursor = self.conn.execute(
+                f"SELECT * FROM llm_calls{where} ORDER BY id DESC LIMIT ?", params + [limit])
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
+
+
+_COLUMNS = ("timestamp", "kind", "model") + OPERATION_FIELDS + (
+    "prompt_tokens", "completion_tokens", "latency_ms", "retries", "success", "exact_tokens", "error")
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> UsageLedger:
+    """The process-wide ledger (LIZZY_USAGE_DB, default under lightrag_working_dir/_statistics)"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(os.getenv("LIZZY_USAGE_DB", DEFAULT_LEDGER_PATH))
+            atexit.register(_ledger.flush)
+        return _ledger
+
+
+def set_ledger(ledger: UsageLedger) -> UsageLedger:
+    """Replace the process-wide ledger, e.g. with UsageLedger(":memory:") in tests"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is not None and _ledger is not ledger:
+            _ledger.flush()
+        _ledger = ledger
+        return ledger
+
+
+def record_call(kind: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                latency: float = 0.0, error: Optional[BaseException] = None, exact: bool = False,
+                retries: int = 0, attrs: Dict[str, str] = None):
+    """Add one call to the ledger and to the tallies of every operation it ran inside
+
+    attrs overrides the current operation, for calls finished outside it (e.g. a stream read after the handler returned).
+    """
+    context_attrs, tallies = _operation.get()
+    attrs = {**context_attrs, **(attrs or {})}
+    for tally in tallies:
+        tally.add(prompt_tokens, completion_tokens, latency, error is None)
+    LLM_CALLS.inc(kind=kind, model=model, status="error" if error is not None else "ok")
+    LLM_TOKENS.inc(prompt_tokens, kind=kind, model=model, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind=kind, model=model, type="completion")
+    LLM_CALL_SECONDS.observe(latency, kind=kind, model=model)
+    try:
+        get_ledger().append({
+            **attrs,
+            "timestamp": time.time(), "kind": kind, "model": model,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "latency_ms": round(latency * 1000.0, 1), "retries": retries,
+            "success": 0 if error is not None else 1, "exact_tokens": 1 if exact else 0,
+            "error": f"{type(error).__name__}: {error}"[:500] if error is not None else None
+        })
+    except sqlite3.Error as e:
+        # Accounting must never fail the call it is accounting for
+        print(f"⚠️ Could not record LLM usage: {e}")
+
+
+def response_usage(response: Any) -> Optional[Tuple[int, int, bool]]:
+    """(prompt, completion, exact) from an OpenAI response's usage block, if it has one"""
+    usage = getattr(response, "usage", None)
+    if usage is None or getattr(usage, "prompt_tokens", None) is None:
+        return None
+    return usage.prompt_tokens, getattr(usage, "completion_tokens", None) or 0, True
+
+
+def format_rollup(rows: List[Dict], by: Sequence[str]) -> List[str]:
+    if not rows:
+        return ["📭 No LLM calls recorded"]
+    lines = []
+    for row in rows:
+        label = " / ".join(str(row.get(field) or "-") for field in by) or "all"
+        lines.append(f"🧾 {label}: {row['calls']} calls ({row['errors']} failed), "
+                     f"{row['prompt_tokens']:,} prompt + {row['completion_tokens']:,} completion tokens, "
+                     f"{row['llm_seconds']}s in calls (avg {row['avg_latency_ms']} ms)")
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarise LLM and embedding usage")
+    parser.add_argument("--db", default=os.getenv("LIZZY_USAGE_DB", DEFAULT_LEDGER_PATH))
+    parser.add_argument("--by", default="bucket,stage", help=f"comma-separated: {', '.join(ROLLUP_FIELDS)}")
+    for field in ROLLUP_FIELDS:
+        parser.add_argument(f"--{field}")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f"❌ No usage ledger at {args.db}")
+        raise SystemExit(1)
+    fields = [field.strip() for field in args.by.split(",") if field.strip()]
+    ledger = UsageLedger(args.db)
+    print("\n".join(format_rollup(ledger.rollup(by=fields, **{f: getattr(args, f) for f in ROLLUP_FIELDS}), fields)))
+    ledger.close()
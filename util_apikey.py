@@ -82,18 +82,21 @@ class APIKeyManager:
         
         try:
             from openai import OpenAI
+            from util_ratelimit import call_with_limit_sync, estimate_tokens
             
             print("🔍 Testing OpenAI API key...")
             client = OpenAI(api_key=api_key)
             
             # Test with embedding API (cheaper than completions)
-            response = client.embeddings.create(
+            response = call_with_limit_sync(
+                'text-embedding-ada-002', estimate_tokens('API key test'), client.embeddings.create,
                 model='text-embedding-ada-002',
                 input='API key test'
             )
             
             # Test with a small completion
-            completion = client.chat.completions.create(
+            completion = call_with_limit_sync(
+                'gpt-4o-mini', 30, client.chat.completions.create,
                 model='gpt-4o-mini',
                 messages=[{"role": "user", "content": "Say 'API test successful' in exactly 3 words."}],
                 max_tokens=10
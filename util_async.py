@@ -0,0 +1,428 @@
+"""
+Async Serving Utilities for Lizzy
+Shared event loop plus a small ASGI adapter so LLM-bound endpoints can be served as coroutines
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from util_metrics import observe_request
+
+# Native async routes get their body in memory; Flask routes read theirs as a stream instead
+MAX_BUFFERED_BODY = int(os.getenv("LIZZY_MAX_BODY_SIZE", str(16 * 1024 * 1024)))
+
+
+class SharedEventLoop:
+    """One long-lived event loop running in a daemon thread, shared by every LightRAG call"""
+
+    def __init__(self, name: str = "lizzy-shared-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Return the shared loop, starting its thread on first use"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def in_loop_thread(self) -> bool:
+        """True when called from the shared loop's own thread"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedule a coroutine on the shared loop and return a concurrent future
+
+        The caller's context variables (e.g. the usage-accounting operation) carry over to the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and block the calling thread for the result"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("run_sync() called from the shared loop - await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    async def wrap(self, coro: Awaitable) -> Any:
+        """Await a coroutine on the shared loop from any other running loop without blocking it"""
+        if self.in_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+
+async def _in_context(coro: Awaitable, context: contextvars.Context) -> Any:
+    # The task already runs in its own copy of the loop thread's context, so setting here stays local to it
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+_shared_loop = SharedEventLoop()
+
+
+def get_shared_loop() -> SharedEventLoop:
+    """Return the process-wide shared event loop"""
+    return _shared_loop
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine to completion on the shared loop from synchronous code"""
+    return _shared_loop.run(coro, timeout)
+
+
+async def on_shared_loop(coro: Awaitable) -> Any:
+    """Await a coroutine on the shared loop (LightRAG and pooled clients are bound to it)"""
+    return await _shared_loop.wrap(coro)
+
+
+class AsyncRequest:
+    """Minimal request object handed to async route handlers"""
+
+    def __init__(self, scope: Dict, body: bytes, receive: Callable = None):
+        self.scope = scope
+        self.method = scope.get("method", "GET").upper()
+        self.path = scope.get("path", "/")
+        self.query_string = scope.get("query_string", b"").decode("latin-1")
+        self.args = dict(parse_qsl(self.query_string))
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        self.body = body
+        self._receive = receive
+        self._disconnected = False
+
+    def get_json(self, silent: bool = True) -> Optional[Any]:
+        """Decode the body as JSON (None on failure when silent)"""
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            if silent:
+                return None
+            raise
+
+    @property
+    def disconnected(self) -> bool:
+        """True once the client has gone away (only tracked while streaming)"""
+        return self._disconnected
+
+
+class AsyncResponse:
+    """Plain ASGI response with a fully-buffered body"""
+
+    def __init__(self, body: Any = b"", status: int = 200, headers: Dict[str, str] = None,
+                 content_type: str = "text/plain; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body
+        self.status = status
+        self.headers = {"content-type": content_type}
+        self.headers.update({k.lower(): v for k, v in (headers or {}).items()})
+
+    async def send_to(self, send: Callable, request: AsyncRequest):
+        """Write the response to an ASGI send channel"""
+        headers = dict(self.headers)
+        headers["content-length"] = str(len(self.body))
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class JSONResponse(AsyncResponse):
+    """JSON body response, the async counterpart of flask.jsonify"""
+
+    def __init__(self, data: Any, status: int = 200, headers: Dict[str, str] = None):
+        super().__init__(json.dumps(data, default=str), status, headers, "application/json")
+
+
+class StreamingResponse(AsyncResponse):
+    """Response whose body comes from an async iterator; the iterator is closed if the client disconnects"""
+
+    def __init__(self, chunks: AsyncIterator, status: int = 200, headers: Dict[str, str] = None,
+                 content_type: str = "text/plain; charset=utf-8"):
+        super().__init__(b"", status, headers, content_type)
+        self.chunks = chunks
+
+    async def send_to(self, send: Callable, request: AsyncRequest):
+        """Stream chunks until exhausted or until http.disconnect arrives"""
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in self.headers.items()]})
+
+        async def pump():
+            async for chunk in self.chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        async def watch_disconnect():
+            while request._receive is not None:
+                message = await request._receive()
+                if message["type"] == "http.disconnect":
+                    request._disconnected = True
+                    return
+
+        pump_task = asyncio.ensure_future(pump())
+        watch_task = asyncio.ensure_future(watch_disconnect())
+        try:
+            await asyncio.wait({pump_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not pump_task.done():
+                # Client went away - cancelling the pump cancels whatever the generator awaits (e.g. an LLM stream)
+                pump_task.cancel()
+            watch_task.cancel()
+            await asyncio.gather(pump_task, watch_task, return_exceptions=True)
+            aclose = getattr(self.chunks, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+        if not request.disconnected:
+            if not pump_task.cancelled() and pump_task.exception() is not None:
+                print(f"❌ Stream error: {pump_task.exception()}")
+            await send({"type": "http.response.body", "body": b""})
+
+
+class ReceiveStream(io.RawIOBase):
+    """wsgi.input that pulls the ASGI body from receive() only as the WSGI app reads it, from its worker thread"""
+
+    def __init__(self, receive: Callable, loop: asyncio.AbstractEventLoop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b""
+        self._more_body = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer and self._more_body:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._more_body = False
+                break
+            self._buffer = message.get("body", b"")
+            self._more_body = message.get("more_body", False)
+        count = min(len(target), len(self._buffer))
+        target[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+class AsyncApp:
+    """ASGI application: native async routes first, everything else falls through to the Flask WSGI app"""
+
+    _PARAM_RE = re.compile(r"<(?:(\w+):)?(\w+)>")
+
+    def __init__(self, wsgi_app: Callable = None, max_wsgi_threads: int = 16, max_body_size: int = None):
+        self.wsgi_app = wsgi_app
+        self.max_wsgi_threads = max_wsgi_threads
+        self.max_body_size = max_body_size or MAX_BUFFERED_BODY
+        self.routes: List[Tuple[set, re.Pattern, Callable, str]] = []
+        self._executor = None
+
+    def route(self, rule: str, methods: Iterable[str] = ("GET",)):
+        """Register an async handler using Flask-style rules like /api/buckets/<bucket_name>/query"""
+        def to_regex(match):
+            converter, name = match.group(1), match.group(2)
+            return f"(?P<{name}>.+)" if converter == "path" else f"(?P<{name}>[^/]+)"
+
+        pattern = re.compile("^" + self._PARAM_RE.sub(to_regex, rule) + "$")
+
+        def decorator(handler):
+            self.routes.append(({m.upper() for m in methods}, pattern, handler, rule))
+            return handler
+        return decorator
+
+    def match(self, method: str, path: str) -> Tuple[Optional[Callable], Dict[str, str]]:
+        """Find the async handler for a request, if any"""
+        handler, params, _ = self._match(method, path)
+        return handler, params
+
+    def _match(self, method: str, path: str) -> Tuple[Optional[Callable], Dict[str, str], Optional[str]]:
+        for methods, pattern, handler, rule in self.routes:
+            found = pattern.match(path)
+            if found and method in methods:
+                return handler, found.groupdict(), rule
+        return None, {}, None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Bounded thread pool used only for the WSGI fallback"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_wsgi_threads,
+                                                thread_name_prefix="lizzy-wsgi")
+        return self._executor
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    if self._executor is not None:
+                        self._executor.shutdown(wait=False)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        method = scope.get("method", "GET").upper()
+        handler, params, rule = self._match(method, scope.get("path", "/"))
+
+        if handler is None:
+            if self.wsgi_app is None:
+                await JSONResponse({"error": "Not found"}, 404).send_to(send, AsyncRequest(scope, b""))
+                return
+            # Streamed, so multipart uploads spool to disk with flat memory as they do under WSGI
+            await self._call_wsgi(scope, receive, send)
+            return
+
+        body = await self._read_body(receive, self.max_body_size)
+        if body is None:
+            limit = f"{self.max_body_size // (1024 * 1024)} MB"
+            await JSONResponse({"error": f"Request body exceeds {limit}"}, 413).send_to(send, AsyncRequest(scope, b""))
+            return
+        request = AsyncRequest(scope, body, receive)
+        started = time.perf_counter()
+        try:
+            result = await handler(request, **params)
+        except Exception as e:
+            print(f"❌ Async handler error on {request.path}: {e}")
+            result = JSONResponse({"error": str(e)}, 500)
+        response = self._to_response(result)
+        # Flask routes are timed by instrument_flask under the same server label
+        server = getattr(self.wsgi_app, "extensions", {}).get("lizzy_metrics", "asgi")
+        observe_request(server, rule, method, response.status, time.perf_counter() - started)
+        await response.send_to(send, request)
+
+    @staticmethod
+    async def _read_body(receive: Callable, limit: int) -> Optional[bytes]:
+        """The whole request body, or None once it grows past limit"""
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _to_response(result: Any) -> AsyncResponse:
+        if isinstance(result, AsyncResponse):
+            return result
+        status = 200
+        if isinstance(result, tuple):
+            result, status = result[0], result[1]
+            if isinstance(result, AsyncResponse):
+                result.status = status
+                return result
+        if isinstance(result, (dict, list)):
+            return JSONResponse(result, status)
+        return AsyncResponse(result if result is not None else b"", status)
+
+    async def _call_wsgi(self, scope: Dict, receive: Callable, send: Callable):
+        """Run the WSGI app in the bounded pool, streaming the request body in and its iterable back out"""
+        loop = asyncio.get_running_loop()
+        environ = {
+            "REQUEST_METHOD": scope.get("method", "GET"),
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope.get("path", "/"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+            "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("127.0.0.1", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BufferedReader(ReceiveStream(receive, loop)),
+            # The stream ends where the ASGI body does, with or without a Content-Length
+            "wsgi.input_terminated": True,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            key = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            else:
+                environ[f"HTTP_{key}"] = value
+
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start["status"] = int(status.split(" ", 1)[0])
+            response_start["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        iterable = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+        iterator = iter(iterable)
+        sentinel = object()
+        started = False
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, iterator, sentinel)
+                if not started:
+                    await send({"type": "http.response.start", "status": response_start["status"],
+                                "headers": response_start["headers"]})
+                    started = True
+                if chunk is sentinel:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        await send({"type": "http.response.body", "body": b""})
+
+
+def wants_asgi() -> bool:
+    """True when the server was started with --asgi (or LIZZY_ASGI=1)"""
+    return "--asgi" in sys.argv or os.getenv("LIZZY_ASGI") == "1"
+
+
+def serve_asgi(asgi_app: AsyncApp, host: str, port: int, fallback: Callable[[], None] = None):
+    """Serve an ASGI app with uvicorn, or run the threaded fallback if uvicorn is missing"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("⚠️ uvicorn not installed - falling back to the threaded development server")
+        print("💡 Install with: pip install uvicorn")
+        if fallback is not None:
+            fallback()
+        return
+
+    print(f"⚡ Async mode: serving on http://{host}:{port} (ASGI, shared event loop)")
+    uvicorn.run(asgi_app, host=host, port=port, log_level="info")
@@ -0,0 +1,206 @@
+"""
+Adaptive Concurrency for Lizzy
+AIMD limits on in-flight LLM and embedding calls, one per model, shared by every thread and event loop
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+SUCCESS = "success"
+THROTTLED = "throttled"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+# (initial, maximum) in-flight calls; override with LIZZY_CONCURRENCY=model=initial:max,...
+DEFAULT_CONCURRENCY = (4, 32)
+MIN_CONCURRENCY = 1
+DECREASE_FACTOR = 0.5
+# One burst of 429s should cut the limit once, not once per failed call
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+def classify_outcome(error: Optional[BaseException]) -> str:
+    """success, throttled (429), timeout, or error (neutral: says nothing about capacity)"""
+    if error is None:
+        return SUCCESS
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(error).__name__:
+        return TIMEOUT
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        return THROTTLED
+    return ERROR
+
+
+class AdaptiveLimiter:
+    """Additive increase on success, multiplicative decrease on throttling or timeouts"""
+
+    def __init__(self, name: str, initial: int = DEFAULT_CONCURRENCY[0], max_limit: int = DEFAULT_CONCURRENCY[1],
+                 min_limit: int = MIN_CONCURRENCY, decrease: float = DECREASE_FACTOR,
+                 cooldown: float = DECREASE_COOLDOWN_SECONDS):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.counts = {SUCCESS: 0, THROTTLED: 0, TIMEOUT: 0, ERROR: 0}
+        self.decreases = 0
+        self.last_decrease = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def _take(self) -> bool:
+        if self._waiters or self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def _wake(self):
+        """Hand free slots to waiters in arrival order (called with the lock held)"""
+        while self._waiters and self.in_flight < self.limit:
+            loop, waiter = self._waiters.popleft()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if loop is None:
+                waiter.set()
+            else:
+                loop.call_soon_threadsafe(_grant, waiter)
+
+    async def acquire(self):
+        """Wait for a slot without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._take():
+                return
+            entry = (loop, loop.create_future())
+            self._waiters.append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    raise
+            # The slot was handed over as we were cancelled; give it back
+            self.release(ERROR)
+            raise
+
+    def acquire_sync(self):
+        with self._lock:
+            if self._take():
+                return
+            entry = (None, threading.Event())
+            self._waiters.append(entry)
+        entry[1].wait()
+
+    def release(self, outcome: str = SUCCESS):
+        """Free a slot and adapt the limit to how the call went"""
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            if outcome == SUCCESS:
+                # +1 per limit's worth of successes, i.e. roughly one step per round trip
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            elif outcome in (THROTTLED, TIMEOUT):
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease)
+                    self.last_decrease = now
+                    self.decreases += 1
+            self._wake()
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        outcome = ERROR
+        try:
+            yield
+            outcome = SUCCESS
+        except BaseException as e:
+            outcome = classify_outcome(e) if isinstance(e, Exception) else ERROR
+            raise
+        finally:
+            self.release(outcome)
+
+    @contextlib.contextmanager
+    def slot_sync(self) -> Iterator[None]:
+        self.acquire_sync()
+        outcome = ERROR
+        try:
+            yield
+            outcome = SUCCESS
+        except BaseException as e:
+            outcome = classify_outcome(e) if isinstance(e, Exception) else ERROR
+            raise
+        finally:
+            self.release(outcome)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "model": self.name,
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "peak_in_flight": self.peak_in_flight,
+                "max_limit": self.max_limit,
+                "decreases": self.decreases,
+                **{f"{outcome}_calls": count for outcome, count in self.counts.items()}
+            }
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+def parse_concurrency(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "model=initial:max,model=initial:max" (LIZZY_CONCURRENCY)"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        try:
+            model, values = item.split("=", 1)
+            initial, maximum = values.split(":", 1)
+            limits[model.strip()] = (int(initial), int(maximum))
+        except ValueError:
+            print(f"⚠️ Ignoring malformed concurrency limit '{item}' (expected model=initial:max)")
+    return limits
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency(model: str) -> AdaptiveLimiter:
+    """The process-wide concurrency limiter for a model"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            initial, maximum = parse_concurrency(os.getenv("LIZZY_CONCURRENCY", "")).get(model, DEFAULT_CONCURRENCY)
+            limiter = _limiters[model] = AdaptiveLimiter(model, initial, maximum)
+        return limiter
+
+
+def configure_concurrency(model: str, initial: int, max_limit: int) -> AdaptiveLimiter:
+    with _limiters_lock:
+        limiter = _limiters[model] = AdaptiveLimiter(model, initial, max_limit)
+        return limiter
+
+
+def concurrency_stats() -> List[Dict]:
+    """Current limit and in-flight count per model"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
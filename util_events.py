@@ -0,0 +1,468 @@
+"""
+Live Event Streaming for Lizzy
+In-process event bus for Transparent* pipeline callbacks, bridged to per-session Server-Sent Event streams
+"""
+
+import asyncio
+import dataclasses
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from util_async import run_sync
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+COALESCE = "coalesce"
+# Opt-in: a publisher on a plain thread waits (up to block_timeout) for room, then falls back to drop_oldest.
+# On an event loop thread it never waits, since that would stall every coroutine on the loop
+BLOCK = "block"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE, BLOCK)
+# A remote SSE client must not be able to stall the run it watches
+STREAM_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+# Terminal events close a channel once published
+TERMINAL_EVENTS = ("run_completed", "run_failed")
+
+
+def to_jsonable(data: Any) -> Any:
+    """Make callback payloads (dataclasses, datetimes, nested dicts) JSON-safe"""
+    if dataclasses.is_dataclass(data) and not isinstance(data, type):
+        return to_jsonable(dataclasses.asdict(data))
+    if isinstance(data, dict):
+        return {str(k): to_jsonable(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple, set)):
+        return [to_jsonable(v) for v in data]
+    if isinstance(data, (str, int, float, bool)) or data is None:
+        return data
+    if isinstance(data, datetime):
+        return data.isoformat()
+    return str(data)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class Subscription:
+    """One subscriber's bounded buffer; publishing never blocks on a slow reader unless it opted into BLOCK off the loop"""
+
+    def __init__(self, channel: "EventChannel", maxsize: int = 256, policy: str = DROP_OLDEST,
+                 block_timeout: float = 1.0):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.channel = channel
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.buffer = deque()
+        self.dropped = 0
+        self.delivered = 0
+        self.high_water = 0
+        self.blocked_seconds = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self.closed = False
+
+    def offer(self, event: Dict):
+        """Enqueue an event, applying the drop policy when the buffer is full"""
+        with self._cond:
+            if self.closed:
+                return
+            if self.policy == BLOCK and len(self.buffer) >= self.maxsize and not _on_event_loop():
+                start = time.monotonic()
+                deadline = start + self.block_timeout
+                while len(self.buffer) >= self.maxsize and not self.closed and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                self.blocked_seconds += time.monotonic() - start
+                if self.closed:
+                    return
+            if len(self.buffer) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.policy == COALESCE:
+                    # Replace the newest queued event of the same type so the reader sees the latest state
+                    for i in range(len(self.buffer) - 1, -1, -1):
+                        if self.buffer[i]["event"] == event["event"]:
+                            del self.buffer[i]
+                            break
+                    else:
+                        self.buffer.popleft()
+                else:
+                    self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(event)
+            self.high_water = max(self.high_water, len(self.buffer))
+            self._wake()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._wake()
+
+    def _wake(self):
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(waiter.set)
+
+    def get(self, timeout: float = None) -> Optional[Dict]:
+        """Next event, or None on timeout / when closed and drained"""
+        with self._cond:
+            if not self.buffer and not self.closed:
+                self._cond.wait(timeout)
+            return self._pop()
+
+    async def aget(self, timeout: float = None) -> Optional[Dict]:
+        """Async get for ASGI handlers; waits on an asyncio.Event instead of a thread"""
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        with self._cond:
+            event = self._pop()
+            if event is not None or self.closed:
+                return event
+            self._async_waiters.append((loop, waiter))
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.remove((loop, waiter))
+        with self._cond:
+            return self._pop()
+
+    def _pop(self) -> Optional[Dict]:
+        if self.buffer:
+            self.delivered += 1
+            event = self.buffer.popleft()
+            if self.policy == BLOCK:
+                # Wake a publisher waiting for room
+                self._cond.notify_all()
+            return event
+        return None
+
+    @property
+    def finished(self) -> bool:
+        with self._cond:
+            return self.closed and not self.buffer
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"policy": self.policy, "queued": len(self.buffer), "maxsize": self.maxsize,
+                    "high_water": self.high_water, "delivered": self.delivered, "dropped": self.dropped,
+                    "blocked_seconds": round(self.blocked_seconds, 4)}
+
+
+class BusSubscriber(Subscription):
+    """A listener with its own bounded queue, drained on a worker thread so the publisher never runs it"""
+
+    def __init__(self, bus: "EventBus", name: str, maxsize: int = 256, policy: str = DROP_OLDEST,
+                 block_timeout: float = 1.0, idle_timeout: float = 5.0):
+        super().__init__(bus, maxsize, policy, block_timeout)
+        self.name = name
+        self.routes: Dict[str, List[Callable]] = {}
+        self.idle_timeout = idle_timeout
+        self.busy = False
+        self.errors = 0
+        self.handler_seconds = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._worker = None
+
+    def route(self, event: str, handler: Callable):
+        """Call handler(data), sync or async, for each event of this type; events keep their publish order"""
+        self.routes.setdefault(event, []).append(handler)
+
+    def offer(self, event: Dict):
+        super().offer(event)
+        with self._cond:
+            # Workers exit when idle, so a quiet pipeline holds no threads
+            if self._worker is None and self.buffer and not self.closed:
+                self._worker = threading.Thread(target=self._run, name=f"lizzy-events-{self.name}", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self.buffer and not self.closed:
+                    self._cond.wait(self.idle_timeout)
+                message = self._pop()
+                if message is None:
+                    self._worker = None
+                    self._cond.notify_all()
+                    return
+                self.busy = True
+            lag = time.monotonic() - message["published_at"]
+            start = time.monotonic()
+            for handler in list(self.routes.get(message["event"], [])):
+                try:
+                    result = handler(message["data"])
+                    if inspect.isawaitable(result):
+                        run_sync(result)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Callback error: {e}")
+            with self._cond:
+                self.busy = False
+                self.handler_seconds += time.monotonic() - start
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every queued event has been handled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.buffer or self.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self._cond:
+            oldest = time.monotonic() - self.buffer[0]["published_at"] if self.buffer else 0.0
+            stats.update({
+                "subscriber": self.name,
+                "events": sorted(self.routes),
+                "errors": self.errors,
+                "lag_seconds": round(max(self.last_lag, oldest), 4),
+                "max_lag_seconds": round(max(self.max_lag, oldest), 4),
+                "avg_handler_ms": round(self.handler_seconds / self.delivered * 1000, 3) if self.delivered else 0.0
+            })
+        return stats
+
+
+class EventBus:
+    """Publish/subscribe for one pipeline; publish enqueues and returns, each subscriber drains on its own thread"""
+
+    def __init__(self, name: str = "events"):
+        self.name = name
+        self.subscribers: List[BusSubscriber] = []
+        self.published = 0
+        self._owners: Dict[int, BusSubscriber] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, maxsize: int = 256, policy: str = DROP_OLDEST,
+                  block_timeout: float = 1.0) -> BusSubscriber:
+        """New subscriber with its own queue; add handlers with route()"""
+        subscriber = BusSubscriber(self, name, maxsize, policy, block_timeout)
+        with self._lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def on(self, event: str, handler: Callable, **options) -> BusSubscriber:
+        """Route an event to handler; bound methods of one object share a queue, so they see events in order"""
+        owner = getattr(handler, "__self__", handler)
+        with self._lock:
+            subscriber = self._owners.get(id(owner))
+        if subscriber is None:
+            subscriber = self.subscribe(getattr(owner, "__qualname__", type(owner).__name__), **options)
+            with self._lock:
+                self._owners[id(owner)] = subscriber
+        subscriber.route(event, handler)
+        return subscriber
+
+    def unsubscribe(self, subscriber: BusSubscriber):
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            self._owners = {k: s for k, s in self._owners.items() if s is not subscriber}
+        subscriber.close()
+
+    def publish(self, event: str, data: Any = None) -> int:
+        """Queue an event for its subscribers and return at once; returns how many were offered it"""
+        message = {"event": event, "data": data, "published_at": time.monotonic()}
+        with self._lock:
+            self.published += 1
+            subscribers = [s for s in self.subscribers if event in s.routes]
+        for subscriber in subscribers:
+            subscriber.offer(message)
+        return len(subscribers)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Wait for subscribers to catch up, e.g. before a run's terminal event; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            subscribers = list(self.subscribers)
+        return all([s.wait_idle(max(0.0, deadline - time.monotonic())) for s in subscribers])
+
+    async def adrain(self, timeout: float = 5.0) -> bool:
+        """drain() without blocking the pipeline's event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.drain, timeout)
+
+    def close(self):
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+            self._owners = {}
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self) -> Dict:
+        """Per-subscriber queue depth, drops, publish-to-handler lag and handler time"""
+        with self._lock:
+            subscribers = list(self.subscribers)
+        return {"bus": self.name, "published": self.published, "subscribers": [s.stats() for s in subscribers]}
+
+
+class EventChannel:
+    """Events for one session/run: a short replay history plus the live subscribers"""
+
+    def __init__(self, name: str, history_size: int = 500):
+        self.name = name
+        self.history = deque(maxlen=history_size)
+        self.subscribers: List[Subscription] = []
+        self.next_id = 1
+        self.closed = False
+        self.created_at = time.time()
+        self.closed_at = None
+        self.status = {}
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Any = None) -> Dict:
+        """Record an event and fan it out; O(subscribers), never waits on a reader"""
+        with self._lock:
+            if self.closed:
+                return {}
+            message = {"id": self.next_id, "event": event, "data": to_jsonable(data),
+                       "timestamp": datetime.now().isoformat()}
+            self.next_id += 1
+            self.history.append(message)
+            self.status["last_event"] = event
+            self.status["events_published"] = message["id"]
+            subscribers = list(self.subscribers)
+            if event in TERMINAL_EVENTS:
+                self.closed = True
+                self.closed_at = time.time()
+
+        for subscription in subscribers:
+            subscription.offer(message)
+            if self.closed:
+                subscription.close()
+        return message
+
+    def subscribe(self, maxsize: int = 256, policy: str = DROP_OLDEST, last_event_id: int = 0) -> Subscription:
+        """Subscribe, replaying buffered history after last_event_id"""
+        subscription = Subscription(self, maxsize, policy)
+        with self._lock:
+            for message in self.history:
+                if message["id"] > last_event_id:
+                    subscription.offer(message)
+            if self.closed:
+                subscription.close()
+            else:
+                self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription.close()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {"channel": self.name, "closed": self.closed, **self.status,
+                    "subscribers": [s.stats() for s in self.subscribers]}
+
+
+class EventHub:
+    """Registry of per-session channels"""
+
+    def __init__(self, history_size: int = 500, retention_seconds: float = 3600):
+        self.history_size = history_size
+        self.retention_seconds = retention_seconds
+        self.channels: Dict[str, EventChannel] = {}
+        self._lock = threading.Lock()
+
+    def channel(self, name: str, create: bool = True) -> Optional[EventChannel]:
+        with self._lock:
+            self._prune()
+            if name not in self.channels and create:
+                self.channels[name] = EventChannel(name, self.history_size)
+            return self.channels.get(name)
+
+    def publish(self, name: str, event: str, data: Any = None) -> Dict:
+        return self.channel(name).publish(event, data)
+
+    def bridge(self, pipeline: Any, name: str, events: List[str] = None):
+        """Register a publisher on every callback of a Transparent* pipeline"""
+        channel = self.channel(name)
+        events = events or list(pipeline.callbacks.keys())
+        bus = getattr(pipeline, "events", None)
+        if isinstance(bus, EventBus):
+            # One queue for all events, so the channel numbers them in publish order
+            subscriber = bus.subscribe(f"channel-{name}", maxsize=1024, policy=BLOCK)
+            for event in events:
+                subscriber.route(event, lambda data, event=event: channel.publish(event, data))
+            return channel
+        for event in events:
+            pipeline.register_callback(event, lambda data, event=event: channel.publish(event, data))
+        return channel
+
+    def _prune(self):
+        now = time.time()
+        for name in [n for n, c in self.channels.items()
+                     if c.closed and c.closed_at and now - c.closed_at > self.retention_seconds]:
+            del self.channels[name]
+
+
+def format_sse(message: Dict) -> str:
+    """Encode one event in text/event-stream framing"""
+    data = json.dumps(message["data"])
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {data}\n\n"
+
+
+def _dropped_notice(subscription: Subscription, reported: int) -> Optional[str]:
+    if subscription.dropped > reported:
+        return f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped - reported})}\n\n"
+    return None
+
+
+def sse_stream(subscription: Subscription, keepalive: float = 15.0) -> Iterator[str]:
+    """Blocking SSE generator for WSGI responses; ends when the channel closes"""
+    reported = 0
+    try:
+        yield "retry: 3000\n\n"
+        while not subscription.finished:
+            message = subscription.get(timeout=keepalive)
+            notice = _dropped_notice(subscription, reported)
+            if notice:
+                reported = subscription.dropped
+                yield notice
+            yield format_sse(message) if message else ": keep-alive\n\n"
+    finally:
+        subscription.channel.unsubscribe(subscription)
+
+
+async def async_sse_stream(subscription: Subscription, keepalive: float = 15.0) -> AsyncIterator[str]:
+    """SSE generator for async routes; no thread is held while waiting"""
+    reported = 0
+    try:
+        yield "retry: 3000\n\n"
+        while not subscription.finished:
+            message = await subscription.aget(timeout=keepalive)
+            notice = _dropped_notice(subscription, reported)
+            if notice:
+                reported = subscription.dropped
+                yield notice
+            yield format_sse(message) if message else ": keep-alive\n\n"
+    finally:
+        subscription.channel.unsubscribe(subscription)
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
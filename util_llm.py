@@ -0,0 +1,283 @@
+"""
+LLM Client Utilities for Lizzy
+Pooled OpenAI clients and token streaming with latency metrics
+"""
+
+import os
+import json
+import time
+import weakref
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from util_accounting import current_operation, record_call
+from util_ratelimit import call_with_limit, call_with_limit_sync, estimate_message_tokens, estimate_tokens
+
+try:
+    from openai import AsyncOpenAI, OpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    AsyncOpenAI = OpenAI = None
+    OPENAI_AVAILABLE = False
+
+DEFAULT_MODEL = "gpt-4o-mini"
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60.0
+
+# httpx connections belong to the loop that opened them, so keep one client per event loop
+_clients = weakref.WeakKeyDictionary()
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+
+def _http_client(async_client: bool):
+    """httpx client with a bounded keep-alive pool, or None to use the SDK default"""
+    try:
+        import httpx
+        from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+    except ImportError:
+        return None
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    return DefaultAsyncHttpxClient(limits=limits) if async_client else DefaultHttpxClient(limits=limits)
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """Long-lived AsyncOpenAI client for the running loop, reusing keep-alive connections across calls"""
+    if not OPENAI_AVAILABLE:
+        raise RuntimeError("openai package not installed")
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=_http_client(True))
+        _clients[loop] = client
+    return client
+
+
+def get_client() -> "OpenAI":
+    """Process-wide OpenAI client for threaded (WSGI) callers; the SDK client is thread-safe"""
+    global _sync_client
+    if not OPENAI_AVAILABLE:
+        raise RuntimeError("openai package not installed")
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=_http_client(False))
+        return _sync_client
+
+
+class GenerationStats:
+    """Time-to-first-token, throughput and total latency for one streamed completion"""
+
+    def __init__(self):
+        # Streams are often consumed after the request handler returns, so attribution is captured up front
+        self.operation = current_operation()
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.characters = 0
+        self.usage_tokens = None
+
+    def on_chunk(self, text: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+        self.characters += len(text)
+
+    def finish(self, usage_tokens: int = None):
+        self.finished_at = time.perf_counter()
+        if usage_tokens:
+            self.usage_tokens = usage_tokens
+
+    @property
+    def tokens(self) -> int:
+        # Each streamed delta is roughly one token when the API does not report usage
+        return self.usage_tokens or self.chunks
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.first_token_at - self.started if self.first_token_at else None
+
+    @property
+    def total_time(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        generating = (self.finished_at or time.perf_counter()) - self.first_token_at
+        return self.tokens / generating if generating > 0 else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "ttft_seconds": round(self.ttft, 3) if self.ttft is not None else None,
+            "total_seconds": round(self.total_time, 3),
+            "tokens": self.tokens,
+            "tokens_per_sec": round(self.tokens_per_sec, 1) if self.tokens_per_sec else None
+        }
+
+
+async def stream_chat(messages: List[Dict], model: str = DEFAULT_MODEL, temperature: float = 0.7,
+                      max_tokens: int = None, stats: GenerationStats = None, **kwargs) -> AsyncIterator[str]:
+    """Yield text deltas from a streamed chat completion; closing the iterator aborts generation"""
+    stats = stats if stats is not None else GenerationStats()
+    params = {"model": model, "messages": messages, "temperature": temperature, "stream": True,
+              "stream_options": {"include_usage": True}, **kwargs}
+    if max_tokens:
+        params["max_tokens"] = max_tokens
+
+    stream = await call_with_limit(model, estimate_message_tokens(messages, max_tokens),
+                                   get_async_client().chat.completions.create, **params)
+    usage = None
+    error = None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                stats.on_chunk(text)
+                yield text
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        stats.finish(usage.completion_tokens if usage else None)
+        record_stream_usage(model, messages, stats, usage, error)
+        # Closing the response drops the HTTP stream, which stops generation server-side
+        await stream.close()
+
+
+def stream_chat_sync(messages: List[Dict], model: str = DEFAULT_MODEL, temperature: float = 0.7,
+                     max_tokens: int = None, stats: GenerationStats = None, **kwargs) -> Iterator[str]:
+    """Blocking twin of stream_chat for WSGI handlers; closing the generator aborts generation"""
+    stats = stats if stats is not None else GenerationStats()
+    params = {"model": model, "messages": messages, "temperature": temperature, "stream": True,
+              "stream_options": {"include_usage": True}, **kwargs}
+    if max_tokens:
+        params["max_tokens"] = max_tokens
+
+    stream = call_with_limit_sync(model, estimate_message_tokens(messages, max_tokens),
+                                  get_client().chat.completions.create, **params)
+    usage = None
+    error = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                stats.on_chunk(text)
+                yield text
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        stats.finish(usage.completion_tokens if usage else None)
+        record_stream_usage(model, messages, stats, usage, error)
+        stream.close()
+
+
+def record_stream_usage(model: str, messages: List[Dict], stats: GenerationStats, usage: Any = None,
+                        error: Exception = None):
+    """Ledger entry for a finished (or abandoned) stream; exact when the final usage chunk arrived"""
+    if usage is not None:
+        record_call("chat", model, usage.prompt_tokens, usage.completion_tokens, stats.total_time, error, True,
+                    attrs=stats.operation)
+    else:
+        record_call("chat", model, estimate_tokens(*(m.get("content") for m in messages)), stats.tokens,
+                    stats.total_time, error, attrs=stats.operation)
+
+
+def sse_token_stream(chunks: Iterator[str], stats: GenerationStats, label: str = "chat") -> Iterator[str]:
+    """Frame streamed text as SSE token/done/error events and log latency when the stream ends"""
+    event_id = 0
+    completed = False
+    try:
+        for text in chunks:
+            event_id += 1
+            yield format_token_event(event_id, "token", {"text": text})
+        completed = True
+        yield format_token_event(event_id + 1, "done", stats.to_dict())
+    except Exception as e:
+        completed = True
+        yield format_token_event(event_id + 1, "error", {"error": str(e)})
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        log_latency(label, stats, cancelled=not completed)
+
+
+async def async_sse_token_stream(chunks: AsyncIterator[str], stats: GenerationStats,
+                                 label: str = "chat") -> AsyncIterator[str]:
+    """Async version of sse_token_stream for ASGI handlers"""
+    event_id = 0
+    completed = False
+    try:
+        async for text in chunks:
+            event_id += 1
+            yield format_token_event(event_id, "token", {"text": text})
+        completed = True
+        yield format_token_event(event_id + 1, "done", stats.to_dict())
+    except Exception as e:
+        completed = True
+        yield format_token_event(event_id + 1, "error", {"error": str(e)})
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+        log_latency(label, stats, cancelled=not completed)
+
+
+def format_token_event(event_id: int, event: str, data: Dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def log_latency(label: str, stats: GenerationStats, cancelled: bool = False):
+    """One line per request with first-token and total latency"""
+    ttft = f"{stats.ttft * 1000:.0f}ms" if stats.ttft is not None else "n/a"
+    status = "cancelled" if cancelled else "done"
+    print(f"⏱️ {label} {status}: first token {ttft}, total {stats.total_time * 1000:.0f}ms, {stats.tokens} tokens")
+
+
+async def stream_completion(prompt: str, system_prompt: str = None, **kwargs) -> AsyncIterator[str]:
+    """Streaming counterpart of lightrag's gpt_4o_mini_complete(prompt, system_prompt)"""
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    async for text in stream_chat(messages, **kwargs):
+        yield text
+
+
+class TextAccumulator:
+    """Collects streamed text and flushes the running total at most every flush_interval seconds"""
+
+    def __init__(self, on_flush: Callable[[str], Any], flush_interval: float = 2.0):
+        self.on_flush = on_flush
+        self.flush_interval = flush_interval
+        self.parts = []
+        self.last_flush = time.perf_counter()
+        self.flushed_length = 0
+
+    def append(self, text: str):
+        self.parts.append(text)
+        if time.perf_counter() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def flush(self):
+        text = self.text
+        if len(text) != self.flushed_length:
+            self.on_flush(text)
+            self.flushed_length = len(text)
+        self.last_flush = time.perf_counter()
@@ -0,0 +1,294 @@
+"""
+Metrics for Lizzy
+Process-wide counters, gauges and fixed-bucket histograms, served at /metrics in Prometheus text format
+"""
+
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a fast cache hit through a slow LightRAG hybrid query or long generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+INGEST_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 3600.0)
+
+# A collector returns [(name, type, help, [(labels, value), ...]), ...] computed at scrape time
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples()]
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic total; names end in _total"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Current value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Fixed upper bounds; quantiles are computed by the scraper (histogram_quantile)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            states = [(key, [list(state[0]), state[1], state[2]]) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, (counts, total, count) in states:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics plus scrape-time collectors, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered as {metric.kind} {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                # One broken collector must not take down the whole scrape
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+_started = time.time()
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def _process_metrics() -> List[Family]:
+    return [("lizzy_process_start_time_seconds", "gauge", "Unix time the process started", [({}, _started)]),
+            ("lizzy_process_threads", "gauge", "Live Python threads", [({}, threading.active_count())])]
+
+
+REGISTRY.register_collector(_process_metrics)
+
+# Lizzy's metric families, declared once so every module records into the same series
+BUCKET_QUERY_SECONDS = REGISTRY.histogram(
+    "lizzy_bucket_query_seconds", "LightRAG bucket query latency", ("bucket", "mode"))
+BUCKET_QUERIES = REGISTRY.counter(
+    "lizzy_bucket_queries_total", "Bucket queries by outcome (ok, error, timeout, circuit_open)",
+    ("bucket", "mode", "status"))
+BUCKET_HEDGES = REGISTRY.counter(
+    "lizzy_bucket_hedged_queries_total", "Bucket queries answered by the hedged second copy", ("bucket",))
+BUCKET_CIRCUIT_OPEN = REGISTRY.gauge(
+    "lizzy_bucket_circuit_open", "1 while a bucket's circuit breaker is open", ("bucket",))
+INGEST_DOCUMENTS = REGISTRY.counter(
+    "lizzy_ingest_documents_total", "Documents inserted into buckets", ("bucket", "status"))
+INGEST_BYTES = REGISTRY.counter(
+    "lizzy_ingest_bytes_total", "Characters of document text inserted into buckets", ("bucket",))
+INGEST_SECONDS = REGISTRY.histogram(
+    "lizzy_ingest_seconds", "Time to insert one document into a bucket", ("bucket",), INGEST_BUCKETS)
+LLM_CALLS = REGISTRY.counter(
+    "lizzy_llm_calls_total", "LLM and embedding calls", ("kind", "model", "status"))
+LLM_TOKENS = REGISTRY.counter(
+    "lizzy_llm_tokens_total", "LLM and embedding tokens (estimated unless the API reported usage)",
+    ("kind", "model", "type"))
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "lizzy_llm_call_seconds", "LLM and embedding call latency, excluding rate-limit waits", ("kind", "model"))
+CACHE_REQUESTS = REGISTRY.counter(
+    "lizzy_cache_requests_total", "Cache lookups by result (hit, miss)", ("cache", "result"))
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "lizzy_db_commit_seconds", "Step log flush (batched writes plus commit) latency", ("durability",), DB_BUCKETS)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "lizzy_http_request_seconds", "HTTP request latency until the response starts", ("server", "route", "method"))
+HTTP_REQUESTS = REGISTRY.counter(
+    "lizzy_http_requests_total", "HTTP requests by status code", ("server", "route", "method", "status"))
+
+
+def observe_request(server: str, route: str, method: str, status: int, seconds: float):
+    HTTP_REQUEST_SECONDS.observe(seconds, server=server, route=route, method=method)
+    HTTP_REQUESTS.inc(server=server, route=route, method=method, status=str(status))
+
+
+def instrument_flask(app, server: Optional[str] = None):
+    """Time every request by route rule and serve /metrics on a Flask app"""
+    from flask import Response, g, request
+
+    server = server or app.import_name
+    # AsyncApp reads this so its native async routes share the Flask routes' server label
+    app.extensions["lizzy_metrics"] = server
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = getattr(g, "_metrics_started", None)
+        if started is not None:
+            # The rule, not the path, so /api/buckets/<bucket_name> stays one series
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            observe_request(server, route, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype=CONTENT_TYPE.split(";")[0],
+                        headers={"Content-Type": CONTENT_TYPE})
+
+    return app
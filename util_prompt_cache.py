@@ -0,0 +1,100 @@
+"""
+Compiled Prompt Cache for Lizzy
+Caches compiled templates per (project, template, template hash, data version)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from util_metrics import CACHE_REQUESTS
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class DataVersionTracker:
+    """Detects writes to project databases without reading any table data"""
+
+    def __init__(self):
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    def version(self, db_path: str) -> Optional[Tuple]:
+        """Changes whenever another connection commits to the database (or the file is replaced)"""
+        try:
+            stat = os.stat(db_path)
+        except OSError:
+            return None
+        wal_path = db_path + "-wal"
+        wal_mtime = os.stat(wal_path).st_mtime_ns if os.path.exists(wal_path) else 0
+
+        with self._lock:
+            conn = self._connections.get(db_path)
+            if conn is None:
+                # Read-only watcher: PRAGMA data_version only moves for commits made by *other* connections
+                conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._connections[db_path] = conn
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size, wal_mtime, data_version)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+
+class PromptCache:
+    """Thread-safe LRU of compiled prompts; stale versions simply stop being looked up"""
+
+    def __init__(self, max_entries: int = 256, tracker: DataVersionTracker = None):
+        self.max_entries = max_entries
+        self.tracker = tracker or DataVersionTracker()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, project_name: str, db_path: str, template_id: Any, template: str, kind: str = "chat") -> Tuple:
+        return (project_name, kind, template_id, template_hash(template), self.tracker.version(db_path))
+
+    def get_or_compile(self, key: Tuple, compile_fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (compiled, was_cached); compile_fn runs outside the lock on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="prompt", result="hit")
+                return self._entries[key], True
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache="prompt", result="miss")
+
+        compiled = compile_fn()
+        with self._lock:
+            # Drop older versions of the same template so dead entries don't crowd the LRU
+            prefix = key[:3] if key[2] is not None else key[:4]
+            for stale in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                del self._entries[stale]
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled, False
+
+    def invalidate(self, project_name: str = None):
+        with self._lock:
+            if project_name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == project_name]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0}
@@ -0,0 +1,347 @@
+"""
+Rate Limiting for Lizzy
+Process-wide requests-per-minute and tokens-per-minute buckets per model, shared by every LLM and embedding call
+"""
+
+import asyncio
+import dataclasses
+import functools
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from util_accounting import record_call, response_usage
+from util_concurrency import concurrency_stats, get_concurrency
+from util_metrics import REGISTRY
+from util_tracing import annotate, span
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# (requests per minute, tokens per minute); OpenAI tier-1 limits, override with LIZZY_RATE_LIMITS
+DEFAULT_LIMITS = {
+    "gpt-4o-mini": (500, 200_000),
+    "text-embedding-3-small": (3000, 1_000_000),
+    "text-embedding-ada-002": (3000, 1_000_000),
+}
+FALLBACK_LIMITS = (500, 200_000)
+
+# Completion budget counted against TPM when a call does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1024
+MAX_RETRIES = 4
+MAX_BACKOFF_SECONDS = 60.0
+
+# A 429 cuts the effective rate; each success wins some of it back
+DECREASE_FACTOR = 0.75
+RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.1
+
+
+class TokenBucket:
+    """Continuous-refill bucket; reservations may overdraw it, and the overdraft is the caller's wait"""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.limit = float(per_minute)
+        self.rate = float(per_minute)
+        self.capacity = float(capacity or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / 60.0)
+            self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount now and return how long to wait before using it"""
+        self._refill(now)
+        # A single call larger than the whole bucket would otherwise never fit
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens * 60.0 / self.rate)
+
+    def scale(self, factor: float, now: float):
+        self._refill(now)
+        self.rate = min(self.limit, max(self.limit * MIN_RATE_FRACTION, self.rate * factor))
+
+
+class ModelLimiter:
+    """RPM and TPM buckets for one model, paused by Retry-After and slowed by 429s"""
+
+    def __init__(self, model: str, rpm: float, tpm: float):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.calls = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now), self.paused_until - now)
+            self.calls += 1
+            if delay > 0:
+                self.waited += 1
+                self.wait_seconds += delay
+            return delay
+
+    async def acquire(self, tokens: int = 0):
+        """Wait (without blocking the loop) until a call of this size fits both buckets"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, tokens: int = 0):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None, attempt: int = 0) -> float:
+        """Record a 429: pause every caller of this model and lower the sustained rate; returns the pause"""
+        pause = retry_after if retry_after is not None else min(MAX_BACKOFF_SECONDS, 2.0 ** attempt)
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, now + pause)
+            self.requests.scale(DECREASE_FACTOR, now)
+            self.tokens.scale(DECREASE_FACTOR, now)
+        print(f"🚦 {self.model} rate limited, pausing {pause:.1f}s "
+              f"(now {self.requests.rate:.0f} RPM / {self.tokens.rate:.0f} TPM)")
+        return pause
+
+    def on_success(self):
+        with self._lock:
+            if self.requests.rate < self.requests.limit or self.tokens.rate < self.tokens.limit:
+                now = time.monotonic()
+                self.requests.scale(1 + RECOVERY_STEP, now)
+                self.tokens.scale(1 + RECOVERY_STEP, now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "model": self.model,
+                "rpm": round(self.requests.rate, 1), "rpm_limit": self.requests.limit,
+                "tpm": round(self.tokens.rate, 1), "tpm_limit": self.tokens.limit,
+                "calls": self.calls, "waited": self.waited, "wait_seconds": round(self.wait_seconds, 3),
+                "rate_limited": self.rate_limited,
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3)
+            }
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=rpm:tpm,model=rpm:tpm" (LIZZY_RATE_LIMITS)"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        try:
+            model, values = item.split("=", 1)
+            rpm, tpm = values.split(":", 1)
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            print(f"⚠️ Ignoring malformed rate limit '{item}' (expected model=rpm:tpm)")
+    return limits
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    """The process-wide limiter for a model"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            configured = {**DEFAULT_LIMITS, **parse_limits(os.getenv("LIZZY_RATE_LIMITS", ""))}
+            rpm, tpm = configured.get(model, FALLBACK_LIMITS)
+            limiter = _limiters[model] = ModelLimiter(model, rpm, tpm)
+        return limiter
+
+
+def configure_limits(model: str, rpm: float, tpm: float) -> ModelLimiter:
+    """Replace a model's limiter, e.g. after the account moves to a higher tier"""
+    with _limiters_lock:
+        limiter = _limiters[model] = ModelLimiter(model, rpm, tpm)
+        return limiter
+
+
+def limiter_stats() -> List[Dict]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+def llm_limit_stats() -> Dict:
+    """Rate buckets and adaptive concurrency (limit, in flight) for every model used so far"""
+    return {"rate": limiter_stats(), "concurrency": concurrency_stats()}
+
+
+def _limit_metrics() -> List[Tuple]:
+    """Scrape-time gauges for /metrics from the live limiters"""
+    rate, concurrency = limiter_stats(), concurrency_stats()
+    return [
+        ("lizzy_llm_rate_rpm", "gauge", "Current adaptive requests-per-minute budget",
+         [({"model": s["model"]}, s["rpm"]) for s in rate]),
+        ("lizzy_llm_rate_limited_total", "counter", "429 responses received",
+         [({"model": s["model"]}, s["rate_limited"]) for s in rate]),
+        ("lizzy_llm_concurrency_limit", "gauge", "Current AIMD concurrency limit",
+         [({"model": s["model"]}, s["limit"]) for s in concurrency]),
+        ("lizzy_llm_in_flight", "gauge", "Calls currently running",
+         [({"model": s["model"]}, s["in_flight"]) for s in concurrency]),
+        ("lizzy_llm_waiting", "gauge", "Calls queued for a concurrency slot",
+         [({"model": s["model"]}, s["waiting"]) for s in concurrency]),
+    ]
+
+
+REGISTRY.register_collector(_limit_metrics)
+
+
+def estimate_tokens(*texts: Any) -> int:
+    """Rough token count (four characters per token) for budgeting against TPM"""
+    return sum(len(text) for text in texts if isinstance(text, str)) // 4 + 1
+
+
+def estimate_message_tokens(messages: Iterable[Dict], max_tokens: Optional[int] = None) -> int:
+    return estimate_tokens(*(m.get("content") for m in messages or [])) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429s worth retrying; an exhausted quota is also a 429 but waiting will not fix it"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return False
+    return "insufficient_quota" not in str(error)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait from the error's Retry-After headers or 'try again in 1.2s' message"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    match = re.search(r"try again in ([\d.]+)\s*(ms|s)", str(error))
+    if match:
+        value = float(match.group(1))
+        return value / 1000.0 if match.group(2) == "ms" else value
+    return None
+
+
+# usage(result) -> (prompt_tokens, completion_tokens, exact), or None when the caller accounts for the call itself
+Usage = Callable[[Any], Optional[Tuple[int, int, bool]]]
+
+
+def _account(kind: str, model: str, usage: Usage, result: Any, started: float, attempt: int,
+             error: Exception = None):
+    counted = usage(None if error is not None else result)
+    if counted is None and error is None:
+        # e.g. a stream, whose size is only known once the caller has consumed it
+        return
+    prompt_tokens, completion_tokens, exact = counted or (0, 0, False)
+    record_call(kind, model, prompt_tokens, completion_tokens, time.perf_counter() - started, error, exact, attempt)
+
+
+async def _call(model: str, tokens: int, kind: str, usage: Usage, func: Callable, args: tuple, kwargs: Dict,
+                phase: str = None) -> Any:
+    limiter = get_limiter(model)
+    slots = get_concurrency(model)
+    with span(f"{kind}.{phase}" if phase else kind, "llm", model=model, budget_tokens=tokens):
+        for attempt in range(MAX_RETRIES + 1):
+            with span("rate_limit_wait", "llm"):
+                await limiter.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                async with slots.slot():
+                    result = await func(*args, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    _account(kind, model, usage, None, started, attempt, e)
+                    raise
+                limiter.on_rate_limited(retry_after(e), attempt)
+                continue
+            limiter.on_success()
+            annotate(attempts=attempt + 1)
+            _account(kind, model, usage, result, started, attempt)
+            return result
+
+
+def _call_sync(model: str, tokens: int, kind: str, usage: Usage, func: Callable, args: tuple, kwargs: Dict) -> Any:
+    limiter = get_limiter(model)
+    slots = get_concurrency(model)
+    with span(kind, "llm", model=model, budget_tokens=tokens):
+        for attempt in range(MAX_RETRIES + 1):
+            with span("rate_limit_wait", "llm"):
+                limiter.acquire_sync(tokens)
+            started = time.perf_counter()
+            try:
+                with slots.slot_sync():
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    _account(kind, model, usage, None, started, attempt, e)
+                    raise
+                limiter.on_rate_limited(retry_after(e), attempt)
+                continue
+            limiter.on_success()
+            annotate(attempts=attempt + 1)
+            _account(kind, model, usage, result, started, attempt)
+            return result
+
+
+async def call_with_limit(model: str, tokens: int, func: Callable, /, *args, **kwargs) -> Any:
+    """Await func(*args, **kwargs) once the model's buckets and concurrency limit allow it, retrying on 429
+
+    Responses carrying an OpenAI usage block are recorded in the usage ledger; streams are recorded by the caller.
+    """
+    return await _call(model, tokens, "chat", response_usage, func, args, kwargs)
+
+
+def call_with_limit_sync(model: str, tokens: int, func: Callable, /, *args, **kwargs) -> Any:
+    """Blocking twin of call_with_limit for threaded callers"""
+    return _call_sync(model, tokens, "chat", response_usage, func, args, kwargs)
+
+
+def limit_llm(func: Callable, model: str = DEFAULT_MODEL) -> Callable:
+    """Rate-limited version of a LightRAG-style completion func(prompt, system_prompt=None, history_messages=None)"""
+    if getattr(func, "rate_limited", False):
+        return func
+
+    @functools.wraps(func)
+    async def limited(prompt, *args, **kwargs):
+        history = kwargs.get("history_messages") or []
+        messages = [{"content": prompt}, {"content": kwargs.get("system_prompt")}, *history]
+        prompt_tokens = estimate_tokens(*(m.get("content") for m in messages))
+
+        def usage(result):
+            # LightRAG completions return bare text (or an iterator when streaming), so both sides are estimates
+            return prompt_tokens, estimate_tokens(result) if isinstance(result, str) else 0, False
+
+        tokens = estimate_message_tokens(messages, kwargs.get("max_tokens"))
+        # LightRAG's query path is keyword extraction, vector/graph retrieval, then the answer; name the LLM phases
+        phase = "keywords" if kwargs.get("keyword_extraction") else None
+        return await _call(model, tokens, "llm", usage, func, (prompt, *args), kwargs, phase)
+
+    limited.rate_limited = True
+    return limited
+
+
+def limit_embedding(func: Any, model: str = DEFAULT_EMBEDDING_MODEL) -> Any:
+    """Rate-limited embedding function; LightRAG's EmbeddingFunc keeps its dimension attributes"""
+    if dataclasses.is_dataclass(func) and hasattr(func, "func"):
+        return dataclasses.replace(func, func=limit_embedding(func.func, model))
+    if getattr(func, "rate_limited", False):
+        return func
+
+    @functools.wraps(func)
+    async def limited(texts, *args, **kwargs):
+        tokens = estimate_tokens(*texts)
+        return await _call(model, tokens, "embedding", lambda result: (tokens, 0, False), func, (texts, *args), kwargs)
+
+    limited.rate_limited = True
+    return limited
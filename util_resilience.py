@@ -0,0 +1,142 @@
+"""
+Resilience Utilities for Lizzy
+Circuit breakers, rolling latency percentiles and hedged calls for slow or failing dependencies
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_timeout one probe call decides"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open state only a single probe is let through"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self.probe_in_flight):
+                if self.state == HALF_OPEN:
+                    self.probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.probe_in_flight = False
+
+    def record_cancelled(self):
+        """The call was abandoned by its caller: no verdict, but a half-open probe slot is freed for the next call"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, error: str = None):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"⛔ Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "failures": self.failures,
+                "successes": self.successes,
+                "rejected": self.rejected,
+                "retry_in_seconds": round(retry_in, 1),
+                "last_error": self.last_error
+            }
+
+
+class LatencyWindow:
+    """Durations of the most recent calls, for percentile-based hedging"""
+
+    def __init__(self, size: int = 100):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        # Nearest-rank percentile
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))]
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], hedge_after: Optional[float]) -> Tuple[Any, bool]:
+    """(result, was_hedged) of call(); a second copy starts after hedge_after seconds and the first success wins"""
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        if hedge_after is None:
+            return await tasks[0], False
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return tasks[0].result(), False
+
+        tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), True
+                error = task.exception()
+        raise error
+    finally:
+        # The loser (or both, if we were cancelled) must not keep running
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
@@ -0,0 +1,145 @@
+"""
+Template Engine for Lizzy
+Parses {context.*}, {sql.*} and {lightrag.*|guidance|mode|focus} placeholders once and renders in a single pass
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# {name}, {context.project.name}, {sql.characters}, {lightrag.books|guidance:"..."|mode:"hybrid"|focus:7}
+PLACEHOLDER = r'\{([A-Za-z_][\w-]*(?:\.[\w-]+)*)((?:\|\w+:(?:"[^"]*"|[^|{}"]*))*)\}'
+PLACEHOLDER_PATTERN = re.compile(PLACEHOLDER)
+ESCAPED_PLACEHOLDER_PATTERN = re.compile(r'\{\{|\}\}|' + PLACEHOLDER)
+OPTION_PATTERN = re.compile(r'\|(\w+):(?:"([^"]*)"|([^|{}"]*))')
+
+# Resolver result for placeholders that should be left in the output untouched
+UNRESOLVED = object()
+
+
+class MissingKeysError(KeyError):
+    """Raised before rendering when a strict render has placeholders with no value"""
+
+    def __init__(self, keys: List[str]):
+        super().__init__(keys[0])
+        self.keys = keys
+
+    def __str__(self) -> str:
+        return ", ".join(repr(key) for key in self.keys)
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    """One {namespace.name|option:value} reference in a template"""
+    raw: str
+    path: Tuple[str, ...]
+    options: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def namespace(self) -> Optional[str]:
+        return self.path[0] if len(self.path) > 1 else None
+
+    @property
+    def name(self) -> str:
+        return ".".join(self.path[1:]) if len(self.path) > 1 else self.path[0]
+
+    @property
+    def key(self) -> str:
+        return ".".join(self.path)
+
+    def option(self, name: str, default: Any = None) -> Any:
+        return dict(self.options).get(name, default)
+
+
+@dataclass
+class Template:
+    """Parsed template: literal text interleaved with placeholders"""
+    source: str
+    nodes: List[Union[str, Placeholder]] = field(default_factory=list)
+
+    @property
+    def placeholders(self) -> List[Placeholder]:
+        return [node for node in self.nodes if isinstance(node, Placeholder)]
+
+    def namespace(self, namespace: str) -> List[Placeholder]:
+        """Placeholders of one namespace, first occurrence of each only"""
+        seen, found = set(), []
+        for placeholder in self.placeholders:
+            if placeholder.namespace == namespace and placeholder not in seen:
+                seen.add(placeholder)
+                found.append(placeholder)
+        return found
+
+    def missing(self, resolve: Callable[[Placeholder], Any]) -> List[str]:
+        return sorted({p.key for p in self.placeholders if resolve(p) is UNRESOLVED})
+
+    def render(self, resolve: Callable[[Placeholder], Any], strict: bool = False) -> str:
+        """Render in one pass; each distinct placeholder is resolved once"""
+        values = {}
+        for placeholder in self.placeholders:
+            if placeholder not in values:
+                values[placeholder] = resolve(placeholder)
+
+        if strict:
+            missing = sorted({p.key for p, v in values.items() if v is UNRESOLVED})
+            if missing:
+                raise MissingKeysError(missing)
+
+        parts = []
+        for node in self.nodes:
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                value = values[node]
+                parts.append(node.raw if value is UNRESOLVED else str(value))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=512)
+def parse_template(source: str, brace_escapes: bool = False) -> Template:
+    """Tokenize a template once (cached by source); brace_escapes treats {{ and }} like str.format"""
+    template = Template(source)
+    position = 0
+    text = []
+    pattern = ESCAPED_PLACEHOLDER_PATTERN if brace_escapes else PLACEHOLDER_PATTERN
+    for match in pattern.finditer(source):
+        token = match.group(0)
+        if token in ("{{", "}}"):
+            text.append(source[position:match.start()] + token[0])
+            position = match.end()
+            continue
+
+        text.append(source[position:match.start()])
+        literal = "".join(text)
+        if literal:
+            template.nodes.append(literal)
+        text = []
+        options = tuple((m.group(1), m.group(2) if m.group(2) is not None else m.group(3).strip())
+                        for m in OPTION_PATTERN.finditer(match.group(2) or ""))
+        template.nodes.append(Placeholder(token, tuple(match.group(1).split(".")), options))
+        position = match.end()
+
+    text.append(source[position:])
+    literal = "".join(text)
+    if literal:
+        template.nodes.append(literal)
+    return template
+
+
+def lookup(values: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    """Resolve a dotted path through dicts and object attributes"""
+    current = values
+    for part in path:
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        elif not isinstance(current, dict) and hasattr(current, part):
+            current = getattr(current, part)
+        else:
+            return UNRESOLVED
+    return current
+
+
+def render_values(source: str, values: Dict[str, Any], strict: bool = True, brace_escapes: bool = True) -> str:
+    """Drop-in for source.format(**values): missing keys are reported together, before rendering"""
+    return parse_template(source, brace_escapes).render(lambda p: lookup(values, p.path), strict)
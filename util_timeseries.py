@@ -0,0 +1,321 @@
+"""
+Time-Series Rollups for Lizzy
+Per-minute, per-hour and per-day rollups (count, sum, min, max, percentile sketch) maintained as events arrive
+"""
+
+import atexit
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+# Fine-grained rows age out; daily rows are kept forever (one row per bucket, mode and day)
+RETENTION = {"minute": 2 * 86400, "hour": 90 * 86400, "day": None}
+GROUP_FIELDS = ("start", "bucket", "mode")
+FLUSH_EVENTS = 50
+FLUSH_SECONDS = 5.0
+
+TIMESERIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    metric TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    mode TEXT NOT NULL DEFAULT '',
+    resolution TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (metric, resolution, bucket, mode, start)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_resolution_start ON rollups(resolution, start);
+"""
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch (DDSketch-style): every quantile is within relative_accuracy, and merging is adding counts"""
+
+    MAX_BINS = 2048
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self.bins: Dict[int, int] = {}
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= self.min_value:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.MAX_BINS:
+            # Fold the smallest bins together; only the lowest quantiles lose accuracy
+            lowest = sorted(self.bins)[:len(self.bins) - self.MAX_BINS + 1]
+            folded = sum(self.bins.pop(i) for i in lowest)
+            self.bins[lowest[-1]] = self.bins.get(lowest[-1], 0) + folded
+
+    def merge(self, other: "QuantileSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        # Nearest rank, as LatencyWindow.percentile does
+        rank = max(1, math.ceil(q * total))
+        seen = self.zero_count
+        if rank <= seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({"a": self.relative_accuracy, "z": self.zero_count, "b": self.bins}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "QuantileSketch":
+        raw = json.loads(data)
+        sketch = cls(raw.get("a", 0.01))
+        sketch.zero_count = raw.get("z", 0)
+        sketch.bins = {int(index): count for index, count in raw.get("b", {}).items()}
+        return sketch
+
+
+class Rollup:
+    """Count, sum, min, max and a quantile sketch for one series over one interval"""
+
+    __slots__ = ("count", "sum", "min", "max", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: "Rollup"):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @classmethod
+    def from_row(cls, count: int, total: float, low: float, high: float, sketch: str) -> "Rollup":
+        rollup = cls()
+        rollup.count, rollup.sum, rollup.min, rollup.max = count, total, low, high
+        rollup.sketch = QuantileSketch.from_json(sketch)
+        return rollup
+
+    def to_dict(self) -> Dict:
+        if not self.count:
+            return {"count": 0, "sum": 0.0, "avg": 0.0, "min": 0.0, "max": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "p50": round(self.sketch.quantile(0.5), 3),
+            "p95": round(self.sketch.quantile(0.95), 3),
+            "p99": round(self.sketch.quantile(0.99), 3)
+        }
+
+
+def interval_start(timestamp: float, resolution: str) -> int:
+    """Start of the minute / hour / local calendar day containing timestamp"""
+    if resolution == "day":
+        return int(datetime.fromtimestamp(timestamp).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+    seconds = RESOLUTIONS[resolution]
+    return int(timestamp // seconds * seconds)
+
+
+class TimeSeriesStore:
+    """SQLite rollups updated incrementally per event; a trend query reads one row per series and interval"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit so flushes can take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(TIMESERIES_SCHEMA)
+        self.pending: Dict[Tuple[str, str, str, str, int], Rollup] = {}
+        self.pending_events = 0
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, bucket: str, value: float, mode: str = "", timestamp: float = None):
+        """Fold one event into its minute, hour and day rollups"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                key = (metric, bucket, mode or "", resolution, interval_start(timestamp, resolution))
+                rollup = self.pending.get(key)
+                if rollup is None:
+                    rollup = self.pending[key] = Rollup()
+                rollup.add(value)
+            self.pending_events += 1
+            if self.pending_events >= FLUSH_EVENTS or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+                try:
+                    self._flush()
+                except sqlite3.Error as e:
+                    # Pending rollups stay in memory and go out with the next flush
+                    print(f"⚠️ Could not save time-series rollups: {e}")
+
+    def _flush(self):
+        if self.pending:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, rollup in self.pending.items():
+                    metric, bucket, mode, resolution, start = key
+                    row = self.conn.execute(
+                        "SELECT count, sum, min, max, sketch FROM rollups "
+                        "WHERE metric = ? AND resolution = ? AND bucket = ? AND mode = ? AND start = ?",
+                        (metric, resolution, bucket, mode, start)).fetchone()
+                    if row is not None:
+                        stored = Rollup.from_row(*row)
+                        stored.merge(rollup)
+                        rollup = stored
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO rollups (metric, bucket, mode, resolution, start, count, sum, min, max, "
+                        "sketch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (metric, bucket, mode, resolution, start, rollup.count, rollup.sum, rollup.min, rollup.max,
+                         rollup.sketch.to_json()))
+                now = time.time()
+                for resolution, keep in RETENTION.items():
+                    if keep is not None:
+                        self.conn.execute("DELETE FROM rollups WHERE resolution = ? AND start < ?",
+                                          (resolution, now - keep))
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.pending = {}
+            self.pending_events = 0
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            try:
+                self._flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not save time-series rollups: {e}")
+
+    def query(self, metric: str, resolution: str = "day", since: float = None, until: float = None,
+              by: Sequence[str] = ("start",), bucket: str = None, mode: str = None) -> List[Dict]:
+        """Rollups merged over every field not in by, ordered by the by fields"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}' (expected one of {', '.join(RESOLUTIONS)})")
+        for field in by:
+            if field not in GROUP_FIELDS:
+                raise ValueError(f"Cannot group rollups by '{field}'")
+        clauses, params = ["metric = ?", "resolution = ?"], [metric, resolution]
+        if bucket is not None:
+            clauses.append("bucket = ?")
+            params.append(bucket)
+        if mode is not None:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if since is not None:
+            clauses.append("start >= ?")
+            params.append(interval_start(since, resolution))
+        if until is not None:
+            clauses.append("start < ?")
+            params.append(until)
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT start, bucket, mode, count, sum, min, max, sketch FROM rollups WHERE {' AND '.join(clauses)}",
+                params).fetchall()
+        merged: Dict[Tuple, Rollup] = {}
+        for start, row_bucket, row_mode, *values in rows:
+            fields = {"start": start, "bucket": row_bucket, "mode": row_mode}
+            group = tuple(fields[field] for field in by)
+            rollup = merged.get(group)
+            if rollup is None:
+                rollup = merged[group] = Rollup()
+            rollup.merge(Rollup.from_row(*values))
+        return [{**dict(zip(by, group)), **merged[group].to_dict()} for group in sorted(merged)]
+
+    def total(self, metric: str, resolution: str = "day", since: float = None, **filters) -> Dict:
+        rows = self.query(metric, resolution, since=since, by=(), **filters)
+        return rows[0] if rows else Rollup().to_dict()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not self.pending and self.conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None
+
+    def backfill(self, metric: str, events: Iterable[Tuple[float, str, str, float]]) -> int:
+        """Load historical (timestamp, bucket, mode, value) events, e.g. the old capped query_history"""
+        loaded = 0
+        for timestamp, bucket, mode, value in events:
+            self.record(metric, bucket, value, mode, timestamp)
+            loaded += 1
+        self.flush()
+        return loaded
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+        # The next get_timeseries() for this path opens a fresh connection instead of returning this one
+        with _stores_lock:
+            for key in [key for key, store in _stores.items() if store is self]:
+                del _stores[key]
+
+
+_stores: Dict[str, TimeSeriesStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_timeseries(path: str, seed: Optional[Callable[[TimeSeriesStore], None]] = None) -> TimeSeriesStore:
+    """The process-wide store for path; seed runs once, when the store is first opened"""
+    key = path if path == ":memory:" else os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if not _stores:
+                atexit.register(flush_timeseries)
+            store = _stores[key] = TimeSeriesStore(path)
+            if seed is not None:
+                seed(store)
+        return store
+
+
+def flush_timeseries():
+    """Save pending rollups of every open store (registered once, at exit)"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush()
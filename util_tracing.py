@@ -0,0 +1,214 @@
+"""
+Tracing for Lizzy
+Nested timing spans through the pipelines, exported as Chrome trace / Perfetto JSON for flamegraphs
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Spans are only collected inside trace_session(); set LIZZY_TRACE=1 to have the pipelines open one per session
+TRACE_ENV = "LIZZY_TRACE"
+# A runaway loop should not hold a whole session's spans in memory
+MAX_SPANS = 200_000
+
+
+def tracing_enabled() -> bool:
+    return os.getenv(TRACE_ENV, "0") == "1"
+
+
+class Span:
+    """One timed block; Chrome's "X" (complete) event"""
+
+    __slots__ = ("name", "category", "args", "start", "end", "tid", "parent")
+
+    def __init__(self, name: str, category: str, args: Dict, tid: int, parent: Optional["Span"]):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter()
+        self.end = None
+        self.tid = tid
+        self.parent = parent
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class Trace:
+    """Finished spans of one session; each thread and asyncio task gets its own track so nesting stays valid"""
+
+    def __init__(self, name: str, **metadata):
+        self.name = name
+        self.metadata = metadata
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.path = None
+        self._tracks: Dict[tuple, int] = {}
+        self._track_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def track(self) -> int:
+        """Track id for the calling thread / task"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = (threading.get_ident(), id(task) if task is not None else None)
+        with self._lock:
+            tid = self._tracks.get(key)
+            if tid is None:
+                tid = self._tracks[key] = len(self._tracks) + 1
+                thread = threading.current_thread().name
+                self._track_names[tid] = f"{thread} / {task.get_name()}" if task is not None else thread
+            return tid
+
+    def add(self, span: Span):
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+            else:
+                self.spans.append(span)
+
+    def to_chrome(self) -> Dict:
+        """{"traceEvents": [...]} loadable in ui.perfetto.dev or chrome://tracing"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            track_names = dict(self._track_names)
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"lizzy {self.name}"}}]
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                   for tid, name in track_names.items()]
+        for span in sorted(spans, key=lambda s: s.start):
+            args = dict(span.args)
+            if span.parent is not None and span.parent.tid != span.tid:
+                # Spans started in another task are on their own track; keep the link visible
+                args["parent"] = span.parent.name
+            events.append({
+                "name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": span.tid,
+                "ts": round((span.start - self.started) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "args": args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"trace": self.name, "started_at": self.started_at, "dropped_spans": self.dropped,
+                              **{k: str(v) for k, v in self.metadata.items()}}}
+
+    def summary(self) -> List[Dict]:
+        """Count and total time per span name, slowest first"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span.name, {"name": span.name, "category": span.category,
+                                                  "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration * 1000.0
+            entry["max_ms"] = max(entry["max_ms"], span.duration * 1000.0)
+        for entry in totals.values():
+            entry["total_ms"] = round(entry["total_ms"], 1)
+            entry["max_ms"] = round(entry["max_ms"], 1)
+        return sorted(totals.values(), key=lambda e: e["total_ms"], reverse=True)
+
+    def export(self, path: str) -> str:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f, default=str)
+        self.path = path
+        return path
+
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("lizzy_trace", default=None)
+_span: contextvars.ContextVar = contextvars.ContextVar("lizzy_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "pipeline", **args) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span; a no-op outside trace_session()"""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, category, args, trace.track(), _span.get())
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.args["error"] = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _span.reset(token)
+        trace.add(current)
+
+
+def annotate(**args):
+    """Attach details (tokens, hit/miss, counts) to the innermost open span"""
+    current = _span.get()
+    if current is not None:
+        current.args.update(args)
+
+
+def traced(name: str = None, category: str = "pipeline") -> Callable:
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__qualname__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(label, category):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_path(directory: str, name: str) -> str:
+    """<directory>/<name>.json, or .2.json, .3.json... when a resumed session already has a trace"""
+    path = os.path.join(directory, f"{name}.json")
+    attempt = 1
+    while os.path.exists(path):
+        attempt += 1
+        path = os.path.join(directory, f"{name}.{attempt}.json")
+    return path
+
+
+@contextlib.contextmanager
+def trace_session(name: str, directory: str = None, enabled: bool = None, **metadata) -> Iterator[Optional[Trace]]:
+    """Collect spans for one session and write them to directory when it ends (enabled defaults to LIZZY_TRACE)"""
+    if not (tracing_enabled() if enabled is None else enabled) or _trace.get() is not None:
+        # Disabled, or already inside a trace: nested sessions add to the outer one
+        yield _trace.get()
+        return
+    trace = Trace(name, **metadata)
+    trace_token = _trace.set(trace)
+    try:
+        with span(name, "session"):
+            yield trace
+    finally:
+        _trace.reset(trace_token)
+        if directory:
+            try:
+                path = trace.export(trace_path(directory, name))
+                print(f"🔥 Trace written to {path} ({len(trace.spans)} spans; open in ui.perfetto.dev)")
+            except OSError as e:
+                print(f"⚠️ Could not write trace for {name}: {e}")
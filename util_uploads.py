@@ -0,0 +1,318 @@
+"""
+Streaming Upload Handling for Lizzy
+Parses multipart uploads chunk by chunk, spooling files straight to the bucket directory
+"""
+
+import hashlib
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_FILE_SIZE = 100 * 1024 * 1024
+DEFAULT_MAX_TOTAL_SIZE = 500 * 1024 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+UPLOAD_INDEX_FILE = "upload_index.json"
+
+
+class UploadError(Exception):
+    """Rejected upload, carrying the HTTP status to return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def safe_filename(filename: str) -> str:
+    """Strip directories and unsafe characters from a client-supplied filename"""
+    filename = os.path.basename(filename.replace("\\", "/")).strip()
+    filename = re.sub(r"[^A-Za-z0-9._ -]", "_", filename).strip(" .")
+    return filename or "document.txt"
+
+
+def is_multipart(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith("multipart/form-data")
+
+
+def _header_params(value: str) -> Dict[str, str]:
+    """Parse 'form-data; name="file"; filename="a.txt"' into a dict"""
+    params = {}
+    for match in re.finditer(r';\s*([\w*-]+)=(?:"((?:[^"\\]|\\.)*)"|([^;]*))', value):
+        params[match.group(1).lower()] = match.group(2) if match.group(2) is not None else match.group(3).strip()
+    return params
+
+
+def load_upload_index(bucket_dir: str) -> Dict[str, Dict]:
+    """sha256 -> {filename, size, uploaded_at} for everything still in a bucket"""
+    index_file = os.path.join(bucket_dir, UPLOAD_INDEX_FILE)
+    if not os.path.exists(index_file):
+        return {}
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    # An entry whose file is gone would turn the next upload of those bytes into a "duplicate" of nothing
+    return {digest: entry for digest, entry in index.items()
+            if entry.get("filename") and os.path.exists(os.path.join(bucket_dir, entry["filename"]))}
+
+
+def save_upload_index(bucket_dir: str, index: Dict[str, Dict]):
+    index_file = os.path.join(bucket_dir, UPLOAD_INDEX_FILE)
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_file, index_file)
+
+
+def hash_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def final_path(dest_dir: str, filename: str, digest: str) -> str:
+    """filename in dest_dir, or name-2.ext, name-3.ext... when a different file already has that name"""
+    stem, ext = os.path.splitext(filename)
+    path, attempt = os.path.join(dest_dir, filename), 1
+    while os.path.exists(path) and hash_file(path) != digest:
+        attempt += 1
+        path = os.path.join(dest_dir, f"{stem}-{attempt}{ext}")
+    return path
+
+
+def index_files(index: Dict[str, Dict], files: List[Dict]):
+    """Add {filename, sha256, size} files to an upload index in place"""
+    written = {info["filename"]: info["sha256"] for info in files}
+    for digest in [d for d, entry in index.items() if written.get(entry.get("filename"), d) != d]:
+        # An entry naming a file that now holds other bytes would misreport future uploads as duplicates
+        del index[digest]
+    for info in files:
+        index[info["sha256"]] = {"filename": info["filename"], "size": info["size"],
+                                 "uploaded_at": datetime.now().isoformat()}
+
+
+class MultipartSpooler:
+    """Streams a multipart/form-data body to disk, hashing each file and enforcing size limits"""
+
+    def __init__(self, dest_dir: str, max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+                 max_total_size: int = DEFAULT_MAX_TOTAL_SIZE, allowed_extensions: List[str] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.dest_dir = dest_dir
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.allowed_extensions = {e.lower() for e in allowed_extensions} if allowed_extensions else None
+        self.chunk_size = chunk_size
+
+    def spool(self, stream: BinaryIO, content_type: str, known_hashes: Dict[str, Dict] = None) -> Dict:
+        """Parse the body; returns {"files": [...], "fields": {...}}. Duplicates (by sha256) are not kept"""
+        boundary = _header_params(content_type or "").get("boundary")
+        if not is_multipart(content_type) or not boundary:
+            raise UploadError("Expected multipart/form-data with a boundary")
+
+        known_hashes = known_hashes if known_hashes is not None else {}
+        self._files, self._fields, self._temp_paths, self._handles = [], {}, [], []
+        # Files stay as .part until the whole body has parsed, so a rejected request leaves nothing behind
+        self._staged, self._duplicates, self._finalized = [], [], []
+        self._new_hashes: Dict[str, Dict] = {}
+        self._total = 0
+        try:
+            self._parse(stream, boundary.encode("latin-1"), known_hashes)
+            self._commit(known_hashes)
+        except Exception:
+            for handle in self._handles:
+                handle.close()
+            for path in self._temp_paths + self._finalized:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return {"files": self._files, "fields": self._fields}
+
+    def _parse(self, stream: BinaryIO, boundary: bytes, known_hashes: Dict[str, Dict]):
+        delimiter = b"\r\n--" + boundary
+        # Prefix CRLF so the opening boundary matches the same delimiter as the rest
+        buffer = b"\r\n"
+        part = None
+        state = "preamble"
+        eof = False
+
+        while True:
+            if not eof:
+                chunk = stream.read(self.chunk_size)
+                if chunk:
+                    buffer += chunk
+                else:
+                    eof = True
+
+            progressed = True
+            while progressed:
+                progressed = False
+                if state in ("preamble", "body"):
+                    index = buffer.find(delimiter)
+                    if index == -1:
+                        # Keep a tail that might hold the start of a split delimiter
+                        keep = len(delimiter) + 1
+                        if state == "body" and len(buffer) > keep:
+                            self._write_part(part, buffer[:-keep])
+                            buffer = buffer[-keep:]
+                        elif state == "preamble" and len(buffer) > keep:
+                            buffer = buffer[-keep:]
+                        break
+                    if state == "body":
+                        self._write_part(part, buffer[:index])
+                        self._finish_part(part, known_hashes)
+                        part = None
+                    buffer = buffer[index + len(delimiter):]
+                    state = "after_boundary"
+                    progressed = True
+
+                if state == "after_boundary":
+                    if len(buffer) < 2:
+                        break
+                    if buffer.startswith(b"--"):
+                        return
+                    line_end = buffer.find(b"\r\n")
+                    if line_end == -1:
+                        break
+                    buffer = buffer[line_end + 2:]
+                    state = "headers"
+                    progressed = True
+
+                if state == "headers":
+                    header_end = buffer.find(b"\r\n\r\n")
+                    if header_end == -1:
+                        if len(buffer) > MAX_FIELD_SIZE:
+                            raise UploadError("Multipart headers too large")
+                        break
+                    part = self._start_part(buffer[:header_end].decode("utf-8", "replace"))
+                    buffer = buffer[header_end + 4:]
+                    state = "body"
+                    progressed = True
+
+            if eof:
+                raise UploadError("Truncated multipart body")
+
+    def _start_part(self, raw_headers: str) -> Dict:
+        headers = {}
+        for line in raw_headers.split("\r\n"):
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        disposition = _header_params(headers.get("content-disposition", ""))
+        part = {"name": disposition.get("name", ""), "size": 0}
+
+        if "filename" not in disposition:
+            part["field"] = []
+            return part
+
+        filename = safe_filename(disposition["filename"])
+        if self.allowed_extensions and os.path.splitext(filename)[1].lower() not in self.allowed_extensions:
+            raise UploadError(f"File type not allowed: {filename}", 415)
+
+        temp_path = os.path.join(self.dest_dir, f".upload-{uuid.uuid4().hex}.part")
+        self._temp_paths.append(temp_path)
+        handle = open(temp_path, 'wb')
+        self._handles.append(handle)
+        part.update({
+            "filename": filename,
+            "content_type": headers.get("content-type", "application/octet-stream"),
+            "temp_path": temp_path,
+            "handle": handle,
+            "sha256": hashlib.sha256()
+        })
+        return part
+
+    def _write_part(self, part: Dict, data: bytes):
+        if not data:
+            return
+        part["size"] += len(data)
+        if "field" in part:
+            if part["size"] > MAX_FIELD_SIZE:
+                raise UploadError(f"Form field too large: {part['name']}", 413)
+            part["field"].append(data)
+            return
+
+        self._total += len(data)
+        if part["size"] > self.max_file_size:
+            raise UploadError(f"{part['filename']} exceeds the {self.max_file_size // (1024 * 1024)} MB file limit", 413)
+        if self._total > self.max_total_size:
+            raise UploadError(f"Upload exceeds the {self.max_total_size // (1024 * 1024)} MB request limit", 413)
+        part["sha256"].update(data)
+        part["handle"].write(data)
+
+    def _finish_part(self, part: Dict, known_hashes: Dict[str, Dict]):
+        if "field" in part:
+            self._fields[part["name"]] = b"".join(part["field"]).decode("utf-8", "replace")
+            return
+
+        part["handle"].close()
+        digest = part["sha256"].hexdigest()
+        info = {"filename": part["filename"], "size": part["size"], "sha256": digest,
+                "content_type": part["content_type"], "duplicate": False}
+
+        if digest in known_hashes:
+            # Same bytes already in the bucket - drop the spooled copy
+            os.remove(part["temp_path"])
+            info["duplicate"] = True
+            info["duplicate_of"] = known_hashes[digest].get("filename")
+        elif digest in self._new_hashes:
+            # Same bytes earlier in this request; its final name is only known after _commit
+            os.remove(part["temp_path"])
+            info["duplicate"] = True
+            self._duplicates.append((info, self._new_hashes[digest]))
+        else:
+            self._new_hashes[digest] = info
+            self._staged.append((info, part["temp_path"]))
+        self._files.append(info)
+
+    def _commit(self, known_hashes: Dict[str, Dict]):
+        """Move the staged files into place and index them"""
+        for info, temp_path in self._staged:
+            path = final_path(self.dest_dir, info["filename"], info["sha256"])
+            os.replace(temp_path, path)
+            self._finalized.append(path)
+            info["path"] = path
+            info["filename"] = os.path.basename(path)
+        for info, original in self._duplicates:
+            info["duplicate_of"] = original["filename"]
+        index_files(known_hashes, [info for info, _ in self._staged])
+
+
+def spool_request_files(stream: BinaryIO, content_type: str, bucket_dir: str, **limits) -> Dict:
+    """Spool a multipart request into bucket_dir with dedup against the bucket's upload index"""
+    index = load_upload_index(bucket_dir)
+    result = MultipartSpooler(bucket_dir, **limits).spool(stream, content_type, index)
+    if any(not f["duplicate"] for f in result["files"]):
+        save_upload_index(bucket_dir, index)
+    return result
+
+
+def save_upload(bucket_dir: str, filename: str, content) -> Dict:
+    """Save a JSON-body upload like a spooled part: hashed before the bucket is touched, never overwriting by name"""
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    digest = hashlib.sha256(data).hexdigest()
+    info = {"filename": safe_filename(filename), "size": len(data), "sha256": digest, "duplicate": False}
+    index = load_upload_index(bucket_dir)
+    if digest in index:
+        info["duplicate"] = True
+        info["duplicate_of"] = index[digest]["filename"]
+        return info
+
+    temp_path = os.path.join(bucket_dir, f".upload-{uuid.uuid4().hex}.part")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        path = final_path(bucket_dir, info["filename"], digest)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    info["path"] = path
+    info["filename"] = os.path.basename(path)
+    index_files(index, [info])
+    save_upload_index(bucket_dir, index)
+    return info
@@ -0,0 +1,117 @@
+"""
+Streaming Zip Writer for Lizzy
+Builds zip archives chunk by chunk so bucket exports never hold the whole archive in memory
+"""
+
+import os
+import zipfile
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_COMPRESSLEVEL = 6
+
+# Formats that are already compressed; deflating them again costs CPU for no gain
+COMPRESSED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.epub',
+    '.mp3', '.mp4', '.m4a', '.mov', '.npz'
+}
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+
+def directory_entries(root: str, exclude: Callable[[str], bool] = None) -> List[Tuple[str, str]]:
+    """(arcname, path) pairs for every file under root, relative to root"""
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            arcname = os.path.relpath(path, root).replace(os.sep, "/")
+            if exclude and exclude(arcname):
+                continue
+            entries.append((arcname, path))
+    return entries
+
+
+def _zip_info(arcname: str, path: str, compresslevel: int, store_compressed: bool) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+    already_compressed = os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS
+    if compresslevel == 0 or (store_compressed and already_compressed):
+        zinfo.compress_type = zipfile.ZIP_STORED
+    else:
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        # ZipFile.open() ignores the archive-level level, so set it per entry
+        if hasattr(zinfo, "compress_level"):
+            zinfo.compress_level = compresslevel
+        else:
+            zinfo._compresslevel = compresslevel
+    return zinfo
+
+
+def stream_zip(entries: Iterable[Tuple[str, str]], compresslevel: int = DEFAULT_COMPRESSLEVEL,
+               store_compressed: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a zip archive of (arcname, path) entries as byte chunks; memory use is bounded by chunk_size"""
+    compresslevel = max(0, min(9, int(compresslevel)))
+    sink = _ChunkSink()
+
+    # A non-seekable sink makes zipfile write data descriptors instead of seeking back into headers
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for arcname, path in entries:
+            zinfo = _zip_info(arcname, path, compresslevel, store_compressed)
+            with open(path, 'rb') as src, archive.open(zinfo, 'w', force_zip64=zinfo.file_size > zipfile.ZIP64_LIMIT) as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    # Central directory
+    yield from sink.drain()
+
+
+def stream_directory_zip(root: str, compresslevel: int = DEFAULT_COMPRESSLEVEL, store_compressed: bool = True,
+                         exclude: Callable[[str], bool] = None) -> Iterator[bytes]:
+    """Stream every file under a directory as a zip archive"""
+    return stream_zip(directory_entries(root, exclude), compresslevel, store_compressed)
+
+
+def write_zip(entries: Iterable[Tuple[str, str]], dest_path: str, compresslevel: int = DEFAULT_COMPRESSLEVEL,
+              store_compressed: bool = True) -> int:
+    """Write a streamed zip archive to disk and return its size in bytes"""
+    size = 0
+    with open(dest_path, 'wb') as out:
+        for chunk in stream_zip(entries, compresslevel, store_compressed):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def parse_export_options(args) -> Tuple[int, bool]:
+    """Read ?level=0-9&store_compressed=true|false from a request args mapping"""
+    try:
+        level = int(args.get('level', DEFAULT_COMPRESSLEVEL))
+    except (TypeError, ValueError):
+        level = DEFAULT_COMPRESSLEVEL
+    store_compressed = str(args.get('store_compressed', 'true')).lower() not in ('0', 'false', 'no')
+    return max(0, min(9, level)), store_compressed
@@ -404,9 +404,11 @@ Focus on possibility and inspiration, not execution."""
 # API endpoints for the web interface
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from util_metrics import instrument_flask
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for web interface
+instrument_flask(app, "web_brainstorm_api")
 
 @app.route('/api/project-context/<project_name>')
 def get_project_context_api(project_name):
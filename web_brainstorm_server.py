@@ -3,17 +3,29 @@ Dynamic Prompt Studio Backend - System Agnostic
 Automatically discovers project schemas and builds data blocks from real data
 """
 
+import asyncio
 import os
 import re
 import json
 import sqlite3
 from datetime import datetime
 from typing import Dict, List, Any, Optional
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
+from util_async import AsyncApp, StreamingResponse, on_shared_loop, run_sync, wants_asgi, serve_asgi
+from util_llm import GenerationStats, get_client, get_async_client, stream_chat, stream_chat_sync, sse_token_stream, async_sse_token_stream
+from util_prompt_cache import PromptCache
+from util_ratelimit import call_with_limit, call_with_limit_sync, estimate_message_tokens, llm_limit_stats
+from util_accounting import ROLLUP_FIELDS, get_ledger, operation
+from util_metrics import instrument_flask
+from util_template_engine import Placeholder, UNRESOLVED, parse_template
+from core_migrations import ensure_migrated
+from core_retrieval import RETRIEVAL_MODES, TemplateRetriever, default_retrieval_mode, render_retrievals, retrieval_summary
+from util_events import EventHub, STREAM_POLICIES, DROP_OLDEST, SSE_HEADERS, sse_stream, async_sse_stream
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask(app, "web_brainstorm")
 
 class ProjectDiscovery:
     """Dynamically discover and analyze project structure"""
@@ -42,6 +54,7 @@ class ProjectDiscovery:
         
         if not os.path.exists(db_path):
             return {"error": "Project database not found"}
+        ensure_migrated(db_path)
         
         schema_info = {
             "project_name": project_name,
@@ -534,6 +547,9 @@ Now perform Pass 1 and Pass 2, then produce the output sections in order.'''
 # Initialize discovery system
 discovery = ProjectDiscovery()
 
+# Compiled system prompts, reused until the template or its project database changes
+prompt_cache = PromptCache()
+
 # Get current project from lizzy session
 def get_current_project():
     """Get the current project from lizzy session"""
@@ -582,6 +598,122 @@ def get_column_data(project_name, table, column):
     data = discovery.get_project_data(project_name, table, column)
     return jsonify({"table": table, "column": column, "data": data})
 
+def format_preview_table(table: str, table_data: Any) -> str:
+    """Table block for prompt previews: first 5 rows"""
+    if not table_data or not isinstance(table_data, list):
+        return f"No data available for {table} table"
+    
+    # Format table data nicely
+    lines = [f"TABLE: {table.upper()}"]
+    for i, row in enumerate(table_data[:5]):  # Show first 5 rows
+        # Show key fields for each table type
+        if table == 'characters' and 'name' in row:
+            line = f"{row.get('name', 'N/A')} - {row.get('romantic_challenge', 'N/A')} - {row.get('lovable_trait', 'N/A')} - {row.get('comedic_flaw', 'N/A')}"
+        elif table == 'story_outline_extended' and 'description' in row:
+            line = f"Act {row.get('act_number', 'N/A')}, Scene {row.get('scene_number', 'N/A')}: {row.get('description', 'N/A')}"
+        elif table == 'notes' and 'title' in row:
+            line = f"{row.get('title', 'N/A')}: {row.get('content', 'N/A')[:100]}..."
+        else:
+            # Generic row display
+            key_fields = [k for k in row.keys() if k not in ['id', 'created_at', 'updated_at']][:3]
+            line = " | ".join([f"{k}: {row.get(k, 'N/A')}" for k in key_fields])
+        lines.append(f"Row {i+1}: {line}")
+    
+    if len(table_data) > 5:
+        lines.append(f"... and {len(table_data) - 5} more rows")
+    
+    return "\n".join(lines)
+
+def format_chat_table(table: str, table_data: Any) -> str:
+    """Table block for chat context: first 3 rows"""
+    if not table_data or not isinstance(table_data, list):
+        return f"No data available for {table} table"
+    
+    # Format table data nicely for chat context
+    lines = [f"=== {table.upper()} DATA ==="]
+    for i, row in enumerate(table_data[:3]):  # Show first 3 rows for context
+        if table == 'characters' and 'name' in row:
+            lines.append(f"Character {i+1}: {row.get('name', 'N/A')} - Challenge: {row.get('romantic_challenge', 'N/A')} - Trait: {row.get('lovable_trait', 'N/A')}")
+        elif table == 'story_outline_extended' and 'description' in row:
+            lines.append(f"Scene {i+1}: Act {row.get('act_number', 'N/A')}, Scene {row.get('scene_number', 'N/A')} - {row.get('description', 'N/A')[:100]}...")
+        elif table == 'notes' and 'title' in row:
+            lines.append(f"Note {i+1}: {row.get('title', 'N/A')} - {row.get('content', 'N/A')[:100]}...")
+        else:
+            # Generic display
+            key_fields = [k for k in row.keys() if k not in ['id', 'created_at', 'updated_at']][:2]
+            lines.append(f"Row {i+1}: " + " | ".join([f"{k}: {row.get(k, 'N/A')}" for k in key_fields]))
+    
+    if len(table_data) > 3:
+        lines.append(f"... and {len(table_data) - 3} more rows")
+    
+    return "\n".join(lines)
+
+def resolve_lightrag_placeholder(placeholder: Placeholder, basic: str, enhanced: str):
+    """{lightrag.bucket} or {lightrag.bucket|guidance:"..."|mode:"..."|focus:N} as an instruction string"""
+    if placeholder.namespace != 'lightrag' or len(placeholder.path) != 2:
+        return UNRESOLVED
+    if not placeholder.options:
+        return basic.format(bucket=placeholder.name)
+    guidance, mode, focus = (placeholder.option(k) for k in ('guidance', 'mode', 'focus'))
+    if guidance and mode and focus and focus.isdigit():
+        return enhanced.format(bucket=placeholder.name, guidance=guidance, mode=mode, focus=focus)
+    return UNRESOLVED
+
+def make_placeholder_resolver(project_name: str, format_table, lightrag_basic: str = None, lightrag_enhanced: str = None):
+    """Resolver for {context.project.name}, {sql.table} and LightRAG placeholders (kept as-is without instructions)"""
+    def resolve(placeholder: Placeholder):
+        if placeholder.key == 'context.project.name':
+            return project_name
+        if placeholder.namespace == 'sql' and len(placeholder.path) == 2:
+            return format_table(placeholder.name, discovery.get_project_data(project_name, placeholder.name))
+        if lightrag_basic is None:
+            return UNRESOLVED
+        return resolve_lightrag_placeholder(placeholder, lightrag_basic, lightrag_enhanced)
+    return resolve
+
+def unresolved_placeholders(template: str) -> List[str]:
+    """Placeholders the compiler does not understand, found without touching the database"""
+    def known(placeholder: Placeholder):
+        if placeholder.key == 'context.project.name' or (placeholder.namespace == 'sql' and len(placeholder.path) == 2):
+            return True
+        return resolve_lightrag_placeholder(placeholder, "", "")
+    return parse_template(template).missing(known)
+
+def compile_preview_template(project_name: str, template: str, keep_lightrag: bool = False) -> str:
+    """Compile a template for preview: first 5 rows per table, query instructions for LightRAG blocks"""
+    if keep_lightrag:
+        return parse_template(template).render(make_placeholder_resolver(project_name, format_preview_table))
+    return parse_template(template).render(make_placeholder_resolver(
+        project_name, format_preview_table,
+        "[Query {bucket} knowledge base for relevant insights]",
+        "[Query {bucket} knowledge base with guidance: '{guidance}' using {mode} mode (focus level: {focus}/10)]"
+    ))
+
+# LightRAG placeholders are resolved by real bucket queries when LightRAG is installed
+_template_retriever = None
+
+def get_template_retriever():
+    """Shared TemplateRetriever, or None when LightRAG is unavailable"""
+    global _template_retriever
+    if _template_retriever is None:
+        try:
+            from core_knowledge import LightRAGManager
+        except ImportError:
+            return None
+        manager = LightRAGManager(discovery.lightrag_dir)
+        _template_retriever = TemplateRetriever(manager._aquery_bucket,
+                                                budget_seconds=float(os.getenv('LIZZY_RETRIEVAL_BUDGET', '8')))
+    return _template_retriever
+
+def retrieve_into(compiled: str, query: str, retrieval_log: List[Dict] = None) -> str:
+    """Run the LightRAG placeholders left in a compiled template concurrently and splice in the context"""
+    retriever = get_template_retriever()
+    # Bucket queries run on the shared loop that owns the LightRAG instances
+    results = run_sync(retriever.retrieve(compiled, query))
+    if retrieval_log is not None:
+        retrieval_log.extend(retrieval_summary(results))
+    return render_retrievals(compiled, results)
+
 @app.route('/api/compile-prompt', methods=['POST'])
 def compile_prompt():
     """Compile a prompt template with real project data"""
@@ -592,56 +724,19 @@ def compile_prompt():
     if not project_name or not template:
         return jsonify({"error": "Missing project_name or template"}), 400
     
-    compiled = template
+    # Opt in with "retrieve": true to fill LightRAG placeholders with real bucket context
+    retrieve = bool(data.get('retrieve')) and get_template_retriever() is not None
     
-    # Replace context variables
-    compiled = compiled.replace('{context.project.name}', project_name)
-    
-    # Replace SQL table variables with formatted table data
-    import re
-    sql_vars = re.findall(r'{sql\.(\w+)}', template)
-    for table in sql_vars:
-        table_data = discovery.get_project_data(project_name, table)
-        if table_data and isinstance(table_data, list):
-            # Format table data nicely
-            formatted_data = f"TABLE: {table.upper()}\n"
-            for i, row in enumerate(table_data[:5]):  # Show first 5 rows
-                formatted_data += f"Row {i+1}: "
-                # Show key fields for each table type
-                if table == 'characters' and 'name' in row:
-                    formatted_data += f"{row.get('name', 'N/A')} - {row.get('romantic_challenge', 'N/A')} - {row.get('lovable_trait', 'N/A')} - {row.get('comedic_flaw', 'N/A')}\n"
-                elif table == 'story_outline_extended' and 'description' in row:
-                    formatted_data += f"Act {row.get('act_number', 'N/A')}, Scene {row.get('scene_number', 'N/A')}: {row.get('description', 'N/A')}\n"
-                elif table == 'notes' and 'title' in row:
-                    formatted_data += f"{row.get('title', 'N/A')}: {row.get('content', 'N/A')[:100]}...\n"
-                else:
-                    # Generic row display
-                    key_fields = [k for k in row.keys() if k not in ['id', 'created_at', 'updated_at']][:3]
-                    formatted_data += " | ".join([f"{k}: {row.get(k, 'N/A')}" for k in key_fields]) + "\n"
-            
-            if len(table_data) > 5:
-                formatted_data += f"... and {len(table_data) - 5} more rows\n"
-            
-            compiled = compiled.replace(f'{{sql.{table}}}', formatted_data.strip())
-        else:
-            compiled = compiled.replace(f'{{sql.{table}}}', f"No data available for {table} table")
-    
-    # Replace LightRAG variables (both basic and enhanced)
-    # Enhanced format: {lightrag.bucket|guidance:"..."|mode:"..."|focus:N}
-    enhanced_lightrag_pattern = r'{lightrag\.([^}|]+)\|guidance:"([^"]+)"\|mode:"([^"]+)"\|focus:(\d+)}'
-    enhanced_matches = re.findall(enhanced_lightrag_pattern, template)
-    
-    for bucket, guidance, mode, focus in enhanced_matches:
-        enhanced_instruction = f"[Query {bucket} knowledge base with guidance: '{guidance}' using {mode} mode (focus level: {focus}/10)]"
-        full_match = f'{{lightrag.{bucket}|guidance:"{guidance}"|mode:"{mode}"|focus:{focus}}}'
-        compiled = compiled.replace(full_match, enhanced_instruction)
+    db_path = os.path.join(discovery.projects_dir, project_name, f"{project_name}.sqlite")
+    key = prompt_cache.key(project_name, db_path, None, template, kind="preview_base" if retrieve else "preview")
+    compiled, cached = prompt_cache.get_or_compile(key, lambda: compile_preview_template(project_name, template, retrieve))
     
-    # Basic LightRAG variables (fallback)
-    basic_lightrag_vars = re.findall(r'{lightrag\.(\w+)}', template)
-    for bucket in basic_lightrag_vars:
-        compiled = compiled.replace(f'{{lightrag.{bucket}}}', f"[Query {bucket} knowledge base for relevant insights]")
+    retrieval = []
+    if retrieve:
+        compiled = retrieve_into(compiled, data.get('query', ''), retrieval)
     
-    return jsonify({"compiled": compiled})
+    return jsonify({"compiled": compiled, "cached": cached, "unresolved": unresolved_placeholders(template),
+                    "retrieval": retrieval})
 
 @app.route('/api/project/<project_name>/prompts', methods=['GET'])
 def get_project_prompts(project_name):
@@ -788,138 +883,280 @@ def delete_project_prompt(project_name, prompt_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def compile_chat_template(project_name: str, template: str, keep_lightrag: bool = False) -> str:
+    """Compile a template into a chat system prompt: first 3 rows per table, usage hints for LightRAG blocks"""
+    if keep_lightrag:
+        return parse_template(template).render(make_placeholder_resolver(project_name, format_chat_table))
+    return parse_template(template).render(make_placeholder_resolver(
+        project_name, format_chat_table,
+        "[Use {bucket} knowledge - reference relevant insights for this query]",
+        "[Use {bucket} knowledge with guidance: '{guidance}' using {mode} mode (focus level: {focus}/10) - reference relevant insights for this query]"
+    ))
+
+def build_chat_messages(project_name: str, template_id: Optional[int], chat_history: List[Dict], user_message: str,
+                        retrieve: bool = True, retrieval_log: List[Dict] = None) -> List[Dict]:
+    """Compile the selected template into a system prompt and assemble the chat messages"""
+    retrieve = retrieve and get_template_retriever() is not None
+    # Build the conversation
+    messages = []
+
+    # Add system prompt if template is selected
+    if template_id:
+        # Get the template and compile it
+        db_path = os.path.join(discovery.projects_dir, project_name, f"{project_name}.sqlite")
+        if os.path.exists(db_path):
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+
+            # Get template
+            cursor.execute('SELECT template FROM custom_prompts WHERE id = ?', (template_id,))
+            result = cursor.fetchone()
+
+            if result:
+                template = result[0]
+
+                # SQL data is cached; LightRAG context depends on the message, so it is retrieved per turn
+                key = prompt_cache.key(project_name, db_path, template_id, template,
+                                       kind="chat_base" if retrieve else "chat")
+                compiled_template, _ = prompt_cache.get_or_compile(
+                    key, lambda: compile_chat_template(project_name, template, retrieve))
+                if retrieve:
+                    compiled_template = retrieve_into(compiled_template, user_message, retrieval_log)
+
+                # Add as system message
+                messages.append({
+                    "role": "system",
+                    "content": compiled_template
+                })
+
+            conn.close()
+
+    # Add chat history (limit to last 6 messages to manage context)
+    for msg in chat_history[-6:]:
+        messages.append({
+            "role": msg["role"],
+            "content": msg["content"]
+        })
+
+    # Add current user message
+    messages.append({
+        "role": "user", 
+        "content": user_message
+    })
+
+    return messages
+
 @app.route('/api/chat', methods=['POST'])
 def chat_with_ai():
     """Chat with AI using compiled prompt templates"""
-    data = request.json
-    project_name = data.get('project_name')
-    template_id = data.get('template_id')
-    user_message = data.get('user_message')
-    temperature = data.get('temperature', 0.7)
-    model = data.get('model', 'gpt-4')
-    chat_history = data.get('chat_history', [])
-    
-    if not project_name or not user_message:
-        return jsonify({"error": "Missing project_name or user_message"}), 400
+    params, error = parse_chat_request(request.json or {})
+    if error:
+        return jsonify(error[0]), error[1]
     
     try:
-        # Get OpenAI API key from environment
-        import os
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            return jsonify({"error": "OpenAI API key not configured"}), 500
-        
-        # Initialize OpenAI client
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        
-        # Build the conversation
-        messages = []
-        
-        # Add system prompt if template is selected
-        if template_id:
-            # Get the template and compile it
-            db_path = os.path.join(discovery.projects_dir, project_name, f"{project_name}.sqlite")
-            if os.path.exists(db_path):
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
-                # Get template
-                cursor.execute('SELECT template FROM custom_prompts WHERE id = ?', (template_id,))
-                result = cursor.fetchone()
-                
-                if result:
-                    template = result[0]
-                    
-                    # Compile template with real project data (reuse compile logic)
-                    compiled_template = template
-                    
-                    # Replace context variables
-                    compiled_template = compiled_template.replace('{context.project.name}', project_name)
-                    
-                    # Replace SQL table variables with formatted table data
-                    import re
-                    sql_vars = re.findall(r'{sql\.(\w+)}', template)
-                    for table in sql_vars:
-                        table_data = discovery.get_project_data(project_name, table)
-                        if table_data and isinstance(table_data, list):
-                            # Format table data nicely for chat context
-                            formatted_data = f"=== {table.upper()} DATA ===\n"
-                            for i, row in enumerate(table_data[:3]):  # Show first 3 rows for context
-                                if table == 'characters' and 'name' in row:
-                                    formatted_data += f"Character {i+1}: {row.get('name', 'N/A')} - Challenge: {row.get('romantic_challenge', 'N/A')} - Trait: {row.get('lovable_trait', 'N/A')}\n"
-                                elif table == 'story_outline_extended' and 'description' in row:
-                                    formatted_data += f"Scene {i+1}: Act {row.get('act_number', 'N/A')}, Scene {row.get('scene_number', 'N/A')} - {row.get('description', 'N/A')[:100]}...\n"
-                                elif table == 'notes' and 'title' in row:
-                                    formatted_data += f"Note {i+1}: {row.get('title', 'N/A')} - {row.get('content', 'N/A')[:100]}...\n"
-                                else:
-                                    # Generic display
-                                    key_fields = [k for k in row.keys() if k not in ['id', 'created_at', 'updated_at']][:2]
-                                    formatted_data += f"Row {i+1}: " + " | ".join([f"{k}: {row.get(k, 'N/A')}" for k in key_fields]) + "\n"
-                            
-                            if len(table_data) > 3:
-                                formatted_data += f"... and {len(table_data) - 3} more rows\n"
-                                
-                            compiled_template = compiled_template.replace(f'{{sql.{table}}}', formatted_data.strip())
-                        else:
-                            compiled_template = compiled_template.replace(f'{{sql.{table}}}', f"No data available for {table} table")
-                    
-                    # Replace LightRAG variables with instructions (enhanced and basic)
-                    # Enhanced format first
-                    enhanced_lightrag_pattern = r'{lightrag\.([^}|]+)\|guidance:"([^"]+)"\|mode:"([^"]+)"\|focus:(\d+)}'
-                    enhanced_matches = re.findall(enhanced_lightrag_pattern, template)
-                    
-                    for bucket, guidance, mode, focus in enhanced_matches:
-                        enhanced_instruction = f"[Use {bucket} knowledge with guidance: '{guidance}' using {mode} mode (focus level: {focus}/10) - reference relevant insights for this query]"
-                        full_match = f'{{lightrag.{bucket}|guidance:"{guidance}"|mode:"{mode}"|focus:{focus}}}'
-                        compiled_template = compiled_template.replace(full_match, enhanced_instruction)
-                    
-                    # Basic LightRAG variables (fallback)
-                    basic_lightrag_vars = re.findall(r'{lightrag\.(\w+)}', compiled_template)
-                    for bucket in basic_lightrag_vars:
-                        compiled_template = compiled_template.replace(f'{{lightrag.{bucket}}}', f"[Use {bucket} knowledge - reference relevant insights for this query]")
-                    
-                    # Add as system message
-                    messages.append({
-                        "role": "system",
-                        "content": compiled_template
-                    })
-                
-                conn.close()
-        
-        # Add chat history (limit to last 6 messages to manage context)
-        for msg in chat_history[-6:]:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        # Add current user message
-        messages.append({
-            "role": "user", 
-            "content": user_message
-        })
-        
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=2000
-        )
-        
-        assistant_response = response.choices[0].message.content
-        
-        return jsonify({
-            "response": assistant_response,
-            "model": model,
-            "temperature": temperature,
-            "template_used": template_id is not None
-        })
-        
+        retrieval = []
+        with operation(project=params["project_name"], stage="chat"):
+            messages = chat_messages(params, retrieval)
+            # Shared client keeps connections alive between requests
+            response = call_with_limit_sync(
+                params["model"], estimate_message_tokens(messages, CHAT_MAX_TOKENS),
+                get_client().chat.completions.create, **chat_completion_args(params, messages)
+            )
+        return jsonify(chat_response(params, response, retrieval))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def parse_chat_request(data: Dict):
+    """Validate a chat request; returns (params, None) or (None, (error, status))"""
+    params = {
+        "project_name": data.get('project_name'),
+        "template_id": data.get('template_id'),
+        "user_message": data.get('user_message'),
+        "temperature": data.get('temperature', 0.7),
+        "model": data.get('model', 'gpt-4'),
+        "chat_history": data.get('chat_history', []),
+        "retrieve": data.get('retrieve', True)
+    }
+    if not params["project_name"] or not params["user_message"]:
+        return None, ({"error": "Missing project_name or user_message"}, 400)
+    if not os.getenv('OPENAI_API_KEY'):
+        return None, ({"error": "OpenAI API key not configured"}, 500)
+    return params, None
+
+CHAT_MAX_TOKENS = 2000
+
+def chat_messages(params: Dict, retrieval: Optional[List] = None) -> List[Dict]:
+    """Chat messages for a parsed request (blocking: reads templates, may query buckets)"""
+    return build_chat_messages(params["project_name"], params["template_id"], params["chat_history"],
+                               params["user_message"], params["retrieve"], retrieval)
+
+def chat_completion_args(params: Dict, messages: List[Dict]) -> Dict:
+    return {"model": params["model"], "messages": messages, "temperature": params["temperature"],
+            "max_tokens": CHAT_MAX_TOKENS}
+
+def chat_response(params: Dict, response: Any, retrieval: List) -> Dict:
+    """JSON body shared by the WSGI and async /api/chat handlers"""
+    return {
+        "response": response.choices[0].message.content,
+        "model": params["model"],
+        "temperature": params["temperature"],
+        "template_used": params["template_id"] is not None,
+        "retrieval": retrieval
+    }
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_with_ai_stream():
+    """Chat with AI, streaming tokens as Server-Sent Events (token, done, error)"""
+    params, error = parse_chat_request(request.json or {})
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    with operation(project=params["project_name"], stage="chat"):
+        try:
+            messages = chat_messages(params)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        
+        stats = GenerationStats()
+    chunks = stream_chat_sync(messages, model=params["model"], temperature=params["temperature"],
+                              max_tokens=CHAT_MAX_TOKENS, stats=stats)
+    # Werkzeug closes the generator when the client goes away, which closes the upstream stream
+    return Response(sse_token_stream(chunks, stats, f"chat {params['model']}"),
+                    mimetype='text/event-stream', headers=SSE_HEADERS)
+
+# Live pipeline runs: Transparent* callbacks are bridged to per-run SSE channels
+event_hub = EventHub()
+pipeline_runs = {}
+
+def run_pipeline(run_id: str, kind: str, project_name: str, buckets: List[str], user_guidance: str,
+                 retrieval_mode: Optional[str] = None, force: bool = False,
+                 resume_session: Optional[str] = None, trace: Optional[bool] = None):
+    """Run a brainstorm or write session in this thread, publishing every callback to the run's channel"""
+    project_path = os.path.join(discovery.projects_dir, project_name)
+    run = pipeline_runs[run_id]
+    pipeline = None
+    try:
+        # Pipelines own a sqlite connection, so they must be created in the thread that uses them
+        if kind == 'brainstorm':
+            from core_brainstorm import TransparentBrainstormer
+            pipeline = TransparentBrainstormer(project_path, retrieval_mode=retrieval_mode, force=force, trace=trace)
+            event_hub.bridge(pipeline, run_id)
+            run["status"] = "running"
+            event_hub.publish(run_id, "run_started", run)
+            session_id = asyncio.run(pipeline.brainstorm_all_scenes(buckets, user_guidance))
+        else:
+            from core_write import TransparentWriter
+            pipeline = TransparentWriter(project_path, retrieval_mode=retrieval_mode, trace=trace)
+            event_hub.bridge(pipeline, run_id)
+            run["status"] = "running"
+            event_hub.publish(run_id, "run_started", run)
+            if resume_session:
+                session_id = asyncio.run(pipeline.resume_session(resume_session))
+            else:
+                session_id = asyncio.run(pipeline.write_all_scenes(buckets, user_guidance))
+        
+        # Let queued callbacks reach the channel before the terminal event closes it
+        pipeline.events.drain()
+        run.update({"status": "completed", "session_id": session_id, "finished_at": datetime.now().isoformat(),
+                    "callbacks": pipeline.events.stats(),
+                    "trace_file": pipeline.last_trace.path if pipeline.last_trace else None})
+        event_hub.publish(run_id, "run_completed", run)
+    except Exception as e:
+        if pipeline is not None:
+            pipeline.events.drain()
+            run["callbacks"] = pipeline.events.stats()
+        run.update({"status": "failed", "error": str(e), "finished_at": datetime.now().isoformat()})
+        event_hub.publish(run_id, "run_failed", run)
+
+def start_pipeline_run(kind: str, data: Dict):
+    """Validate a run request and start it in a background thread, returning (payload, status)"""
+    import threading
+    project_name = data.get('project_name')
+    if not project_name or project_name not in discovery.discover_projects():
+        return {"error": f"Project not found: {project_name}"}, 404
+    
+    run_id = f"{'BS' if kind == 'brainstorm' else 'WS'}_RUN_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    pipeline_runs[run_id] = {
+        "run_id": run_id,
+        "kind": kind,
+        "project_name": project_name,
+        "buckets": data.get('buckets', ['scripts', 'books']),
+        "retrieval_mode": data.get('retrieval_mode') if data.get('retrieval_mode') in RETRIEVAL_MODES else default_retrieval_mode(),
+        "force": bool(data.get('force', False)),
+        "resume_session": data.get('resume_session') if kind == 'write' else None,
+        "trace": data.get('trace'),
+        "status": "starting",
+        "started_at": datetime.now().isoformat()
+    }
+    event_hub.channel(run_id)
+    threading.Thread(
+        target=run_pipeline,
+        args=(run_id, kind, project_name, pipeline_runs[run_id]["buckets"], data.get('user_guidance', ''),
+              pipeline_runs[run_id]["retrieval_mode"], pipeline_runs[run_id]["force"],
+              pipeline_runs[run_id]["resume_session"], pipeline_runs[run_id]["trace"]),
+        name=f"lizzy-{run_id}",
+        daemon=True
+    ).start()
+    return {"run_id": run_id, "events_url": f"/api/runs/{run_id}/events", "status_url": f"/api/runs/{run_id}"}, 202
+
+def parse_subscription_args(args, headers):
+    """Drop policy, buffer size and resume point for an SSE subscriber"""
+    policy = args.get('policy', DROP_OLDEST)
+    if policy not in STREAM_POLICIES:
+        policy = DROP_OLDEST
+    try:
+        maxsize = max(1, min(int(args.get('buffer', 256)), 10000))
+    except ValueError:
+        maxsize = 256
+    try:
+        last_event_id = int(headers.get('Last-Event-ID') or args.get('last_event_id', 0))
+    except ValueError:
+        last_event_id = 0
+    return maxsize, policy, last_event_id
+
+@app.route('/api/runs/brainstorm', methods=['POST'])
+def start_brainstorm_run():
+    """Start a brainstorm session for all scenes; progress is streamed from /api/runs/<run_id>/events"""
+    payload, status = start_pipeline_run('brainstorm', request.json or {})
+    return jsonify(payload), status
+
+@app.route('/api/runs/write', methods=['POST'])
+def start_write_run():
+    """Start a write session for all scenes; progress is streamed from /api/runs/<run_id>/events"""
+    payload, status = start_pipeline_run('write', request.json or {})
+    return jsonify(payload), status
+
+@app.route('/api/runs/<run_id>')
+def get_run_status(run_id):
+    """Run state, subscriber buffer stats and the process-wide LLM limits, straight from memory"""
+    channel = event_hub.channel(run_id, create=False)
+    if run_id not in pipeline_runs or channel is None:
+        return jsonify({"error": "Run not found"}), 404
+    return jsonify({**pipeline_runs[run_id], "events": channel.summary(), "llm_limits": llm_limit_stats()})
+
+@app.route('/api/usage')
+def get_llm_usage():
+    """LLM and embedding usage from the ledger (?by=bucket,stage&session=...&project=...&since=<unix time>)"""
+    by = [field.strip() for field in request.args.get('by', 'stage,bucket').split(',') if field.strip()]
+    filters = {field: request.args[field] for field in ROLLUP_FIELDS if request.args.get(field)}
+    try:
+        since = float(request.args['since']) if request.args.get('since') else None
+        ledger = get_ledger()
+        return jsonify({"by": by, "filters": filters, "totals": ledger.totals(since=since, **filters),
+                        "rollup": ledger.rollup(by=by, since=since, **filters)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/runs/<run_id>/events')
+def stream_run_events(run_id):
+    """Server-Sent Events for a run (?policy=drop_oldest|drop_newest|coalesce&buffer=256)"""
+    channel = event_hub.channel(run_id, create=False)
+    if channel is None:
+        return jsonify({"error": "Run not found"}), 404
+    maxsize, policy, last_event_id = parse_subscription_args(request.args, request.headers)
+    subscription = channel.subscribe(maxsize, policy, last_event_id)
+    return Response(stream_with_context(sse_stream(subscription)), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @app.route('/api/templates/global')
 def get_global_templates():
     """Get templates available from all projects (for sharing)"""
@@ -1019,10 +1256,67 @@ def serve_original_interface():
     """Serve the original interface (broken)"""
     return send_from_directory('.', 'web_brainstorm.html')
 
+# Async serving mode: chat completions are awaited on the shared loop, other routes fall through to Flask
+asgi_app = AsyncApp(app)
+@asgi_app.route('/api/chat', methods=['POST'])
+async def chat_with_ai_async(req):
+    """Chat with AI without holding a worker thread for the completion"""
+    params, error = parse_chat_request(req.get_json() or {})
+    if error:
+        return error
+    
+    try:
+        retrieval = []
+        with operation(project=params["project_name"], stage="chat"):
+            messages = await asyncio.to_thread(chat_messages, params, retrieval)
+            
+            async def complete():
+                return await call_with_limit(
+                    params["model"], estimate_message_tokens(messages, CHAT_MAX_TOKENS),
+                    get_async_client().chat.completions.create, **chat_completion_args(params, messages)
+                )
+            
+            response = await on_shared_loop(complete())
+        return chat_response(params, response, retrieval)
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@asgi_app.route('/api/chat/stream', methods=['POST'])
+async def chat_with_ai_stream_async(req):
+    """Streaming chat on the event loop; a client disconnect cancels generation"""
+    params, error = parse_chat_request(req.get_json() or {})
+    if error:
+        return error
+    
+    with operation(project=params["project_name"], stage="chat"):
+        try:
+            messages = await asyncio.to_thread(chat_messages, params)
+        except Exception as e:
+            return {"error": str(e)}, 500
+        
+        stats = GenerationStats()
+    chunks = stream_chat(messages, model=params["model"], temperature=params["temperature"],
+                         max_tokens=CHAT_MAX_TOKENS, stats=stats)
+    return StreamingResponse(async_sse_token_stream(chunks, stats, f"chat {params['model']}"),
+                             headers=SSE_HEADERS, content_type='text/event-stream')
+
+@asgi_app.route('/api/runs/<run_id>/events')
+async def stream_run_events_async(req, run_id):
+    """Server-Sent Events for a run without holding a thread per watcher"""
+    channel = event_hub.channel(run_id, create=False)
+    if channel is None:
+        return {"error": "Run not found"}, 404
+    maxsize, policy, last_event_id = parse_subscription_args(req.args, {'Last-Event-ID': req.headers.get('last-event-id')})
+    subscription = channel.subscribe(maxsize, policy, last_event_id)
+    return StreamingResponse(async_sse_stream(subscription), headers=SSE_HEADERS, content_type='text/event-stream')
+
 if __name__ == '__main__':
     print("🚀 Starting Dynamic Prompt Studio...")
     print("📊 Discovering projects...")
     projects = discovery.discover_projects()
     print(f"✅ Found {len(projects)} projects: {', '.join(projects)}")
     
-    app.run(host='0.0.0.0', port=8003, debug=True)
\ No newline at end of file
+    if wants_asgi():
+        serve_asgi(asgi_app, '0.0.0.0', 8003, fallback=lambda: app.run(host='0.0.0.0', port=8003, threaded=True))
+    else:
+        app.run(host='0.0.0.0', port=8003, debug=True)
\ No newline at end of file
@@ -6,10 +6,13 @@ Main project data curation interface
 from flask import Flask, render_template_string, jsonify, request
 import os
 import sqlite3
+from core_migrations import ensure_migrated
+from util_metrics import instrument_flask
 import json
 
 # Create Flask app
 app = Flask(__name__)
+instrument_flask(app, "web_editor")
 
 @app.route('/')
 def index():
@@ -51,6 +54,7 @@ def get_db_connection():
     if not os.path.exists(db_path):
         raise FileNotFoundError("Project database not found")
     
+    ensure_migrated(db_path)
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     return conn